@@ -8,6 +8,7 @@ from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 
+from agents.data_scan.crs import crs_tokens
 from agents.execute.graph import execute_agent
 
 """Alignment 图：负责对齐任务规范、模型契约与数据画像，并给出可执行决策包。
@@ -153,6 +154,11 @@ def _extract_data_sources(data_profile: Dict[str, Any]) -> List[Dict[str, Any]]:
     if isinstance(data_sources, list) and data_sources:
         return data_sources
 
+    # 汇总画像：每个同构分组带有 form / spatial，可直接作为数据源比对
+    source_groups = data_profile.get("Source_groups")
+    if isinstance(source_groups, list) and source_groups:
+        return source_groups
+
     return [{
         "file_path": data_profile.get("primary_file") or "single",
         "form": data_profile.get("Form"),
@@ -176,14 +182,8 @@ def _source_crs_tokens(data_profile: Dict[str, Any]) -> Set[str]:
     for source in _extract_data_sources(data_profile):
         spatial = source.get("spatial") or {}
         crs = (spatial.get("Crs") if isinstance(spatial, dict) else None) or {}
-
-        if isinstance(crs, dict):
-            for key in ["EPSG", "Name", "Wkt", "Projection", "Datum"]:
-                value = crs.get(key)
-                if value:
-                    tokens.add(_normalize_text(value))
-        elif isinstance(crs, str):
-            tokens.add(_normalize_text(crs))
+        # 多文件数据集通常共用同一 CRS，token 由共享的 CRS 解析缓存给出
+        tokens.update(crs_tokens(crs))
     return tokens
 
 
@@ -221,7 +221,7 @@ def _apply_rule_validation(
         return alignment_result
 
     forms_available = _source_form_set(data_profile)
-    crs_tokens = _source_crs_tokens(data_profile)
+    source_crs_tokens = _source_crs_tokens(data_profile)
 
     blocking_issues = alignment_result.setdefault("blocking_issues", [])
     non_blocking_issues = alignment_result.setdefault("non_blocking_issues", [])
@@ -247,7 +247,7 @@ def _apply_rule_validation(
         expected_crs_text = _normalize_text(expected_crs) if expected_crs else ""
         if expected_crs and data_type != "parameter" and expected_crs_text not in ["n/a", "na", "不适用"]:
             norm_expected = _normalize_text(expected_crs)
-            crs_match = any(norm_expected in token or token in norm_expected for token in crs_tokens if token)
+            crs_match = any(norm_expected in token or token in norm_expected for token in source_crs_tokens if token)
             if not crs_match:
                 gap_text = f"CRS 可能不一致：期望 {expected_crs}"
                 slot_item["spatiotemporal_alignment"].setdefault("gaps", []).append(gap_text)
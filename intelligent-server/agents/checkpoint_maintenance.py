@@ -0,0 +1,213 @@
+"""
+LangGraph MongoDBSaver 检查点的保留与压缩
+
+MongoDBSaver 每个节点步骤都会写入一份完整状态的检查点，长会话的检查点历史不断增长，
+astream 恢复和按 thread 查询都会变慢。这里提供：
+- 每个 thread（及 checkpoint_ns）只保留最近 CHECKPOINT_KEEP_LAST 个检查点及其 pending writes
+- 每轮对话结束后按 thread 去抖执行压缩（后台线程，不占用请求路径）
+- 全量压缩任务与按 thread 统计检查点字节数
+
+检查点 id 为时间有序的 uuid6，按字符串倒序即为从新到旧。
+
+全量压缩（在 intelligent-server 目录下）:
+  python -m agents.checkpoint_maintenance --keep-last 5
+  python -m agents.checkpoint_maintenance --stats --limit 20
+"""
+
+import argparse
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from pymongo import MongoClient
+
+from .snapshot_refresher import DebouncedRefresher
+
+logger = logging.getLogger(__name__)
+
+# 与 MongoDBSaver 默认配置一致
+CHECKPOINT_DB_NAME = os.getenv("CHECKPOINT_DB_NAME", "checkpointing_db")
+CHECKPOINT_COLLECTION = "checkpoints"
+CHECKPOINT_WRITES_COLLECTION = "checkpoint_writes"
+# 每个 thread 保留的检查点数量，0 表示不做保留清理
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "5"))
+CHECKPOINT_COMPACT_DELAY_SECONDS = float(os.getenv("CHECKPOINT_COMPACT_DELAY_SECONDS", "30"))
+
+
+class CheckpointMaintainer:
+    """按 thread 清理旧检查点并统计占用"""
+
+    def __init__(self, client: MongoClient, db_name: str = CHECKPOINT_DB_NAME, keep_last: int = CHECKPOINT_KEEP_LAST):
+        db = client[db_name]
+        self.checkpoints = db[CHECKPOINT_COLLECTION]
+        self.writes = db[CHECKPOINT_WRITES_COLLECTION]
+        self.keep_last = max(0, keep_last)
+        self._lock = threading.Lock()
+        self.compacted_threads = 0
+        self.deleted_checkpoints = 0
+        self.deleted_writes = 0
+
+    def compact_thread(self, thread_id: str) -> int:
+        """删除该 thread 每个 checkpoint_ns 下除最近 keep_last 个以外的检查点，返回删除数量"""
+        if not thread_id or self.keep_last <= 0:
+            return 0
+        deleted = 0
+        for checkpoint_ns in self.checkpoints.distinct("checkpoint_ns", {"thread_id": thread_id}):
+            scope = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+            stale_ids = [
+                doc["checkpoint_id"]
+                for doc in self.checkpoints.find(scope, {"checkpoint_id": 1, "_id": 0})
+                .sort("checkpoint_id", -1)
+                .skip(self.keep_last)
+            ]
+            if not stale_ids:
+                continue
+            checkpoint_result = self.checkpoints.delete_many({**scope, "checkpoint_id": {"$in": stale_ids}})
+            writes_result = self.writes.delete_many({**scope, "checkpoint_id": {"$in": stale_ids}})
+            deleted += checkpoint_result.deleted_count
+            with self._lock:
+                self.deleted_checkpoints += checkpoint_result.deleted_count
+                self.deleted_writes += writes_result.deleted_count
+        if deleted:
+            with self._lock:
+                self.compacted_threads += 1
+            logger.info("Compacted %s checkpoints for thread %s", deleted, thread_id)
+        return deleted
+
+    def compact_all(self) -> Dict[str, int]:
+        """全量压缩：只处理检查点数量超过 keep_last 的 thread"""
+        if self.keep_last <= 0:
+            return {"threads": 0, "deleted": 0}
+        pipeline = [
+            {"$group": {"_id": "$thread_id", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": self.keep_last}}},
+        ]
+        threads = 0
+        deleted = 0
+        for row in self.checkpoints.aggregate(pipeline, allowDiskUse=True):
+            deleted += self.compact_thread(row["_id"])
+            threads += 1
+        return {"threads": threads, "deleted": deleted}
+
+    def thread_stats(self, thread_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """按 thread 统计检查点与 pending writes 的数量和 BSON 字节数（字节数降序）"""
+        match = {"thread_id": thread_id} if thread_id else {}
+
+        def aggregate(collection) -> Dict[str, Dict[str, int]]:
+            pipeline = [
+                {"$match": match},
+                {"$group": {"_id": "$thread_id", "count": {"$sum": 1}, "bytes": {"$sum": {"$bsonSize": "$$ROOT"}}}},
+            ]
+            return {row["_id"]: row for row in collection.aggregate(pipeline, allowDiskUse=True)}
+
+        checkpoint_rows = aggregate(self.checkpoints)
+        write_rows = aggregate(self.writes)
+        stats = []
+        for tid in set(checkpoint_rows) | set(write_rows):
+            checkpoints = checkpoint_rows.get(tid, {})
+            writes = write_rows.get(tid, {})
+            stats.append({
+                "thread_id": tid,
+                "checkpoints": int(checkpoints.get("count", 0)),
+                "checkpoint_bytes": int(checkpoints.get("bytes", 0)),
+                "writes": int(writes.get("count", 0)),
+                "write_bytes": int(writes.get("bytes", 0)),
+                "total_bytes": int(checkpoints.get("bytes", 0)) + int(writes.get("bytes", 0)),
+            })
+        stats.sort(key=lambda row: row["total_bytes"], reverse=True)
+        return stats[:limit] if limit > 0 else stats
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "keep_last": self.keep_last,
+                "compacted_threads": self.compacted_threads,
+                "deleted_checkpoints": self.deleted_checkpoints,
+                "deleted_writes": self.deleted_writes,
+            }
+
+
+_maintainer: Optional[CheckpointMaintainer] = None
+_compactor: Optional[DebouncedRefresher] = None
+_maintainer_lock = threading.Lock()
+
+
+def get_checkpoint_maintainer(client: Optional[MongoClient] = None) -> CheckpointMaintainer:
+    """进程内共享的检查点维护器；首次调用需传入 MongoDBSaver 使用的 MongoClient"""
+    global _maintainer
+    with _maintainer_lock:
+        if _maintainer is None:
+            if client is None:
+                raise RuntimeError("checkpoint maintainer is not initialized")
+            _maintainer = CheckpointMaintainer(client)
+        return _maintainer
+
+
+def schedule_checkpoint_compaction(thread_id: Optional[str]) -> None:
+    """每轮对话结束后调用；同一 thread 在去抖窗口内只压缩一次"""
+    global _compactor
+    if not thread_id or CHECKPOINT_KEEP_LAST <= 0:
+        return
+    with _maintainer_lock:
+        if _compactor is None:
+            maintainer = _maintainer
+            if maintainer is None:
+                return
+            _compactor = DebouncedRefresher(
+                maintainer.compact_thread,
+                delay_seconds=CHECKPOINT_COMPACT_DELAY_SECONDS,
+                name="checkpoint-compactor",
+            )
+        compactor = _compactor
+    compactor.schedule(thread_id)
+
+
+def checkpoint_metrics() -> Dict[str, Any]:
+    with _maintainer_lock:
+        maintainer, compactor = _maintainer, _compactor
+    metrics: Dict[str, Any] = maintainer.metrics() if maintainer is not None else {}
+    if compactor is not None:
+        metrics.update({"pending": compactor.pending_count(), "failed": compactor.failed})
+    return metrics
+
+
+def shutdown_checkpoint_compactor() -> None:
+    """进程退出时停止后台线程；未到期的压缩留给下一次请求或全量任务"""
+    with _maintainer_lock:
+        compactor = _compactor
+    if compactor is not None:
+        compactor.stop(flush=False)
+
+
+def main() -> None:
+    from dotenv import load_dotenv
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+    parser = argparse.ArgumentParser(description="Compact LangGraph MongoDB checkpoints")
+    parser.add_argument("--keep-last", type=int, default=int(os.getenv("CHECKPOINT_KEEP_LAST", str(CHECKPOINT_KEEP_LAST))), help="每个 thread 保留的检查点数")
+    parser.add_argument("--db-name", default=os.getenv("CHECKPOINT_DB_NAME", CHECKPOINT_DB_NAME), help="检查点数据库名")
+    parser.add_argument("--stats", action="store_true", help="只输出按 thread 的检查点字节数统计")
+    parser.add_argument("--thread-id", default=None, help="只处理指定 thread")
+    parser.add_argument("--limit", type=int, default=20, help="统计输出的 thread 数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        parser.error("MONGO_URI must be configured")
+    maintainer = CheckpointMaintainer(MongoClient(mongo_uri), db_name=args.db_name, keep_last=args.keep_last)
+
+    if args.stats:
+        for row in maintainer.thread_stats(args.thread_id, args.limit):
+            print(row)
+        return
+    if args.thread_id:
+        print({"thread_id": args.thread_id, "deleted": maintainer.compact_thread(args.thread_id)})
+    else:
+        print(maintainer.compact_all())
+
+
+if __name__ == "__main__":
+    main()
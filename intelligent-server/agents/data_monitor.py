@@ -6,24 +6,97 @@
 import asyncio
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from datetime import datetime
 import hashlib
-from agents.data_scan.graph import data_scan_agent, DataScanState
+from agents.data_scan.graph import SCAN_MODE_FACTS_ONLY, SCAN_MODE_SEMANTIC_CACHED, data_scan_agent, DataScanState, normalize_scan_mode
+from agents.data_scan.profile_summary import PROFILE_MODE_FULL
+from agents.data_scan.semantic_batch import enrich_semantics
 from langchain.messages import HumanMessage
 import logging
 
 logger = logging.getLogger(__name__)
 
+DATA_SCAN_BATCH_CONCURRENCY = int(os.getenv("DATA_SCAN_BATCH_CONCURRENCY", "4"))
+DATA_SCAN_FILE_TIMEOUT_SECONDS = float(os.getenv("DATA_SCAN_FILE_TIMEOUT_SECONDS", "300"))
+# 扫描图在专用线程池中同步执行，进程内同时运行的扫描数不超过该值（含已超时但仍在运行的扫描）
+DATA_SCAN_WORKERS = int(os.getenv("DATA_SCAN_WORKERS", str(DATA_SCAN_BATCH_CONCURRENCY)))
+# 文件最近修改时间在该窗口内时视为可能仍在写入，先等待
+DATA_SCAN_SETTLE_SECONDS = float(os.getenv("DATA_SCAN_SETTLE_SECONDS", "0.2"))
+# 批量扫描 / 增量重扫默认的扫描模式，默认复用未变化画像的语义块
+DATA_SCAN_BATCH_MODE = os.getenv("DATA_SCAN_BATCH_MODE", SCAN_MODE_SEMANTIC_CACHED)
+# 多文件扫描时先做规则扫描，再把多个画像打包进少量 LLM 请求补全语义
+DATA_SCAN_SEMANTIC_BATCH = os.getenv("DATA_SCAN_SEMANTIC_BATCH", "true").strip().lower() not in {"0", "false", "no", "off"}
+
+SCAN_STATUS_SCANNED = "scanned"
+SCAN_STATUS_SKIPPED = "skipped"
+SCAN_STATUS_FAILED = "failed"
+SCAN_STATUS_TIMEOUT = "timeout"
+
+ProgressCallback = Callable[[Dict[str, Any]], Any]
+
+_scan_executor = ThreadPoolExecutor(max_workers=max(1, DATA_SCAN_WORKERS), thread_name_prefix="data-scan")
+
+
+async def invoke_scan_graph(initial_state: DataScanState, timeout: Optional[float]) -> Dict[str, Any]:
+    """在专用线程池中运行扫描图
+
+    超时只是软超时：线程无法被中断，超时后调用方立即得到 asyncio.TimeoutError，
+    但该扫描仍占用一个线程直到结束，因此并发上限由线程池而非调用方的信号量保证。
+    计时从扫描真正开始执行时算起，不包含在线程池中排队的时间。
+    """
+    loop = asyncio.get_running_loop()
+    started = asyncio.Event()
+
+    def run() -> Dict[str, Any]:
+        loop.call_soon_threadsafe(started.set)
+        return data_scan_agent.invoke(initial_state)
+
+    future = loop.run_in_executor(_scan_executor, run)
+    # 超时后无人等待结果，这里取走异常避免 "exception was never retrieved" 日志
+    future.add_done_callback(lambda done: done.cancelled() or done.exception())
+    try:
+        await started.wait()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    # shield：超时不取消线程池 future，扫描结果被丢弃但线程照常结束
+    return await asyncio.wait_for(asyncio.shield(future), timeout=timeout if timeout and timeout > 0 else None)
+
+
+def is_scannable_file(file_name: str) -> bool:
+    """过滤临时文件和隐藏文件"""
+    name = os.path.basename(file_name)
+    return not name.startswith('.') and not name.endswith(('.tmp', '.temp', '.part', '.crdownload'))
+
+
+def file_fingerprint(file_path: str, content_hash: bool = True) -> Optional[Dict[str, Any]]:
+    """文件指纹：大小 + 修改时间，以及可选的内容哈希（blake2b，分块读取）"""
+    if not os.path.isfile(file_path):
+        return None
+    stat = os.stat(file_path)
+    fingerprint: Dict[str, Any] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if content_hash:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        fingerprint["content"] = digest.hexdigest()
+    return fingerprint
+
 
 class DataProfile:
     """数据画像记录"""
-    def __init__(self, file_path: str, profile: Dict[str, Any], timestamp: str):
+    def __init__(self, file_path: str, profile: Dict[str, Any], timestamp: str, fingerprint: Optional[Dict[str, Any]] = None):
         self.file_path = file_path
         self.file_id = self._generate_file_id(file_path)
         self.profile = profile
         self.timestamp = timestamp
+        self.fingerprint = fingerprint
         self.status = "active"
     
     @staticmethod
@@ -38,6 +111,7 @@ class DataProfile:
             "file_path": self.file_path,
             "profile": self.profile,
             "timestamp": self.timestamp,
+            "fingerprint": self.fingerprint,
             "status": self.status
         }
 
@@ -47,6 +121,12 @@ class DataProfileCache:
     def __init__(self, cache_file: str = None):
         self.cache_file = cache_file or "data_profiles_cache.json"
         self.profiles: Dict[str, DataProfile] = {}
+        # 批量扫描时只标记变更，批次结束后统一写一次文件
+        self._dirty = False
+        self._save_lock = threading.Lock()
+        # 并发保存时较早的快照不能覆盖较新的快照
+        self._snapshot_seq = 0
+        self._written_seq = 0
         self._load_cache()
     
     def _load_cache(self):
@@ -59,29 +139,61 @@ class DataProfileCache:
                         self.profiles[file_id] = DataProfile(
                             file_path=profile_data['file_path'],
                             profile=profile_data['profile'],
-                            timestamp=profile_data['timestamp']
+                            timestamp=profile_data['timestamp'],
+                            fingerprint=profile_data.get('fingerprint')
                         )
                         self.profiles[file_id].status = profile_data.get('status', 'active')
                 logger.info(f"从缓存加载了 {len(self.profiles)} 个数据画像")
             except Exception as e:
                 logger.error(f"加载缓存失败: {e}")
     
-    def _save_cache(self):
-        """保存缓存到文件"""
+    def _snapshot(self) -> Tuple[int, Dict[str, Any]]:
+        self._dirty = False
+        self._snapshot_seq += 1
+        return self._snapshot_seq, {file_id: profile.to_dict() for file_id, profile in self.profiles.items()}
+
+    def _write_cache(self, snapshot: Tuple[int, Dict[str, Any]]):
+        seq, data = snapshot
         try:
-            data = {file_id: profile.to_dict() for file_id, profile in self.profiles.items()}
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            logger.info(f"缓存已保存，包含 {len(self.profiles)} 个数据画像")
+            with self._save_lock:
+                if seq <= self._written_seq:
+                    return
+                self._written_seq = seq
+                with open(self.cache_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+            logger.info(f"缓存已保存，包含 {len(data)} 个数据画像")
         except Exception as e:
             logger.error(f"保存缓存失败: {e}")
+
+    def _save_cache(self):
+        """保存缓存到文件"""
+        self._write_cache(self._snapshot())
+
+    def mark_dirty(self):
+        """标记缓存有未保存的变更，由 save_async 统一写入"""
+        self._dirty = True
+
+    async def save_async(self):
+        """有未保存的变更时写入文件；快照在事件循环中生成，序列化和写文件放到线程中执行"""
+        if not self._dirty:
+            return
+        await asyncio.to_thread(self._write_cache, self._snapshot())
     
-    def add_profile(self, file_path: str, profile: Dict[str, Any]) -> str:
-        """添加新的数据画像"""
+    def add_profile(
+        self,
+        file_path: str,
+        profile: Dict[str, Any],
+        fingerprint: Optional[Dict[str, Any]] = None,
+        save: bool = True,
+    ) -> str:
+        """添加新的数据画像；save=False 时只标记变更"""
         timestamp = datetime.now().isoformat()
-        data_profile = DataProfile(file_path, profile, timestamp)
+        data_profile = DataProfile(file_path, profile, timestamp, fingerprint)
         self.profiles[data_profile.file_id] = data_profile
-        self._save_cache()
+        if save:
+            self._save_cache()
+        else:
+            self.mark_dirty()
         logger.info(f"添加数据画像: {data_profile.file_id} - {file_path}")
         return data_profile.file_id
     
@@ -102,11 +214,14 @@ class DataProfileCache:
             "last_updated": max([p.timestamp for p in active_profiles]) if active_profiles else None
         }
     
-    def remove_profile(self, file_id: str):
-        """移除数据画像"""
+    def remove_profile(self, file_id: str, save: bool = True):
+        """移除数据画像；save=False 时只标记变更"""
         if file_id in self.profiles:
             self.profiles[file_id].status = "deleted"
-            self._save_cache()
+            if save:
+                self._save_cache()
+            else:
+                self.mark_dirty()
             logger.info(f"移除数据画像: {file_id}")
     
     def clear_all(self):
@@ -121,19 +236,83 @@ class DataScanner:
     def __init__(self):
         self.cache = DataProfileCache()
     
-    async def scan_file(self, file_path: str) -> Optional[str]:
+    async def scan_file(self, file_path: str, force: bool = False, scan_mode: Optional[str] = None) -> Optional[str]:
         """
-        扫描单个文件，生成数据画像
+        扫描单个文件，生成数据画像；内容未变化的文件直接复用已有画像
+        
+        Args:
+            scan_mode: full / facts_only / semantic_cached，默认 DATA_SCAN_DEFAULT_MODE
         
         Returns:
             file_id: 文件标识
         """
+        _, file_id = await self._scan_one(file_path, force=force, scan_mode=scan_mode)
+        return file_id
+
+    async def _unchanged_profile(
+        self,
+        file_path: str,
+        fingerprint: Optional[Dict[str, Any]],
+        scan_mode: str,
+        save: bool = True,
+    ) -> Optional[DataProfile]:
+        """与缓存中的指纹比对：大小和修改时间一致直接命中，否则比较内容哈希"""
+        cached = self.cache.get_profile(DataProfile._generate_file_id(file_path))
+        if fingerprint is None or cached is None or cached.status != "active" or not cached.fingerprint:
+            return None
+        if scan_mode != SCAN_MODE_FACTS_ONLY and not (cached.profile or {}).get("Semantic"):
+            # 已有画像是仅规则扫描的结果，本次需要语义信息
+            return None
+        old = cached.fingerprint
+        if old.get("size") != fingerprint["size"]:
+            return None
+        if old.get("mtime_ns") == fingerprint["mtime_ns"]:
+            return cached
+        content = await asyncio.to_thread(file_fingerprint, file_path)
+        if content and content.get("content") == old.get("content"):
+            # 仅修改时间变化（如 touch / 重新拷贝），刷新指纹
+            cached.fingerprint = content
+            self.cache.mark_dirty()
+            if save:
+                await self.cache.save_async()
+            return cached
+        return None
+
+    async def _wait_until_settled(self, file_path: str):
+        """文件刚被修改时等待写入完成"""
+        try:
+            age = time.time() - os.path.getmtime(file_path)
+        except OSError:
+            return
+        if age < DATA_SCAN_SETTLE_SECONDS:
+            await asyncio.sleep(DATA_SCAN_SETTLE_SECONDS - age)
+
+    async def _scan_one(
+        self,
+        file_path: str,
+        force: bool = False,
+        timeout: Optional[float] = None,
+        scan_mode: Optional[str] = None,
+        defer_semantic: bool = False,
+        save: bool = True,
+    ) -> Tuple[str, Optional[str]]:
+        """扫描单个文件，返回 (状态, file_id)
+
+        defer_semantic 时只做规则扫描，语义由调用方批量补全；save=False 时缓存文件由调用方在批次结束后统一保存
+        """
+        timeout = DATA_SCAN_FILE_TIMEOUT_SECONDS if timeout is None else timeout
+        scan_mode = normalize_scan_mode(scan_mode)
         try:
+            await self._wait_until_settled(file_path)
+            stat_fingerprint = await asyncio.to_thread(file_fingerprint, file_path, False)
+            if not force:
+                cached = await self._unchanged_profile(file_path, stat_fingerprint, scan_mode, save=save)
+                if cached is not None:
+                    logger.info(f"文件未变化，跳过扫描: {file_path}")
+                    return SCAN_STATUS_SKIPPED, cached.file_id
+
             logger.info(f"开始扫描文件: {file_path}")
             
-            # 等待文件写入完成
-            await asyncio.sleep(0.2)
-            
             # 调用Data Scan Agent
             initial_state: DataScanState = {
                 "messages": [HumanMessage(content=f"请扫描文件: {file_path}")],
@@ -141,80 +320,178 @@ class DataScanner:
                 "facts": {},
                 "profile": {},
                 "explanation": "",
-                "status": "started"
+                "status": "started",
+                "scan_mode": SCAN_MODE_FACTS_ONLY if defer_semantic else scan_mode,
+                # 画像会持久化到缓存文件，而汇总模式的逐文件明细带 TTL / LRU，到期后引用失效，因此始终保留完整明细
+                "profile_mode": PROFILE_MODE_FULL,
             }
             
-            result = data_scan_agent.invoke(initial_state)
+            result = await invoke_scan_graph(initial_state, timeout)
             
             if result.get("status") == "completed" and result.get("profile"):
                 profile = result["profile"]
-                file_id = self.cache.add_profile(file_path, profile)
+                fingerprint = await asyncio.to_thread(file_fingerprint, file_path)
+                file_id = self.cache.add_profile(file_path, profile, fingerprint, save=False)
+                if save:
+                    await self.cache.save_async()
                 logger.info(f"文件扫描完成: {file_id}")
-                return file_id
+                return SCAN_STATUS_SCANNED, file_id
             else:
                 logger.error(f"文件扫描失败: {file_path}")
-                return None
+                return SCAN_STATUS_FAILED, None
         
+        except asyncio.TimeoutError:
+            logger.error(f"扫描文件超时（{timeout}s）: {file_path}")
+            return SCAN_STATUS_TIMEOUT, None
         except Exception as e:
             logger.error(f"扫描文件时出错: {file_path}, 错误: {e}")
-            return None
+            return SCAN_STATUS_FAILED, None
     
-    async def scan_batch(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+    async def scan_batch(
+        self,
+        file_paths: List[str],
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        force: bool = False,
+        scan_mode: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
         """
-        批量扫描多个文件
+        并发批量扫描多个文件
         
         Args:
             file_paths: 文件路径列表
+            concurrency: 同时扫描的文件数，默认 DATA_SCAN_BATCH_CONCURRENCY
+            timeout: 单个文件的超时秒数，默认 DATA_SCAN_FILE_TIMEOUT_SECONDS
+            progress_callback: 每个文件结束时回调（可为协程函数），参数包含
+                file_path / status / file_id / completed / total
+            force: 忽略指纹，强制重新扫描
+            scan_mode: 扫描模式，默认 DATA_SCAN_BATCH_MODE
         
         Returns:
-            扫描结果列表，包含file_id和profile
+            扫描结果列表（按输入顺序），包含file_id和profile
         """
+        semaphore = asyncio.Semaphore(max(1, concurrency or DATA_SCAN_BATCH_CONCURRENCY))
+        scan_mode = normalize_scan_mode(scan_mode or DATA_SCAN_BATCH_MODE)
+        defer_semantic = self._should_defer_semantic(scan_mode, len(file_paths))
+        total = len(file_paths)
+        completed = 0
+        counts: Dict[str, int] = {}
+        scanned_ids: List[str] = []
+
+        async def run(file_path: str) -> Optional[str]:
+            nonlocal completed
+            async with semaphore:
+                status, file_id = await self._scan_one(
+                    file_path,
+                    force=force,
+                    timeout=timeout,
+                    scan_mode=scan_mode,
+                    defer_semantic=defer_semantic,
+                    save=False,
+                )
+            if status == SCAN_STATUS_SCANNED and file_id:
+                scanned_ids.append(file_id)
+            completed += 1
+            counts[status] = counts.get(status, 0) + 1
+            if progress_callback is not None:
+                try:
+                    outcome = progress_callback({
+                        "file_path": file_path,
+                        "status": status,
+                        "file_id": file_id,
+                        "completed": completed,
+                        "total": total,
+                    })
+                    if asyncio.iscoroutine(outcome):
+                        await outcome
+                except Exception as e:
+                    logger.warning(f"扫描进度回调出错: {e}")
+            return file_id
+
+        file_ids = await asyncio.gather(*(run(file_path) for file_path in file_paths))
+        if defer_semantic:
+            await self._enrich_deferred(scanned_ids, scan_mode)
+        await self.cache.save_async()
+
         results = []
-        
-        for file_path in file_paths:
-            file_id = await self.scan_file(file_path)
+        for file_id in file_ids:
             if file_id:
                 profile = self.cache.get_profile(file_id)
                 if profile:
                     results.append(profile.to_dict())
         
-        logger.info(f"批量扫描完成，共扫描 {len(results)} 个文件")
+        logger.info(f"批量扫描完成，共 {total} 个文件，结果 {len(results)} 个，状态统计: {counts}")
         return results
 
-    async def rescan_with_diff(self, file_paths: List[str]) -> Dict[str, Any]:
+    async def rescan_with_diff(
+        self,
+        file_paths: Optional[List[str]] = None,
+        concurrency: Optional[int] = None,
+        scan_mode: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         增量重扫并返回前后差异
+        指纹未变化的文件只需一次 stat，不会重新调用 Agent
 
         Args:
-            file_paths: 需要重扫的文件路径
+            file_paths: 需要重扫的文件路径，为空时重扫缓存中全部活动画像
+            concurrency: 同时扫描的文件数
+            scan_mode: 扫描模式，默认 DATA_SCAN_BATCH_MODE
 
         Returns:
-            包含新增/变更/不变文件及差异详情
+            包含新增/变更/不变/已删除文件及差异详情
         """
+        if file_paths is None:
+            file_paths = [p.file_path for p in self.cache.get_all_profiles()]
+
         results: List[Dict[str, Any]] = []
         added: List[str] = []
         changed: List[Dict[str, Any]] = []
         unchanged: List[str] = []
+        removed: List[str] = []
+        semaphore = asyncio.Semaphore(max(1, concurrency or DATA_SCAN_BATCH_CONCURRENCY))
+        scan_mode = normalize_scan_mode(scan_mode or DATA_SCAN_BATCH_MODE)
+        defer_semantic = self._should_defer_semantic(scan_mode, len(file_paths))
+        scanned_ids: List[str] = []
+        result_ids: List[str] = []
 
-        for file_path in file_paths:
+        async def rescan(file_path: str) -> None:
             file_id = DataProfile._generate_file_id(file_path)
             old_profile_obj = self.cache.get_profile(file_id)
+            if old_profile_obj is not None and old_profile_obj.status != "active":
+                old_profile_obj = None
             old_profile = old_profile_obj.to_dict() if old_profile_obj else None
 
-            new_file_id = await self.scan_file(file_path)
+            if not os.path.exists(file_path):
+                if old_profile_obj is not None:
+                    self.cache.remove_profile(file_id, save=False)
+                    removed.append(file_path)
+                return
+
+            async with semaphore:
+                status, new_file_id = await self._scan_one(
+                    file_path, scan_mode=scan_mode, defer_semantic=defer_semantic, save=False
+                )
             if not new_file_id:
-                continue
+                return
 
             new_profile_obj = self.cache.get_profile(new_file_id)
             if not new_profile_obj:
-                continue
+                return
 
             new_profile = new_profile_obj.to_dict()
-            results.append(new_profile)
+            result_ids.append(new_file_id)
+            if status == SCAN_STATUS_SCANNED:
+                scanned_ids.append(new_file_id)
 
             if old_profile is None:
                 added.append(file_path)
-                continue
+                return
+
+            if status == SCAN_STATUS_SKIPPED:
+                unchanged.append(file_path)
+                return
 
             diff = self._compare_profiles(
                 old_profile.get("profile", {}),
@@ -229,14 +506,48 @@ class DataScanner:
             else:
                 unchanged.append(file_path)
 
+        await asyncio.gather(*(rescan(file_path) for file_path in file_paths))
+        if defer_semantic:
+            await self._enrich_deferred(scanned_ids, scan_mode)
+        await self.cache.save_async()
+        for file_id in result_ids:
+            profile_obj = self.cache.get_profile(file_id)
+            if profile_obj:
+                results.append(profile_obj.to_dict())
+
         return {
             "rescanned_count": len(results),
             "added_files": added,
             "changed_files": changed,
             "unchanged_files": unchanged,
+            "removed_files": removed,
             "data_profiles": results
         }
 
+    @staticmethod
+    def _should_defer_semantic(scan_mode: str, file_count: int) -> bool:
+        return DATA_SCAN_SEMANTIC_BATCH and scan_mode != SCAN_MODE_FACTS_ONLY and file_count > 1
+
+    async def _enrich_deferred(self, file_ids: List[str], scan_mode: str):
+        """为规则扫描完成的画像批量补全语义（只标记变更，由调用方统一保存）"""
+        profiles = [self.cache.get_profile(file_id) for file_id in dict.fromkeys(file_ids)]
+        profiles = [p for p in profiles if p is not None and not (p.profile or {}).get("Semantic")]
+        if not profiles:
+            return
+        try:
+            result = await asyncio.to_thread(
+                enrich_semantics,
+                [p.profile for p in profiles],
+                scan_mode == SCAN_MODE_SEMANTIC_CACHED,
+            )
+        except Exception as e:
+            logger.error(f"批量语义补全失败: {e}")
+            return
+        for data_profile, semantic in zip(profiles, result.semantics):
+            data_profile.profile = {**data_profile.profile, "Semantic": semantic}
+        self.cache.mark_dirty()
+        logger.info(f"批量语义补全完成: {result.stats()}")
+
     def _compare_profiles(self, old_profile: Dict[str, Any], new_profile: Dict[str, Any]) -> Dict[str, Any]:
         """比较前后画像，返回简化差异摘要"""
         changed_fields: List[str] = []
@@ -253,7 +564,14 @@ class DataScanner:
             "after": {k: new_profile.get(k) for k in changed_fields}
         }
     
-    async def scan_directory(self, directory: str) -> List[Dict[str, Any]]:
+    async def scan_directory(
+        self,
+        directory: str,
+        concurrency: Optional[int] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        force: bool = False,
+        scan_mode: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
         """
         扫描整个目录
         
@@ -264,12 +582,16 @@ class DataScanner:
         
         for root, dirs, files in os.walk(directory):
             for file in files:
-                file_path = os.path.join(root, file)
-                # 过滤临时文件和隐藏文件
-                if not file.startswith('.') and not file.endswith(('.tmp', '.temp')):
-                    file_paths.append(file_path)
+                if is_scannable_file(file):
+                    file_paths.append(os.path.join(root, file))
         
-        return await self.scan_batch(file_paths)
+        return await self.scan_batch(
+            file_paths,
+            concurrency=concurrency,
+            progress_callback=progress_callback,
+            force=force,
+            scan_mode=scan_mode,
+        )
     
     def get_all_data_profiles(self) -> Dict[str, Any]:
         """获取所有数据画像汇总"""
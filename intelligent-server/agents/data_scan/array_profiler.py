@@ -0,0 +1,251 @@
+"""
+NetCDF / HDF5 惰性画像
+
+detect_netcdf / tool_analyze_timeseries 原先以默认参数 open_dataset（解码全部时间与掩码），只返回维度和变量名，
+tool_analyze_timeseries 的句柄也从未关闭。这里改为：
+- xarray 以 chunks=None、decode_times=False、mask_and_scale=False 打开，不依赖 dask，变量数据按需读取
+- 只读取时间坐标本身并单独解码，得到真实的起止时间、步数和频率
+- 变量的 min/max/均值与 nodata 比例在等步长抽样的子数组上计算，读取量由 DATA_SCAN_ARRAY_SAMPLE_SIZE 限定
+- 所有文件句柄通过 with 语句确定性关闭
+"""
+
+import math
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+try:
+    import h5py
+except Exception:
+    h5py = None
+
+DATA_SCAN_ARRAY_SAMPLE_SIZE = int(os.getenv("DATA_SCAN_ARRAY_SAMPLE_SIZE", "100000"))
+DATA_SCAN_ARRAY_MAX_VARIABLES = int(os.getenv("DATA_SCAN_ARRAY_MAX_VARIABLES", "50"))
+
+_TIME_NAMES = ("time", "t", "date", "datetime")
+
+
+def open_lazy_dataset(file_path: str) -> xr.Dataset:
+    """惰性打开 NetCDF：不解码时间、不做掩码缩放、不缓存变量数据"""
+    return xr.open_dataset(file_path, chunks=None, decode_times=False, mask_and_scale=False, cache=False)
+
+
+def strided_slices(shape: Tuple[int, ...], sample_size: int = DATA_SCAN_ARRAY_SAMPLE_SIZE) -> Tuple[slice, ...]:
+    """各维取相同的目标采样数，得到总读取量约为 sample_size 的等步长切片"""
+    if not shape:
+        return ()
+    total = int(np.prod(shape, dtype=np.float64))
+    if total <= sample_size:
+        return tuple(slice(None) for _ in shape)
+    per_dim = max(1, int(sample_size ** (1.0 / len(shape))))
+    return tuple(slice(None, None, max(1, math.ceil(size / per_dim))) for size in shape)
+
+
+def _scalar(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, np.ndarray):
+        value = value.ravel()[0] if value.size else None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="replace")
+    return value
+
+
+def _attr_text(value: Any) -> Optional[str]:
+    value = _scalar(value)
+    return str(value) if value is not None else None
+
+
+def sample_statistics(
+    values: np.ndarray,
+    nodata: List[Any],
+    scale_factor: Any = None,
+    add_offset: Any = None,
+    total_size: Optional[int] = None,
+) -> Dict[str, Any]:
+    """在抽样子数组上统计 min/max/均值与 nodata 比例（结果按 scale_factor / add_offset 换算）"""
+    values = np.asarray(values)
+    sampled = int(values.size)
+    stats: Dict[str, Any] = {
+        "sampled": sampled,
+        "exact": total_size is not None and sampled >= total_size,
+    }
+    if not sampled or not (np.issubdtype(values.dtype, np.number) or values.dtype == np.bool_):
+        return stats
+    flat = values.ravel()
+    mask = np.zeros(flat.shape, dtype=bool)
+    if np.issubdtype(flat.dtype, np.floating):
+        mask |= np.isnan(flat)
+    for fill in nodata:
+        fill = _scalar(fill)
+        if isinstance(fill, (int, float)) and not (isinstance(fill, float) and math.isnan(fill)):
+            mask |= flat == fill
+    valid = flat[~mask]
+    stats["nodata_ratio"] = round(float(mask.sum()) / sampled, 6)
+    if valid.size:
+        scale = float(_scalar(scale_factor)) if _scalar(scale_factor) is not None else 1.0
+        offset = float(_scalar(add_offset)) if _scalar(add_offset) is not None else 0.0
+        stats["min"] = float(valid.min()) * scale + offset
+        stats["max"] = float(valid.max()) * scale + offset
+        stats["mean"] = float(valid.mean(dtype=np.float64)) * scale + offset
+        if scale < 0:
+            stats["min"], stats["max"] = stats["max"], stats["min"]
+    return stats
+
+
+def decode_time_axis(values: np.ndarray, units: Optional[str], calendar: Optional[str] = None) -> Dict[str, Any]:
+    """单独解码时间坐标，返回起止时间、步数和频率"""
+    values = np.asarray(values).ravel()
+    info: Dict[str, Any] = {"steps": int(values.size)}
+    if not values.size:
+        return info
+    try:
+        return {**info, **_decoded_time_range(values, units, calendar)}
+    except Exception:
+        # 单位或日历无法解码（如 "months since" 配合非标准日历、非数值坐标）时只报告步数
+        return info
+
+
+def _decoded_time_range(values: np.ndarray, units: Optional[str], calendar: Optional[str]) -> Dict[str, Any]:
+    info: Dict[str, Any] = {}
+    if units and " since " in units:
+        attrs = {"units": units}
+        if calendar:
+            attrs["calendar"] = calendar
+        decoded = xr.decode_cf(xr.Dataset(coords={"time": ("time", values, attrs)}))["time"]
+    else:
+        decoded = xr.DataArray(values, dims="time")
+    times = decoded.values
+    info["start"] = str(times.min())
+    info["end"] = str(times.max())
+    frequency = None
+    if times.size >= 3:
+        try:
+            frequency = xr.infer_freq(decoded)
+        except Exception:
+            frequency = None
+    if frequency is None and times.size >= 2:
+        deltas = np.diff(np.sort(times))
+        unique = np.unique(deltas)
+        step = pd.to_timedelta(unique[0]) if np.issubdtype(unique.dtype, np.timedelta64) else unique[0]
+        frequency = f"every {step}" if unique.size == 1 else "irregular"
+    info["frequency"] = frequency
+    return info
+
+
+def _find_time_name(ds: xr.Dataset) -> Optional[str]:
+    for name, variable in ds.variables.items():
+        attrs = variable.attrs
+        if attrs.get("axis") == "T" or attrs.get("standard_name") == "time" or " since " in str(attrs.get("units", "")):
+            if variable.ndim == 1:
+                return str(name)
+    for name in ds.variables:
+        if str(name).lower() in _TIME_NAMES and ds[name].ndim == 1:
+            return str(name)
+    return None
+
+
+def profile_netcdf(file_path: str, sample_size: int = DATA_SCAN_ARRAY_SAMPLE_SIZE) -> Dict[str, Any]:
+    """NetCDF 惰性画像，返回 Dimensions / Variables / Has_time 以及 Time、Variable_stats"""
+    with open_lazy_dataset(file_path) as ds:
+        dims = {str(name): int(size) for name, size in ds.sizes.items()}
+        time_name = _find_time_name(ds)
+        time_info = None
+        if time_name is not None:
+            variable = ds[time_name].variable
+            time_info = decode_time_axis(variable.values, variable.attrs.get("units"), variable.attrs.get("calendar"))
+            time_info["name"] = time_name
+
+        variable_stats: Dict[str, Any] = {}
+        for name in list(ds.data_vars)[:DATA_SCAN_ARRAY_MAX_VARIABLES]:
+            variable = ds[name].variable
+            attrs = variable.attrs
+            entry: Dict[str, Any] = {
+                "dims": [str(dim) for dim in variable.dims],
+                "shape": [int(size) for size in variable.shape],
+                "dtype": str(variable.dtype),
+                "units": _attr_text(attrs.get("units")),
+                "long_name": _attr_text(attrs.get("long_name") or attrs.get("standard_name")),
+            }
+            nodata = [attrs.get("_FillValue"), attrs.get("missing_value")]
+            entry["nodata"] = next((_scalar(value) for value in nodata if value is not None), None)
+            index = dict(zip(variable.dims, strided_slices(variable.shape, sample_size)))
+            entry.update(sample_statistics(
+                variable.isel(index).values,
+                nodata,
+                attrs.get("scale_factor"),
+                attrs.get("add_offset"),
+                int(variable.size),
+            ))
+            variable_stats[str(name)] = entry
+
+        return {
+            "Dimensions": dims,
+            "Variables": [str(name) for name in ds.data_vars],
+            "Has_time": time_name is not None,
+            "Time": time_info,
+            "Variable_stats": variable_stats,
+            "Profiling": {
+                "method": "lazy_strided_sample",
+                "sample_size": sample_size,
+                "variables_profiled": len(variable_stats),
+            },
+        }
+
+
+def profile_hdf5(file_path: str, sample_size: int = DATA_SCAN_ARRAY_SAMPLE_SIZE) -> Dict[str, Any]:
+    """HDF5 惰性画像：遍历数据集元数据，数值数据集按等步长切片抽样"""
+    datasets: List[Tuple[str, Any]] = []
+    variable_stats: Dict[str, Any] = {}
+    dims: Dict[str, List[int]] = {}
+    time_info = None
+
+    with h5py.File(file_path, "r") as handle:
+        handle.visititems(lambda name, obj: datasets.append((name, obj)) if isinstance(obj, h5py.Dataset) else None)
+        for name, dataset in datasets:
+            # HDF5 没有统一的维度名，按数据集给出形状
+            dims[name] = [int(size) for size in dataset.shape]
+            if dataset.ndim == 1 and time_info is None:
+                units = _attr_text(dataset.attrs.get("units"))
+                leaf = name.rsplit("/", 1)[-1].lower()
+                if leaf in _TIME_NAMES or (units and " since " in units):
+                    time_info = decode_time_axis(dataset[()], units, _attr_text(dataset.attrs.get("calendar")))
+                    time_info["name"] = name
+            if len(variable_stats) >= DATA_SCAN_ARRAY_MAX_VARIABLES:
+                continue
+            attrs = dataset.attrs
+            entry: Dict[str, Any] = {
+                "shape": [int(size) for size in dataset.shape],
+                "dtype": str(dataset.dtype),
+                "chunks": list(dataset.chunks) if dataset.chunks else None,
+                "units": _attr_text(attrs.get("units")),
+            }
+            nodata = [attrs.get("_FillValue"), attrs.get("missing_value"), attrs.get("nodata")]
+            entry["nodata"] = next((_scalar(value) for value in nodata if value is not None), None)
+            if dataset.dtype.kind in "biuf" and dataset.size:
+                entry.update(sample_statistics(
+                    dataset[strided_slices(dataset.shape, sample_size)],
+                    nodata,
+                    attrs.get("scale_factor"),
+                    attrs.get("add_offset"),
+                    int(dataset.size),
+                ))
+            variable_stats[name] = entry
+
+    return {
+        "Dimensions": dims,
+        "Variables": [name for name, _ in datasets],
+        "Has_time": time_info is not None,
+        "Time": time_info,
+        "Variable_stats": variable_stats,
+        "Profiling": {
+            "method": "lazy_strided_sample",
+            "sample_size": sample_size,
+            "variables_profiled": len(variable_stats),
+        },
+    }
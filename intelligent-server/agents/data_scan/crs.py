@@ -0,0 +1,202 @@
+"""
+CRS 元数据解析缓存
+
+parse_wkt_to_dict 对每个栅格 / 矢量文件都用 WKT 构造 pyproj.CRS 并逐项读取属性，
+而多文件数据集几乎总是共用同一个 CRS。这里按 WKT 哈希缓存解析结果：
+- resolve_crs：WKT（空白归一后）哈希 -> CRS 元数据字典，解析失败的结果同样缓存
+- EPSG 反查（to_epsg 需要查询 proj.db，是 pyproj 解析中最慢的部分）按规范化 WKT 单独缓存，
+  ESRI WKT1 与 WKT2 等不同写法描述同一 CRS 时只查一次
+- crs_to_wkt：pyogrio 返回的 "EPSG:4326" 等用户输入 -> WKT
+- crs_tokens：供对齐阶段比对的 token 集合
+缓存均为进程内 LRU，容量由 DATA_SCAN_CRS_CACHE_SIZE 限定。
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Optional
+
+from pyproj import CRS
+
+DATA_SCAN_CRS_CACHE_SIZE = int(os.getenv("DATA_SCAN_CRS_CACHE_SIZE", "256"))
+
+_TOKEN_KEYS = ("EPSG", "Name", "Wkt", "Projection", "Datum")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _LRUCache:
+    """带命中计数的线程安全 LRU"""
+
+    def __init__(self, size: int = DATA_SCAN_CRS_CACHE_SIZE):
+        self._size = max(1, size)
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        # 在锁外计算，同一 key 并发未命中时最多重复解析一次
+        value = compute()
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._size:
+                self._cache.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._cache)
+        return {"entries": size, "hits": self.hits, "misses": self.misses}
+
+
+_crs_cache = _LRUCache()
+_epsg_cache = _LRUCache()
+_wkt_cache = _LRUCache()
+_token_cache = _LRUCache()
+
+
+def wkt_hash(wkt_str: str) -> str:
+    """空白归一后的 WKT 哈希，缓存键"""
+    normalized = _WHITESPACE.sub(" ", str(wkt_str or "")).strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def lookup_epsg(crs_obj: CRS) -> Optional[int]:
+    """缓存的 EPSG 反查，按规范化 WKT 作键"""
+    try:
+        key = wkt_hash(crs_obj.to_wkt())
+    except Exception:
+        return crs_obj.to_epsg()
+    return _epsg_cache.get_or_compute(key, crs_obj.to_epsg)
+
+
+def _parse_wkt(wkt_str: str) -> Dict[str, Any]:
+    try:
+        # 将 WKT 转换为 CRS 对象
+        crs_obj = CRS.from_wkt(wkt_str)
+        epsg_code = lookup_epsg(crs_obj)
+        is_engineering = bool(getattr(crs_obj, "is_engineering", False))
+        is_projected_like = bool(crs_obj.is_projected or is_engineering)
+
+        # 提取单位：优先读取轴单位，避免 LOCAL_CS / engineering CRS 被误判
+        unit = "Unknown"
+        if crs_obj.axis_info:
+            unit = getattr(crs_obj.axis_info[0], "unit_name", None) or "Unknown"
+        elif crs_obj.is_geographic:
+            unit = "degree"
+
+        # 提取投影信息
+        proj_name = "Unknown"
+        if crs_obj.coordinate_operation and hasattr(crs_obj.coordinate_operation, 'method_name'):
+            proj_name = crs_obj.coordinate_operation.method_name
+        elif is_engineering:
+            proj_name = "Engineering"
+        elif crs_obj.is_projected:
+            proj_name = "Projected"
+        elif crs_obj.is_geographic:
+            proj_name = "Geographic"
+
+        # 提取中央经线
+        cm = "N/A"
+        if crs_obj.coordinate_operation and hasattr(crs_obj.coordinate_operation, 'params'):
+            # 遍历投影参数寻找中央经线
+            for param in crs_obj.coordinate_operation.params:
+                if "central_meridian" in param.name.lower():
+                    cm = f"{param.value}°E"
+                    break
+
+        return {
+            "Name": crs_obj.name,           # 'CGCS2000_3_Degree_GK_CM_113E'
+            "EPSG": f"EPSG:{epsg_code}" if epsg_code else "Unknown",
+            "Datum": crs_obj.datum.name if crs_obj.datum else "Unknown",
+            "Projection": proj_name,
+            "Central_meridian": cm,
+            "Unit": unit,
+            "Is_Projected": is_projected_like,
+            "Is_Engineering": is_engineering,
+        }
+    except Exception as e:
+        # 兜底：如果解析失败，返回基础信息
+        return {"Name": "Parse Error", "Error": str(e)}
+
+
+def resolve_crs(wkt_str: str) -> Dict[str, Any]:
+    """按 WKT 哈希返回 CRS 元数据字典（每次返回新副本，Wkt 为调用方传入的原文）"""
+    if not wkt_str or len(wkt_str) < 10:
+        return {"Name": "Unknown", "Wkt": wkt_str}
+    info = _crs_cache.get_or_compute(wkt_hash(wkt_str), lambda: _parse_wkt(wkt_str))
+    return {**info, "Wkt": wkt_str}
+
+
+def crs_to_wkt(crs_input: Optional[str]) -> str:
+    """把 "EPSG:4326"、PROJ 字符串或 WKT 等用户输入转换为 WKT，无法解析时原样返回"""
+    if not crs_input:
+        return ""
+
+    def compute() -> str:
+        try:
+            return CRS.from_user_input(crs_input).to_wkt()
+        except Exception:
+            return str(crs_input)
+
+    return _wkt_cache.get_or_compute(wkt_hash(crs_input), compute)
+
+
+def _tokens_for(crs: Any) -> FrozenSet[str]:
+    tokens = set()
+    if isinstance(crs, dict):
+        for key in _TOKEN_KEYS:
+            value = crs.get(key)
+            if value:
+                tokens.add(str(value).strip().lower())
+        # 缺少 EPSG 时由 WKT 补全，使 "EPSG:xxxx" 形式的期望值也能匹配
+        if not crs.get("EPSG") and crs.get("Wkt"):
+            resolved = resolve_crs(str(crs["Wkt"]))
+            for key in ("EPSG", "Name"):
+                if resolved.get(key) and resolved.get(key) != "Unknown":
+                    tokens.add(str(resolved[key]).strip().lower())
+    elif isinstance(crs, str) and crs.strip():
+        tokens.add(crs.strip().lower())
+        resolved = resolve_crs(crs_to_wkt(crs))
+        for key in ("EPSG", "Name"):
+            if resolved.get(key) and resolved.get(key) not in ("Unknown", "Parse Error"):
+                tokens.add(str(resolved[key]).strip().lower())
+    return frozenset(tokens)
+
+
+def crs_tokens(crs: Any) -> FrozenSet[str]:
+    """CRS 字典或字符串 -> 小写 token 集合（EPSG / Name / WKT / 投影 / 基准面）"""
+    if isinstance(crs, dict):
+        key = "dict:" + wkt_hash("|".join(f"{name}={crs.get(name)}" for name in _TOKEN_KEYS))
+    elif isinstance(crs, str):
+        key = "str:" + wkt_hash(crs)
+    else:
+        return frozenset()
+    return _token_cache.get_or_compute(key, lambda: _tokens_for(crs))
+
+
+def crs_cache_metrics() -> Dict[str, Any]:
+    return {
+        "crs": _crs_cache.metrics(),
+        "epsg": _epsg_cache.metrics(),
+        "user_input": _wkt_cache.metrics(),
+        "tokens": _token_cache.metrics(),
+    }
+
+
+def clear_crs_cache() -> None:
+    for cache in (_crs_cache, _epsg_cache, _wkt_cache, _token_cache):
+        cache.clear()
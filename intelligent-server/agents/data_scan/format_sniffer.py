@@ -0,0 +1,153 @@
+"""
+基于文件头的格式嗅探
+
+detect_json 原先 json.load 整个文件只为判断 type 是否为 FeatureCollection，几百 MB 的 GeoJSON 会被完整解析两次
+（检测一次，gpd.read_file 再一次）。这里只读取有界前缀：
+- JSON：优先用 ijson 增量解析，只消费到能判定类型为止；未安装 ijson 时对前缀做正则判断
+- 区分 GeoJSON（FeatureCollection / Feature）、NDJSON（逐行 JSON，含 GeoJSON 序列）、对象数组与普通 JSON
+- 魔数识别 TIFF / BigTIFF、NetCDF classic、HDF5（含 NetCDF-4）、zip、gzip
+检测代价与前缀大小相关，与文件大小无关。
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, Optional
+
+try:
+    import ijson
+except Exception:
+    ijson = None
+
+DATA_SCAN_SNIFF_BYTES = int(os.getenv("DATA_SCAN_SNIFF_BYTES", "65536"))
+
+JSON_GEOJSON = "geojson"
+JSON_NDJSON = "ndjson"
+JSON_GEOJSON_SEQ = "geojson_seq"
+JSON_ARRAY_OF_OBJECTS = "array_of_objects"
+JSON_OTHER = "json"
+JSON_INVALID = "invalid"
+
+_GEOJSON_TYPES = {"FeatureCollection", "Feature"}
+_HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+_MAGIC = (
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"II+\x00", "tiff"),
+    (b"MM\x00+", "tiff"),
+    (b"CDF\x01", "netcdf"),
+    (b"CDF\x02", "netcdf"),
+    (b"CDF\x05", "netcdf"),
+    (_HDF5_SIGNATURE, "hdf5"),
+    (b"PK\x03\x04", "zip"),
+    (b"PK\x05\x06", "zip"),
+    (b"\x1f\x8b", "gzip"),
+)
+# 正则判断只接受 GeoJSON 特有的结构，避免 {"config": {"features": [...]}} 之类的普通 JSON 被误判
+_COLLECTION_PATTERN = re.compile(rb'"type"\s*:\s*"FeatureCollection"')
+_TOP_FEATURE_PATTERN = re.compile(rb'\{\s*"type"\s*:\s*"Feature"')
+_FEATURES_PATTERN = re.compile(rb'"features"\s*:\s*\[\s*\{\s*"type"\s*:\s*"Feature"')
+
+
+def read_prefix(file_path: str, size: int = DATA_SCAN_SNIFF_BYTES) -> bytes:
+    with open(file_path, "rb") as handle:
+        return handle.read(max(1, size))
+
+
+def sniff_magic(prefix: bytes) -> Optional[str]:
+    """按魔数识别容器格式，无法识别时返回 None"""
+    for signature, kind in _MAGIC:
+        if prefix.startswith(signature):
+            return kind
+    # HDF5 允许在 512、1024、2048… 偏移处带用户块
+    offset = 512
+    while offset + len(_HDF5_SIGNATURE) <= len(prefix):
+        if prefix[offset:offset + len(_HDF5_SIGNATURE)] == _HDF5_SIGNATURE:
+            return "hdf5"
+        offset *= 2
+    return None
+
+
+class _BoundedReader:
+    """只允许读取前 limit 个字节的文件包装，保证增量解析的读取量有界"""
+
+    def __init__(self, handle: Any, limit: int):
+        self._handle = handle
+        self._remaining = limit
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._handle.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+def _strip_prefix(prefix: bytes) -> bytes:
+    if prefix.startswith(b"\xef\xbb\xbf"):
+        prefix = prefix[3:]
+    return prefix.lstrip()
+
+
+def _sniff_ndjson(prefix: bytes) -> Optional[str]:
+    """前缀中至少两行各自是完整的 JSON 对象时判定为 NDJSON"""
+    lines = [line.strip() for line in prefix.split(b"\n")]
+    complete = [line for line in lines[:-1] if line]
+    if len(complete) < 2:
+        return None
+    records = []
+    for line in complete[:2]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict):
+            return None
+        records.append(record)
+    return JSON_GEOJSON_SEQ if records[0].get("type") in _GEOJSON_TYPES else JSON_NDJSON
+
+
+def _sniff_with_ijson(file_path: str, limit: int) -> str:
+    with open(file_path, "rb") as handle:
+        if handle.read(3) != b"\xef\xbb\xbf":
+            handle.seek(0)
+        events = ijson.parse(_BoundedReader(handle, limit))
+        try:
+            for path, event, value in events:
+                if path == "" and event == "start_array":
+                    continue
+                if path == "item":
+                    return JSON_ARRAY_OF_OBJECTS if event == "start_map" else JSON_OTHER
+                if path == "type" and event == "string":
+                    return JSON_GEOJSON if value in _GEOJSON_TYPES else JSON_OTHER
+                if path == "features.item.type" and event == "string" and value == "Feature":
+                    # type 字段可能排在 features 之后
+                    return JSON_GEOJSON
+        except Exception:
+            # 前缀被截断或内容非法，按已读取的部分判断
+            pass
+    return JSON_OTHER
+
+
+def _sniff_with_regex(prefix: bytes) -> str:
+    if prefix.startswith(b"["):
+        return JSON_ARRAY_OF_OBJECTS if prefix[1:].lstrip().startswith(b"{") else JSON_OTHER
+    if _COLLECTION_PATTERN.search(prefix) or _TOP_FEATURE_PATTERN.match(prefix) or _FEATURES_PATTERN.search(prefix):
+        return JSON_GEOJSON
+    return JSON_OTHER
+
+
+def sniff_json(file_path: str, prefix_bytes: int = DATA_SCAN_SNIFF_BYTES) -> Dict[str, Any]:
+    """读取有界前缀判断 JSON 的具体形态"""
+    prefix = _strip_prefix(read_prefix(file_path, prefix_bytes))
+    if not prefix or prefix[:1] not in (b"{", b"["):
+        return {"kind": JSON_INVALID, "method": "prefix"}
+    if prefix.startswith(b"{"):
+        ndjson_kind = _sniff_ndjson(prefix)
+        if ndjson_kind:
+            return {"kind": ndjson_kind, "method": "prefix_lines"}
+    if ijson is not None:
+        return {"kind": _sniff_with_ijson(file_path, prefix_bytes), "method": "ijson"}
+    return {"kind": _sniff_with_regex(prefix), "method": "regex"}
@@ -1,10 +1,20 @@
 import json
-from typing import Dict, Any, List
+import os
+from typing import Dict, Any, List, Optional
 from langchain.messages import HumanMessage, SystemMessage, ToolMessage
 from langgraph.graph import StateGraph, START, END
 from pydantic import BaseModel, Field
 from . import tools
-from .tools import DataScanState, data_scan_model
+from .tools import DATA_SCAN_MODEL_NAME, DataScanState, data_scan_model
+from .profile_summary import compact_prepare_result, should_summarize, summarize_profile
+from .semantic_cache import get_semantic_cache, profile_hash
+
+# full: 每次调用 LLM 生成 Semantic；facts_only: 只做确定性扫描；semantic_cached: 画像未变化时复用 Semantic
+SCAN_MODE_FULL = "full"
+SCAN_MODE_FACTS_ONLY = "facts_only"
+SCAN_MODE_SEMANTIC_CACHED = "semantic_cached"
+SCAN_MODES = (SCAN_MODE_FULL, SCAN_MODE_FACTS_ONLY, SCAN_MODE_SEMANTIC_CACHED)
+DATA_SCAN_DEFAULT_MODE = os.getenv("DATA_SCAN_DEFAULT_MODE", SCAN_MODE_FULL)
 
 
 class SemanticPayload(BaseModel):
@@ -17,6 +27,15 @@ class SemanticEnvelope(BaseModel):
     Semantic: SemanticPayload = Field(default_factory=SemanticPayload)
 
 
+def normalize_scan_mode(scan_mode: Optional[str]) -> str:
+    """规范化扫描模式，兼容 facts-only 等写法，未知值退回默认模式"""
+    mode = (scan_mode or DATA_SCAN_DEFAULT_MODE or SCAN_MODE_FULL).strip().lower().replace("-", "_")
+    if mode in SCAN_MODES:
+        return mode
+    fallback = DATA_SCAN_DEFAULT_MODE.strip().lower().replace("-", "_")
+    return fallback if fallback in SCAN_MODES else SCAN_MODE_FULL
+
+
 def to_dict(model_obj: Any) -> Dict[str, Any]:
     if hasattr(model_obj, "model_dump"):
         return model_obj.model_dump()
@@ -27,10 +46,21 @@ def to_dict(model_obj: Any) -> Dict[str, Any]:
     return {}
 
 
+def _compact_step_result(name: str, result: Dict[str, Any], summary_profile: Dict[str, Any]) -> Dict[str, Any]:
+    if name == "tool_prepare_file":
+        return compact_prepare_result(result)
+    if name == "tool_analyze_dataset" and result.get("status") == "success":
+        data = {key: value for key, value in summary_profile.items() if key != "Validation"}
+        return {**result, "data": data}
+    if name == "tool_validate_profile":
+        return {**result, "data": summary_profile.get("Validation")}
+    return result
+
+
 def tool_node(state: DataScanState) -> Dict[str, Any]:
     """
     确定性扫描阶段（规则优先，避免LLM主导扫描过程）
-    执行顺序：prepare -> detect -> analyze_dataset -> validate
+    执行顺序：prepare -> detect -> analyze_dataset -> validate -> summarize（数据源较多时）
     """
     file_path = state.get("file_path", "")
     tool_messages = []
@@ -71,6 +101,14 @@ def tool_node(state: DataScanState) -> Dict[str, Any]:
 
     summary_profile["Validation"] = validation_data
 
+    # 校验基于完整明细；之后再汇总，避免逐文件明细进入 ToolMessage、SSE 与提示词
+    if should_summarize(summary_profile, state.get("profile_mode")):
+        summary_profile = summarize_profile(summary_profile)
+        step_results = [
+            (name, _compact_step_result(name, result, summary_profile))
+            for name, result in step_results
+        ]
+
     for idx, (name, result) in enumerate(step_results):
         tool_messages.append(ToolMessage(
             content=json.dumps(result, ensure_ascii=False),
@@ -85,62 +123,96 @@ def tool_node(state: DataScanState) -> Dict[str, Any]:
     }
 
 
-def llm_node(state: DataScanState) -> Dict[str, Any]:
-    """
-    LLM只做语义补全，不参与工具调度与事实抽取
-    """
-    profile = state.get("profile", {}) or {}
+SEMANTIC_SYSTEM_PROMPT = """你是GIS数据解释专家，负责把结构化扫描结果转成可读语义信息。
 
-    system_prompt = """你是GIS数据解释专家，负责把结构化扫描结果转成可读语义信息。
+任务目标：
+1) 只基于输入画像生成 Semantic，不得虚构任何未出现的信息。
+2) 语义需可追溯到已有字段，例如：Form、Source_forms、Spatial、Temporal、Quality、Validation、data_sources。
+   汇总画像没有 data_sources，改为 Source_groups：同构数据源的分组，count 为该组文件数。
+3) 若关键信息缺失，使用保守表述（如“未明确提供时间分辨率”），不要猜测。
 
-    任务目标：
-    1) 只基于输入画像生成 Semantic，不得虚构任何未出现的信息。
-    2) 语义需可追溯到已有字段，例如：Form、Source_forms、Spatial、Temporal、Quality、Validation、data_sources。
-    3) 若关键信息缺失，使用保守表述（如“未明确提供时间分辨率”），不要猜测。
+输出要求（你将被结构化输出约束）：
+- Semantic.Abstract: 1-2句中文摘要，优先覆盖数据形态、时空特征、质量状态。
+- Semantic.Applications: 2-5个应用场景短语，必须由已有事实支持；避免空泛词和重复项。
+- Semantic.Tags: 3-5个主题标签，优先使用领域词、数据形态词、时空词（例如 hydrology, raster, timeseries, validation）。
 
-    输出要求（你将被结构化输出约束）：
-    - Semantic.Abstract: 1-2句中文摘要，优先覆盖数据形态、时空特征、质量状态。
-    - Semantic.Applications: 2-5个应用场景短语，必须由已有事实支持；避免空泛词和重复项。
-    - Semantic.Tags: 3-5个主题标签，优先使用领域词、数据形态词、时空词（例如 hydrology, raster, timeseries, validation）。
+质量约束：
+- 不要输出与输入冲突的描述。
+- 若 Validation 中存在 issues/warnings，Abstract 中应简要体现风险。
+- 若 Temporal.Has_time 为 false，不要写“长期序列”“多年变化”等时间序列结论。
+- 若 Source_count > 1，可体现“多源数据”特征；否则避免“多源融合”措辞。
+"""
 
-    质量约束：
-    - 不要输出与输入冲突的描述。
-    - 若 Validation 中存在 issues/warnings，Abstract 中应简要体现风险。
-    - 若 Temporal.Has_time 为 false，不要写“长期序列”“多年变化”等时间序列结论。
-    - 若 Source_count > 1，可体现“多源数据”特征；否则避免“多源融合”措辞。
-    """
 
+DEFAULT_SEMANTIC = {
+    "Abstract": "基于规则扫描生成的数据画像",
+    "Applications": ["数据入模前质检"],
+    "Tags": ["gis", "data-scan", "validation"],
+}
+
+
+def generate_semantic(profile: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    调用 LLM 为一个画像生成 Semantic，失败时返回 None
+    """
     user_prompt = f"""请基于以下结构化数据画像补全Semantic：
         {json.dumps(profile, ensure_ascii=False)}
     """
 
     structured_llm = data_scan_model.with_structured_output(SemanticEnvelope)
-    semantic_data = {
-        "Abstract": "基于规则扫描生成的数据画像",
-        "Applications": ["数据入模前质检"],
-        "Tags": ["gis", "data-scan", "validation"],
-    }
     try:
         response = structured_llm.invoke([
-            SystemMessage(content=system_prompt),
+            SystemMessage(content=SEMANTIC_SYSTEM_PROMPT),
             HumanMessage(content=user_prompt),
         ])
         payload = to_dict(response)
         semantic_candidate = payload.get("Semantic", payload)
         if isinstance(semantic_candidate, dict):
-            semantic_data = {
+            return {
                 "Abstract": semantic_candidate.get("Abstract"),
                 "Applications": semantic_candidate.get("Applications"),
                 "Tags": semantic_candidate.get("Tags"),
             }
     except Exception:
         pass
+    return None
+
+
+def llm_node(state: DataScanState) -> Dict[str, Any]:
+    """
+    LLM只做语义补全，不参与工具调度与事实抽取
+    facts_only 模式跳过 LLM；semantic_cached 模式在确定性画像哈希未变时复用缓存的 Semantic
+    """
+    profile = state.get("profile", {}) or {}
+    scan_mode = normalize_scan_mode(state.get("scan_mode"))
+
+    if scan_mode == SCAN_MODE_FACTS_ONLY:
+        return {
+            "messages": [],
+            "status": "completed",
+            "profile": profile,
+            "facts": {"semantic_source": "skipped"},
+        }
+
+    cache = get_semantic_cache()
+    cache_key = profile_hash(profile, DATA_SCAN_MODEL_NAME)
+    semantic_data = cache.get(cache_key) if scan_mode == SCAN_MODE_SEMANTIC_CACHED else None
+    semantic_source = "cache"
+    if semantic_data is None:
+        semantic_data = generate_semantic(profile)
+        semantic_source = "llm"
+        if semantic_data is not None:
+            cache.put(cache_key, semantic_data)
+        else:
+            semantic_data = dict(DEFAULT_SEMANTIC)
+            semantic_source = "default"
 
     merged_profile = {**profile, "Semantic": semantic_data}
     return {
         "messages": [],
         "status": "completed",
         "profile": merged_profile,
+        "facts": {"semantic_source": semantic_source, "profile_hash": cache_key},
     }
 
 
@@ -0,0 +1,400 @@
+"""
+大型数据集的汇总画像
+
+analyze_dataset 为每个数据源写入完整明细（CRS 解析、范围、质量、属性），含上千个瓦片的压缩包画像可达数 MB，
+随后又被序列化进 ToolMessage、SSE final 事件和 LLM 提示词。汇总模式下：
+- 同构数据源按 (形态, CRS, 分辨率, 数据类型) 分组，只保留数量、范围并集、年份列表、质量计数与少量样例文件名
+- 逐文件明细写入旁路存储（配置了 MONGO_URI / MONGO_DB_NAME 时为 dataScanSourceDetails 集合，带 TTL；否则进程内 LRU），
+  画像中只保留 Source_details 引用，按需通过 load_source_details 分页读取；
+  明细会过期，需要长期保存的画像（如 DataScanner 的画像缓存）应使用 full 模式
+- 校验在完整明细上执行，汇总后只截断过长的 issues / warnings 列表
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SOURCE_DETAIL_COLLECTION = "dataScanSourceDetails"
+# auto: 数据源数量超过阈值时汇总；full: 始终保留逐文件明细；summary: 多数据源时始终汇总
+DATA_SCAN_PROFILE_MODE = os.getenv("DATA_SCAN_PROFILE_MODE", "auto").strip().lower()
+DATA_SCAN_SUMMARY_THRESHOLD = int(os.getenv("DATA_SCAN_SUMMARY_THRESHOLD", "20"))
+DATA_SCAN_SUMMARY_SAMPLE_FILES = int(os.getenv("DATA_SCAN_SUMMARY_SAMPLE_FILES", "5"))
+DATA_SCAN_SUMMARY_MAX_MESSAGES = int(os.getenv("DATA_SCAN_SUMMARY_MAX_MESSAGES", "20"))
+DATA_SCAN_SOURCE_DETAIL_TTL_DAYS = int(os.getenv("DATA_SCAN_SOURCE_DETAIL_TTL_DAYS", "7"))
+_MEMORY_DETAIL_SETS = 64
+_TOP_QUALITY_ISSUES = 5
+
+PROFILE_MODE_AUTO = "auto"
+PROFILE_MODE_FULL = "full"
+PROFILE_MODE_SUMMARY = "summary"
+PROFILE_MODES = (PROFILE_MODE_AUTO, PROFILE_MODE_FULL, PROFILE_MODE_SUMMARY)
+
+# 汇总后 CRS 只保留可比对的字段，完整 WKT 留在明细中
+_CRS_SUMMARY_KEYS = ("Name", "EPSG", "Datum", "Projection", "Unit", "Is_Projected", "Is_Engineering")
+
+
+def normalize_profile_mode(profile_mode: Optional[str]) -> str:
+    mode = str(profile_mode or DATA_SCAN_PROFILE_MODE).strip().lower()
+    return mode if mode in PROFILE_MODES else PROFILE_MODE_AUTO
+
+
+def should_summarize(profile: Dict[str, Any], profile_mode: Optional[str] = None) -> bool:
+    sources = profile.get("data_sources") or []
+    if not isinstance(sources, list) or len(sources) <= 1:
+        return False
+    mode = normalize_profile_mode(profile_mode)
+    if mode == PROFILE_MODE_FULL:
+        return False
+    if mode == PROFILE_MODE_SUMMARY:
+        return True
+    return len(sources) > DATA_SCAN_SUMMARY_THRESHOLD
+
+
+def _crs_of(source: Dict[str, Any]) -> Any:
+    spatial = source.get("spatial")
+    return spatial.get("Crs") if isinstance(spatial, dict) else None
+
+
+def _crs_token(crs: Any) -> Optional[str]:
+    if isinstance(crs, dict):
+        token = crs.get("EPSG") or crs.get("Name")
+        return str(token) if token else None
+    return str(crs) if crs else None
+
+
+def _compact_crs(crs: Any) -> Any:
+    if isinstance(crs, dict):
+        return {key: crs.get(key) for key in _CRS_SUMMARY_KEYS if crs.get(key) is not None}
+    return crs
+
+
+def _resolution_token(resolution: Any) -> Optional[Tuple[Any, ...]]:
+    """分辨率保留 6 位有效数字，避免浮点误差把同一分辨率拆成多组"""
+    if not isinstance(resolution, dict):
+        return None
+    token = []
+    for axis in ("x", "y"):
+        value = resolution.get(axis)
+        try:
+            token.append(float(f"{float(value):.6g}"))
+        except (TypeError, ValueError):
+            token.append(value)
+    return tuple(token)
+
+
+def _dtype_token(source: Dict[str, Any]) -> Optional[str]:
+    value = source.get("Data_Type") or source.get("Geometry_type")
+    if isinstance(value, (list, tuple)):
+        value = ",".join(sorted(str(item) for item in value))
+    return str(value) if value else None
+
+
+def group_key(source: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        source.get("form"),
+        _crs_token(_crs_of(source)),
+        _resolution_token(source.get("resolution")),
+        _dtype_token(source),
+    )
+
+
+def _union_extent(extent: Optional[Dict[str, Any]], other: Any) -> Optional[Dict[str, Any]]:
+    if not isinstance(other, dict):
+        return extent
+    if extent is None:
+        return dict(other)
+    for key, pick in (("min_x", min), ("min_y", min), ("max_x", max), ("max_y", max)):
+        current, value = extent.get(key), other.get(key)
+        if isinstance(value, (int, float)):
+            extent[key] = pick(current, value) if isinstance(current, (int, float)) else value
+    return extent
+
+
+class _GroupBuilder:
+    def __init__(self, group_id: str, source: Dict[str, Any]):
+        self.group_id = group_id
+        self.form = source.get("form")
+        self.crs = _compact_crs(_crs_of(source))
+        self.resolution = source.get("resolution")
+        self.dtype = _dtype_token(source)
+        self.extent: Optional[Dict[str, Any]] = None
+        self.years: set = set()
+        self.has_time = False
+        self.quality: Dict[str, int] = {}
+        self.issues: Dict[str, int] = {}
+        self.sample_files: List[str] = []
+        self.sources: List[Dict[str, Any]] = []
+
+    def add(self, source: Dict[str, Any]) -> None:
+        self.sources.append(source)
+        spatial = source.get("spatial")
+        if isinstance(spatial, dict):
+            self.extent = _union_extent(self.extent, spatial.get("Extent"))
+        temporal = source.get("temporal") or {}
+        self.has_time = self.has_time or bool(temporal.get("Has_time"))
+        for year in temporal.get("Years") or []:
+            try:
+                self.years.add(int(year))
+            except (TypeError, ValueError):
+                continue
+        quality = source.get("quality") or {}
+        status = quality.get("status") or "unknown"
+        self.quality[status] = self.quality.get(status, 0) + 1
+        for issue in quality.get("issues") or []:
+            self.issues[str(issue)] = self.issues.get(str(issue), 0) + 1
+        if len(self.sample_files) < DATA_SCAN_SUMMARY_SAMPLE_FILES:
+            self.sample_files.append(os.path.basename(str(source.get("file_path") or "")))
+
+    def summary(self) -> Dict[str, Any]:
+        years = sorted(self.years)
+        top_issues = sorted(self.issues.items(), key=lambda item: (-item[1], item[0]))[:_TOP_QUALITY_ISSUES]
+        group = {
+            "group": self.group_id,
+            "form": self.form,
+            "count": len(self.sources),
+            "spatial": {key: value for key, value in (("Crs", self.crs), ("Extent", self.extent)) if value},
+            "resolution": self.resolution,
+            "data_type": self.dtype,
+            "temporal": {
+                "Has_time": self.has_time or len(years) >= 2,
+                "Years": years,
+            },
+            "quality": {
+                "status_counts": self.quality,
+                "top_issues": [{"issue": issue, "count": count} for issue, count in top_issues],
+            },
+            "sample_files": self.sample_files,
+        }
+        return {key: value for key, value in group.items() if value not in [None, [], {}]}
+
+
+def group_sources(sources: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """按同构键分组，返回 (分组汇总, 分组 id -> 逐文件明细)"""
+    builders: "OrderedDict[Tuple[Any, ...], _GroupBuilder]" = OrderedDict()
+    for source in sources:
+        if not isinstance(source, dict):
+            continue
+        key = group_key(source)
+        builder = builders.get(key)
+        if builder is None:
+            builder = builders[key] = _GroupBuilder(f"g{len(builders)}", source)
+        builder.add(source)
+    groups = [builder.summary() for builder in builders.values()]
+    details = {builder.group_id: builder.sources for builder in builders.values()}
+    return groups, details
+
+
+def truncate_messages(messages: List[Any], limit: int = DATA_SCAN_SUMMARY_MAX_MESSAGES) -> List[Any]:
+    """逐文件的校验提示只保留前 limit 条"""
+    if not isinstance(messages, list) or len(messages) <= limit:
+        return messages
+    return messages[:limit] + [f"……另有 {len(messages) - limit} 条同类提示，见 Source_details"]
+
+
+def _default_db() -> Any:
+    mongo_uri = os.getenv("MONGO_URI")
+    db_name = os.getenv("MONGO_DB_NAME")
+    if not mongo_uri or not db_name:
+        return None
+    from pymongo import MongoClient
+
+    return MongoClient(mongo_uri)[db_name]
+
+
+class SourceDetailStore:
+    """逐文件明细的旁路存储，Mongo 不可用时只保存在进程内"""
+
+    def __init__(self, db_getter: Optional[Callable[[], Any]] = _default_db, size: int = _MEMORY_DETAIL_SETS):
+        self._db_getter = db_getter
+        self._db = None
+        self._db_failed = False
+        self._size = max(1, size)
+        self._cache: "OrderedDict[str, Dict[str, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stored_sets = 0
+        self.stored_sources = 0
+        self.missing = 0
+
+    def _collection(self):
+        if self._db_failed or self._db_getter is None:
+            return None
+        try:
+            if self._db is None:
+                self._db = self._db_getter()
+                if self._db is None:
+                    self._db_failed = True
+                    return None
+                collection = self._db[SOURCE_DETAIL_COLLECTION]
+                collection.create_index([("details_id", 1), ("group", 1), ("seq", 1)])
+                if DATA_SCAN_SOURCE_DETAIL_TTL_DAYS > 0:
+                    collection.create_index("created_at", expireAfterSeconds=DATA_SCAN_SOURCE_DETAIL_TTL_DAYS * 86400)
+            return self._db[SOURCE_DETAIL_COLLECTION]
+        except Exception as e:
+            logger.warning(f"数据源明细集合不可用，改用进程内存储: {e}")
+            self._db_failed = True
+            return None
+
+    def _remember(self, details_id: str, details: Dict[str, List[Dict[str, Any]]]) -> None:
+        with self._lock:
+            self._cache[details_id] = details
+            self._cache.move_to_end(details_id)
+            while len(self._cache) > self._size:
+                self._cache.popitem(last=False)
+
+    def put(self, details: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """按内容哈希写入一组明细，返回画像中保留的引用"""
+        payload = json.dumps(details, ensure_ascii=False, sort_keys=True, default=str)
+        details_id = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+        total = sum(len(sources) for sources in details.values())
+        with self._lock:
+            known = details_id in self._cache
+        self._remember(details_id, details)
+        store = "memory"
+        collection = self._collection()
+        if collection is not None:
+            store = "mongo"
+            if not known:
+                try:
+                    if collection.find_one({"details_id": details_id}, {"_id": 1}) is None:
+                        now = datetime.utcnow()
+                        collection.insert_many([
+                            {
+                                "details_id": details_id,
+                                "group": group_id,
+                                "seq": seq,
+                                "source": json.loads(json.dumps(source, ensure_ascii=False, default=str)),
+                                "created_at": now,
+                            }
+                            for group_id, sources in details.items()
+                            for seq, source in enumerate(sources)
+                        ], ordered=False)
+                except Exception as e:
+                    logger.warning(f"写入数据源明细失败，仅保留进程内副本: {e}")
+                    store = "memory"
+        if not known:
+            self.stored_sets += 1
+            self.stored_sources += total
+        return {"id": details_id, "sources": total, "groups": len(details), "store": store}
+
+    def get(
+        self,
+        details_id: str,
+        group: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> Optional[Dict[str, Any]]:
+        """分页读取明细；明细已过期或不存在时返回 None"""
+        offset, limit = max(0, offset), max(1, limit)
+        with self._lock:
+            details = self._cache.get(details_id)
+            if details is not None:
+                self._cache.move_to_end(details_id)
+        if details is not None:
+            sources = [
+                dict(source, group=group_id)
+                for group_id, items in details.items()
+                if group is None or group_id == group
+                for source in items
+            ]
+            return {"id": details_id, "group": group, "total": len(sources), "sources": sources[offset:offset + limit]}
+
+        collection = self._collection()
+        if collection is None:
+            self.missing += 1
+            return None
+        query: Dict[str, Any] = {"details_id": details_id}
+        if group is not None:
+            query["group"] = group
+        try:
+            total = collection.count_documents(query)
+            docs = list(
+                collection.find(query, {"_id": 0, "group": 1, "source": 1})
+                .sort([("group", 1), ("seq", 1)])
+                .skip(offset)
+                .limit(limit)
+            )
+        except Exception as e:
+            logger.warning(f"读取数据源明细失败: {e}")
+            return None
+        if not total:
+            self.missing += 1
+            return None
+        return {
+            "id": details_id,
+            "group": group,
+            "total": total,
+            "sources": [dict(doc.get("source") or {}, group=doc.get("group")) for doc in docs],
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._cache)
+        return {
+            "cached_sets": size,
+            "stored_sets": self.stored_sets,
+            "stored_sources": self.stored_sources,
+            "missing": self.missing,
+            "persistent": not self._db_failed and self._db is not None,
+        }
+
+
+_detail_store: Optional[SourceDetailStore] = None
+_detail_store_lock = threading.Lock()
+
+
+def get_source_detail_store() -> SourceDetailStore:
+    global _detail_store
+    with _detail_store_lock:
+        if _detail_store is None:
+            _detail_store = SourceDetailStore()
+        return _detail_store
+
+
+def summarize_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """把 data_sources 替换为 Source_groups + Source_details 引用"""
+    sources = profile.get("data_sources") or []
+    groups, details = group_sources(sources)
+    summary = {key: value for key, value in profile.items() if key != "data_sources"}
+    summary["Source_groups"] = groups
+    summary["Source_details"] = get_source_detail_store().put(details)
+    summary["Profile_mode"] = PROFILE_MODE_SUMMARY
+
+    validation = summary.get("Validation")
+    if isinstance(validation, dict):
+        validation = dict(validation)
+        for key in ("issues", "warnings"):
+            messages = validation.get(key)
+            if isinstance(messages, list) and len(messages) > DATA_SCAN_SUMMARY_MAX_MESSAGES:
+                validation[f"{key}_total"] = len(messages)
+                validation[key] = truncate_messages(messages)
+        summary["Validation"] = validation
+    return summary
+
+
+def compact_prepare_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """tool_prepare_file 结果中的 all_files / primary_candidates 只保留数量与样例"""
+    if not isinstance(result, dict):
+        return result
+    compact = dict(result)
+    for key in ("all_files", "primary_candidates"):
+        items = compact.get(key)
+        if isinstance(items, list) and len(items) > DATA_SCAN_SUMMARY_SAMPLE_FILES:
+            compact[key] = items[:DATA_SCAN_SUMMARY_SAMPLE_FILES]
+            compact[f"{key}_count"] = len(items)
+    return compact
+
+
+def load_source_details(
+    details_id: str,
+    group: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 100,
+) -> Optional[Dict[str, Any]]:
+    return get_source_detail_store().get(details_id, group, offset, limit)
@@ -0,0 +1,260 @@
+"""
+批量语义补全
+
+一次会话扫描多个文件（多文件上传、scan_directory）时，每个文件各自走一次 llm_node，
+每次都携带完整的系统提示词。这里把多个精简画像打包进一次结构化输出请求：
+- 画像先精简（去掉逐文件明细，只保留形态、时空、质量等语义相关字段）
+- 按 token 预算与条数上限装箱，单个超预算的画像单独调用
+- 返回 [{index, Semantic}] 列表；解析失败或缺项时对相应条目退回逐条调用
+- 与 semantic_cached 模式共用语义缓存：逐条调用的结果写入 llm_node 相同的键；
+  批量结果基于精简画像生成，写入带 batch 变体的键，只在批量补全时复用，不会被 llm_node 读到
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel, Field
+
+from .graph import DEFAULT_SEMANTIC, SEMANTIC_SYSTEM_PROMPT, SemanticPayload, generate_semantic, to_dict
+from .semantic_cache import get_semantic_cache, profile_hash
+from .tools import DATA_SCAN_MODEL_NAME, data_scan_model
+
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_VARIANT_BATCH = "batch"
+
+# 单个批次中画像部分的 token 预算与条数上限
+DATA_SCAN_SEMANTIC_BATCH_TOKENS = int(os.getenv("DATA_SCAN_SEMANTIC_BATCH_TOKENS", "6000"))
+DATA_SCAN_SEMANTIC_BATCH_MAX_ITEMS = int(os.getenv("DATA_SCAN_SEMANTIC_BATCH_MAX_ITEMS", "8"))
+DATA_SCAN_SEMANTIC_BATCH_WORKERS = int(os.getenv("DATA_SCAN_SEMANTIC_BATCH_WORKERS", "2"))
+
+_COMPACT_KEYS = (
+    "Form",
+    "Source_forms",
+    "Source_type",
+    "Source_count",
+    "Spatial",
+    "Resolution",
+    "Temporal",
+    "Quality",
+)
+_MAX_SOURCE_SUMMARIES = 5
+
+BATCH_INSTRUCTIONS = """
+批量模式：输入包含多个带 index 的数据画像，彼此独立。
+为每个画像分别生成 Semantic，按输入的 index 原样返回 items 列表，不得合并、遗漏或交叉引用其他画像的信息。
+"""
+
+
+class SemanticBatchItem(BaseModel):
+    index: int
+    Semantic: SemanticPayload = Field(default_factory=SemanticPayload)
+
+
+class SemanticBatchEnvelope(BaseModel):
+    items: List[SemanticBatchItem] = Field(default_factory=list)
+
+
+_encoding = None
+if tiktoken is not None:
+    try:
+        _encoding = tiktoken.encoding_for_model(DATA_SCAN_MODEL_NAME)
+    except Exception:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # 无 tiktoken 时按中文约 1 字 1 token、英文约 4 字符 1 token 保守估计
+    return max(1, len(text) // 2)
+
+
+def _group_crs_name(group: Dict[str, Any]) -> Any:
+    crs = (group.get("spatial") or {}).get("Crs")
+    return crs.get("Name") or crs.get("EPSG") if isinstance(crs, dict) else crs
+
+
+def compact_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """只保留语义补全需要的字段"""
+    compact = {key: profile.get(key) for key in _COMPACT_KEYS if profile.get(key) not in (None, [], {})}
+    validation = profile.get("Validation") or {}
+    if isinstance(validation, dict):
+        compact["Validation"] = {
+            key: validation.get(key) for key in ("issues", "warnings") if validation.get(key)
+        }
+    sources = profile.get("data_sources") or []
+    if isinstance(sources, list) and sources:
+        compact["Source_count"] = compact.get("Source_count") or len(sources)
+        compact["data_sources"] = [
+            {
+                "form": source.get("form"),
+                "file": os.path.basename(str(source.get("file_path") or "")),
+                "Variables": source.get("Variables"),
+                "Geometry_type": source.get("Geometry_type"),
+            }
+            for source in sources[:_MAX_SOURCE_SUMMARIES]
+            if isinstance(source, dict)
+        ]
+    groups = profile.get("Source_groups") or []
+    if isinstance(groups, list) and groups:
+        compact["Source_groups"] = [
+            {
+                "form": group.get("form"),
+                "count": group.get("count"),
+                "Crs": _group_crs_name(group),
+                "data_type": group.get("data_type"),
+                "Years": (group.get("temporal") or {}).get("Years"),
+            }
+            for group in groups[:_MAX_SOURCE_SUMMARIES]
+            if isinstance(group, dict)
+        ]
+    return compact
+
+
+def pack_by_budget(
+    sizes: List[Tuple[int, int]],
+    budget_tokens: int = DATA_SCAN_SEMANTIC_BATCH_TOKENS,
+    max_items: int = DATA_SCAN_SEMANTIC_BATCH_MAX_ITEMS,
+) -> List[List[int]]:
+    """按 (下标, token 数) 顺序装箱；超预算的条目单独成箱"""
+    packs: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for index, tokens in sizes:
+        if current and (used + tokens > budget_tokens or len(current) >= max_items):
+            packs.append(current)
+            current, used = [], 0
+        current.append(index)
+        used += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def _valid_semantic(candidate: Any) -> Optional[Dict[str, Any]]:
+    payload = to_dict(candidate)
+    if not payload.get("Abstract"):
+        return None
+    return {
+        "Abstract": payload.get("Abstract"),
+        "Applications": payload.get("Applications"),
+        "Tags": payload.get("Tags"),
+    }
+
+
+def _invoke_batch(compact_json: Dict[int, str]) -> Dict[int, Dict[str, Any]]:
+    """一次结构化输出请求补全多个画像，返回 index -> Semantic（只包含通过校验的条目）"""
+    body = "\n".join(f"[index={index}]\n{text}" for index, text in compact_json.items())
+    structured_llm = data_scan_model.with_structured_output(SemanticBatchEnvelope)
+    response = structured_llm.invoke([
+        SystemMessage(content=SEMANTIC_SYSTEM_PROMPT + BATCH_INSTRUCTIONS),
+        HumanMessage(content=f"请为以下 {len(compact_json)} 个结构化数据画像分别补全Semantic：\n{body}"),
+    ])
+    results: Dict[int, Dict[str, Any]] = {}
+    for item in to_dict(response).get("items") or []:
+        item = to_dict(item)
+        index = item.get("index")
+        semantic = _valid_semantic(item.get("Semantic"))
+        if index in compact_json and semantic is not None and index not in results:
+            results[index] = semantic
+    return results
+
+
+class SemanticBatchResult:
+    def __init__(self, size: int):
+        self.semantics: List[Optional[Dict[str, Any]]] = [None] * size
+        self.sources: List[str] = ["default"] * size
+        self.batch_calls = 0
+        self.single_calls = 0
+        self.fallbacks = 0
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for source in self.sources:
+            counts[source] = counts.get(source, 0) + 1
+        return {
+            "profiles": len(self.sources),
+            "batch_calls": self.batch_calls,
+            "single_calls": self.single_calls,
+            "fallbacks": self.fallbacks,
+            "sources": counts,
+        }
+
+
+def enrich_semantics(profiles: List[Dict[str, Any]], use_cache: bool = True) -> SemanticBatchResult:
+    """
+    为多个画像补全 Semantic
+
+    Args:
+        profiles: 确定性画像列表
+        use_cache: 是否先查询语义缓存（semantic_cached 模式）；生成结果总会写入缓存
+    Returns:
+        SemanticBatchResult，semantics 与输入顺序一致；生成失败的条目为默认语义
+    """
+    result = SemanticBatchResult(len(profiles))
+    cache = get_semantic_cache()
+    keys = [profile_hash(profile, DATA_SCAN_MODEL_NAME) for profile in profiles]
+    batch_keys = [profile_hash(profile, DATA_SCAN_MODEL_NAME, SEMANTIC_VARIANT_BATCH) for profile in profiles]
+
+    pending: List[int] = []
+    for index, key in enumerate(keys):
+        # 优先复用基于完整画像生成的语义
+        cached = (cache.get(key) or cache.get(batch_keys[index])) if use_cache else None
+        if cached is not None:
+            result.semantics[index] = cached
+            result.sources[index] = "cache"
+        else:
+            pending.append(index)
+
+    compact_json = {index: json.dumps(compact_profile(profiles[index]), ensure_ascii=False, default=str) for index in pending}
+    packs = pack_by_budget([(index, count_tokens(compact_json[index])) for index in pending])
+
+    def run_pack(pack: List[int]) -> Tuple[Dict[int, Tuple[Optional[Dict[str, Any]], str]], int, int]:
+        """返回 (index -> (Semantic, 来源), 批量调用次数, 逐条调用次数)"""
+        outcome: Dict[int, Tuple[Optional[Dict[str, Any]], str]] = {}
+        batch_calls = 0
+        if len(pack) > 1:
+            batch_calls = 1
+            try:
+                for index, semantic in _invoke_batch({index: compact_json[index] for index in pack}).items():
+                    outcome[index] = (semantic, "llm_batch")
+            except Exception as e:
+                logger.warning(f"批量语义补全失败，退回逐条调用: {e}")
+        missing = [index for index in pack if index not in outcome]
+        for index in missing:
+            outcome[index] = (generate_semantic(profiles[index]), "llm")
+        return outcome, batch_calls, len(missing)
+
+    if packs:
+        with ThreadPoolExecutor(max_workers=max(1, min(DATA_SCAN_SEMANTIC_BATCH_WORKERS, len(packs)))) as executor:
+            for outcome, batch_calls, single_calls in executor.map(run_pack, packs):
+                result.batch_calls += batch_calls
+                result.single_calls += single_calls
+                if batch_calls:
+                    result.fallbacks += single_calls
+                for index, (semantic, source) in outcome.items():
+                    if semantic is None:
+                        continue
+                    result.semantics[index] = semantic
+                    result.sources[index] = source
+                    cache.put(batch_keys[index] if source == "llm_batch" else keys[index], semantic)
+
+    for index, semantic in enumerate(result.semantics):
+        if semantic is None:
+            result.semantics[index] = dict(DEFAULT_SEMANTIC)
+    return result
@@ -0,0 +1,172 @@
+"""
+数据扫描语义块缓存
+
+llm_node 每次都用结构化输出调用 LLM 生成 Semantic，批量重扫时绝大多数文件的确定性画像并没有变化。
+这里按确定性画像的哈希缓存 Semantic：
+- 哈希前剔除路径、临时目录、Profiling 等与语义无关且每次扫描都会变化的字段
+- 哈希包含提示词版本与模型名，提示词或模型变化后自动失效
+- variant 区分生成方式：批量补全基于精简画像生成，结果与 llm_node 基于完整画像的结果分开存放
+- 进程内 LRU；配置了 MONGO_URI / MONGO_DB_NAME 时同时写入 dataScanSemanticCache 集合（带 TTL）
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_COLLECTION = "dataScanSemanticCache"
+DATA_SCAN_SEMANTIC_CACHE_SIZE = int(os.getenv("DATA_SCAN_SEMANTIC_CACHE_SIZE", "2048"))
+DATA_SCAN_SEMANTIC_CACHE_TTL_DAYS = int(os.getenv("DATA_SCAN_SEMANTIC_CACHE_TTL_DAYS", "90"))
+# 修改 llm_node 提示词时递增，使旧缓存失效
+SEMANTIC_PROMPT_VERSION = "2"
+
+_VOLATILE_KEYS = {
+    "Semantic",
+    "Profiling",
+    "profiling",
+    "file_path",
+    "primary_file",
+    "temp_dir",
+    "all_files",
+    "timestamp",
+    "Source_details",
+}
+
+
+def _stable(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(key): _stable(item) for key, item in value.items() if key not in _VOLATILE_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [_stable(item) for item in value]
+    return value
+
+
+def profile_hash(profile: Dict[str, Any], model_name: str = "", variant: str = "") -> str:
+    """确定性画像的内容哈希；variant 为空时与 llm_node 使用的键一致"""
+    key = {"profile": _stable(profile or {}), "prompt": SEMANTIC_PROMPT_VERSION, "model": model_name}
+    if variant:
+        key["variant"] = variant
+    payload = json.dumps(
+        key,
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _default_db() -> Any:
+    mongo_uri = os.getenv("MONGO_URI")
+    db_name = os.getenv("MONGO_DB_NAME")
+    if not mongo_uri or not db_name:
+        return None
+    from pymongo import MongoClient
+
+    return MongoClient(mongo_uri)[db_name]
+
+
+class SemanticCache:
+    """按画像哈希缓存 Semantic，Mongo 不可用时只使用进程内缓存"""
+
+    def __init__(self, db_getter: Optional[Callable[[], Any]] = _default_db, size: int = DATA_SCAN_SEMANTIC_CACHE_SIZE):
+        self._db_getter = db_getter
+        self._db = None
+        self._db_failed = False
+        self._size = max(1, size)
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _collection(self):
+        if self._db_failed or self._db_getter is None:
+            return None
+        try:
+            if self._db is None:
+                self._db = self._db_getter()
+                if self._db is None:
+                    self._db_failed = True
+                    return None
+                if DATA_SCAN_SEMANTIC_CACHE_TTL_DAYS > 0:
+                    self._db[SEMANTIC_CACHE_COLLECTION].create_index(
+                        "created_at", expireAfterSeconds=DATA_SCAN_SEMANTIC_CACHE_TTL_DAYS * 86400
+                    )
+            return self._db[SEMANTIC_CACHE_COLLECTION]
+        except Exception as e:
+            logger.warning(f"语义缓存集合不可用，改用进程内缓存: {e}")
+            self._db_failed = True
+            return None
+
+    def _remember(self, key: str, semantic: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cache[key] = semantic
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._size:
+                self._cache.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            semantic = self._cache.get(key)
+            if semantic is not None:
+                self._cache.move_to_end(key)
+        if semantic is None:
+            collection = self._collection()
+            if collection is not None:
+                try:
+                    doc = collection.find_one({"_id": key}, {"semantic": 1})
+                except Exception as e:
+                    logger.warning(f"读取语义缓存失败: {e}")
+                    doc = None
+                if doc and isinstance(doc.get("semantic"), dict):
+                    semantic = doc["semantic"]
+                    self._remember(key, semantic)
+        if semantic is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(semantic)
+
+    def put(self, key: str, semantic: Dict[str, Any]) -> None:
+        self._remember(key, dict(semantic))
+        self.stores += 1
+        collection = self._collection()
+        if collection is None:
+            return
+        try:
+            collection.update_one(
+                {"_id": key},
+                {"$set": {"semantic": semantic, "created_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"写入语义缓存失败: {e}")
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._cache)
+        return {
+            "entries": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "persistent": not self._db_failed and self._db is not None,
+        }
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _semantic_cache
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticCache()
+        return _semantic_cache
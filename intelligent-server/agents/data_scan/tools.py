@@ -1,9 +1,8 @@
-import json
+import logging
 import os
 from typing import Annotated, Dict, Any, List, Optional, TypedDict, Set
 from pathlib import Path
 import pandas as pd
-import xarray as xr
 import h5py
 import rasterio
 import geopandas as gpd
@@ -17,12 +16,26 @@ from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain.messages import AnyMessage
 import operator
-from pyproj import CRS
 import numpy as np
 import hashlib
+from .crs import resolve_crs
+from .vector_profiler import profile_vector, streaming_available
+from .table_profiler import profile_table
+from .array_profiler import open_lazy_dataset, profile_hdf5, profile_netcdf
+from .format_sniffer import (
+    JSON_ARRAY_OF_OBJECTS,
+    JSON_GEOJSON,
+    JSON_GEOJSON_SEQ,
+    JSON_NDJSON,
+    read_prefix,
+    sniff_json,
+    sniff_magic,
+)
 
 ARCHIVE_EXTENSIONS = ['.zip', '.tar', '.gz', '.rar']
 
+logger = logging.getLogger(__name__)
+
 # 初始化模型
 load_dotenv()
 AIHUBMIX_API_KEY = os.getenv("DATA_SCAN_AGENT_API_KEY") or os.getenv("OPENAI_COMPAT_API_KEY") or os.getenv("AIHUBMIX_API_KEY")
@@ -60,6 +73,12 @@ class DataScanState(TypedDict):
     # 状态
     status: str
 
+    # 扫描模式：full / facts_only / semantic_cached
+    scan_mode: str
+
+    # 画像模式：auto / full / summary（多数据源时是否汇总 data_sources）
+    profile_mode: str
+
 # ============================================================================
 # 工具 0: 文件准备工具（解压、识别主文件）
 # ============================================================================
@@ -451,6 +470,13 @@ def _analyze_source_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
     if isinstance(data, dict) and data.get("Has_time") is True:
         temporal["Has_time"] = True
         temporal["Confidence"] = max(temporal.get("Confidence", 0.2), 0.9)
+        time_info = data.get("Time") or {}
+        if time_info.get("start") is not None:
+            # 时间坐标解码得到的真实范围优先于文件名推断
+            temporal["Start_time"] = time_info.get("start")
+            temporal["End_time"] = time_info.get("end")
+            temporal["Frequency_hint"] = time_info.get("frequency") or temporal.get("Frequency_hint")
+            temporal["Steps"] = time_info.get("steps")
 
     useful_fields: Dict[str, Any] = {}
     if form == "Raster":
@@ -476,6 +502,7 @@ def _analyze_source_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
             "Dimensions": data.get("Dimensions"),
             "Variables": data.get("Variables"),
             "Has_time": data.get("Has_time"),
+            "Variable_stats": data.get("Variable_stats"),
         }
     elif form == "Parameter":
         useful_fields = {
@@ -609,10 +636,12 @@ def validate_profile_consistency(profile: Dict[str, Any]) -> Dict[str, Any]:
     warnings: List[str] = []
 
     data_sources = profile.get("data_sources", []) or []
+    # 汇总画像只有分组，逐文件检查已在汇总前完成
+    source_groups = profile.get("Source_groups", []) or []
     temporal = profile.get("Temporal", {}) or {}
     source_forms = profile.get("Source_forms", []) or []
 
-    if profile.get("Source_count", 0) > 1 and len(data_sources) <= 1:
+    if profile.get("Source_count", 0) > 1 and len(data_sources) <= 1 and not source_groups:
         issues.append("检测到多文件输入，但仅产生单一数据源画像，可能存在误判")
 
     if "Vector" in source_forms:
@@ -633,6 +662,8 @@ def validate_profile_consistency(profile: Dict[str, Any]) -> Dict[str, Any]:
     spatial_candidates: List[Any] = []
     if data_sources:
         spatial_candidates.extend(source.get("spatial") for source in data_sources)
+    elif source_groups:
+        spatial_candidates.extend(group.get("spatial") for group in source_groups)
     else:
         spatial_candidates.append(profile.get("Spatial"))
 
@@ -754,7 +785,7 @@ def tool_detect_format(file_path: str) -> Dict[str, Any]:
             result.update(base_meta)
             return result
         
-        if ext == '.json':
+        if ext in ['.json', '.ndjson', '.jsonl']:
             result = detect_json(target_file)
             result.update(base_meta)
             return result
@@ -769,11 +800,34 @@ def tool_detect_format(file_path: str) -> Dict[str, Any]:
             result.update(base_meta)
             return result
         
+        # 3. 扩展名无法识别时按文件头魔数判断
+        magic = sniff_magic(read_prefix(target_file)) if os.path.isfile(target_file) else None
+        if magic == "tiff":
+            result = {
+                "status": "success",
+                "Form": "Raster",
+                "Confidence": 0.8,
+            }
+            result.update(base_meta)
+            return result
+        
+        if magic == "netcdf":
+            result = detect_netcdf(target_file)
+            result.update(base_meta)
+            return result
+        
+        if magic == "hdf5":
+            result = detect_hdf5(target_file)
+            result.update(base_meta)
+            return result
+        
         result = {
             "status": "success",
             "Form": "Unknown",
             "Confidence": 0.3,
         }
+        if magic:
+            result["Container"] = magic
         result.update(base_meta)
         return result
         
@@ -833,17 +887,24 @@ def detect_json(file_path: str) -> Dict[str, Any]:
         dict: 检测结果
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # 只读取有界前缀，不解析整个文件
+        kind = sniff_json(file_path)["kind"]
         
-        if isinstance(data, dict) and data.get("type") in ["FeatureCollection", "Feature"]:
+        if kind == JSON_GEOJSON:
             return {
                 "status": "success",
                 "Form": "Vector",
                 "Confidence": 0.95
             }
         
-        if isinstance(data, list) and data and isinstance(data[0], dict):
+        if kind == JSON_GEOJSON_SEQ:
+            return {
+                "status": "success",
+                "Form": "Vector",
+                "Confidence": 0.9
+            }
+        
+        if kind in [JSON_ARRAY_OF_OBJECTS, JSON_NDJSON]:
             return {
                 "status": "success",
                 "Form": "Table",
@@ -870,11 +931,11 @@ def detect_netcdf(file_path: str) -> Dict[str, Any]:
         dict: 检测结果
     """
     try:
-        ds = xr.open_dataset(file_path)
-        dims = set(ds.dims.keys())
+        # 只需要维度名，惰性打开且不解码
+        with open_lazy_dataset(file_path) as ds:
+            dims = set(ds.sizes.keys())
         
         if {"lat", "lon"}.issubset(dims):
-            ds.close()
             return {
                 "status": "success",
                 "Form": "Raster",
@@ -882,14 +943,12 @@ def detect_netcdf(file_path: str) -> Dict[str, Any]:
             }
         
         if "time" in dims:
-            ds.close()
             return {
                 "status": "success",
                 "Form": "Timeseries",
                 "Confidence": 0.9
             }
         
-        ds.close()
         return {
             "status": "success",
             "Form": "Unknown",
@@ -1050,94 +1109,129 @@ def tool_analyze_vector(file_path: str) -> Dict[str, Any]:
     """
     try:
         target_file = resolve_primary_file(file_path).get("primary_file") or file_path
-        gdf = gpd.read_file(target_file)
-
-        # 基础信息
-        raw_wkt = gdf.crs.to_wkt() if gdf.crs else ""
-        crs_info = parse_wkt_to_dict(raw_wkt)
-        bounds = gdf.total_bounds.tolist()
-
-        q_issues = []
-        # 几何有效性检测
-        invalid_mask = ~gdf.is_valid
-        invalid_count = int(invalid_mask.sum())
-        if invalid_count > 0:
-            q_issues.append(f"invalid_geometry_found_{invalid_count}_features")
-
-        # 空几何检测
-        empty_mask = gdf.is_empty
-        empty_count = int(empty_mask.sum())
-        if empty_count > 0:
-            q_issues.append(f"empty_geometry_found_{empty_count}_features")
-
-        # 坐标系缺失风险
-        raw_wkt = gdf.crs.to_wkt() if gdf.crs else ""
-        if not raw_wkt:
-            q_issues.append("missing_crs_definition")
-
-        # 属性完整性检测
-        null_cols = [col for col in gdf.columns if gdf[col].isnull().all() and col != 'geometry']
-        if null_cols:
-            q_issues.append(f"empty_attribute_columns_{len(null_cols)}")
-
-        # 属性统计摘要
-        # 提取数值型列的描述统计
-        desc = gdf.describe().to_dict()
-
-        detailed_attributes = []
-        for col in gdf.columns:
-            if col == 'geometry': continue
-            
-            attr_info = {
-                "name": col,
-                "type": str(gdf[col].dtype),
-                "null_count": int(gdf[col].isna().sum()),
-                "unique_count": int(gdf[col].nunique())
-            }
-            
-            # 如果是数值列，把 summary 合并进去
-            if col in desc:
-                attr_info["stats"] = {
-                    "min": desc[col]["min"],
-                    "max": desc[col]["max"],
-                    "mean": desc[col]["mean"]
-                }
-            
-            detailed_attributes.append(attr_info)
-        
-        geom_type = "Unknown"
-        if not gdf.empty:
-            g_type = gdf.geom_type.mode()[0]
-            if 'Point' in g_type: geom_type = 'Point'
-            elif 'Line' in g_type: geom_type = 'Line'
-            elif 'Polygon' in g_type: geom_type = 'Polygon'
-        
-        return {
-            "status": "success",
-            "data": {
-                "Spatial": {
-                    "Crs": crs_info,
-                    "Extent": {
-                        "min_x": bounds[0],
-                        "max_x": bounds[2],
-                        "min_y": bounds[1],
-                        "max_y": bounds[3],
-                        "unit": crs_info["Unit"],
-                        "label_x": "Easting (X)" if crs_info["Is_Projected"] else "Longitude",
-                        "label_y": "Northing (Y)" if crs_info["Is_Projected"] else "Latitude"
-                    }
-                },
-                "Geometry_type": {
-                    "Type": geom_type,
-                    "Feature_count": len(gdf),
-                },
-                "Quality": generate_quality_report(q_issues, empty_count/max(len(gdf),1)),
-                "Attributes": detailed_attributes
-            }
-        }
+        if streaming_available():
+            try:
+                profile = profile_vector(target_file)
+                return {"status": "success", "data": _vector_profile_data(profile)}
+            except Exception as e:
+                # 驱动不支持 Arrow 流式读取时退回整层读取
+                logger.warning(f"流式读取矢量画像失败，退回整层读取: {str(e)[:200]}")
+        return {"status": "success", "data": _analyze_vector_full(target_file)}
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
+
+def _vector_profile_data(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """把流式画像结果转为 tool_analyze_vector 的 data 结构"""
+    crs_info = parse_wkt_to_dict(profile["raw_wkt"])
+    bounds = profile["bounds"]
+    return {
+        "Spatial": {
+            "Crs": crs_info,
+            "Extent": {
+                "min_x": bounds[0],
+                "max_x": bounds[2],
+                "min_y": bounds[1],
+                "max_y": bounds[3],
+                "unit": crs_info.get("Unit", "unknown"),
+                "label_x": "Easting (X)" if crs_info.get("Is_Projected") else "Longitude",
+                "label_y": "Northing (Y)" if crs_info.get("Is_Projected") else "Latitude"
+            }
+        },
+        "Geometry_type": {
+            "Type": profile["geometry_type"],
+            "Feature_count": profile["feature_count"],
+        },
+        "Quality": generate_quality_report(profile["issues"], profile["empty_ratio"]),
+        "Attributes": profile["attributes"],
+        "Profiling": profile["profiling"],
+    }
+
+
+def _analyze_vector_full(target_file: str) -> Dict[str, Any]:
+    """整层读入的矢量分析（未安装 pyogrio / shapely 2 时使用）"""
+    gdf = gpd.read_file(target_file)
+
+    # 基础信息
+    raw_wkt = gdf.crs.to_wkt() if gdf.crs else ""
+    crs_info = parse_wkt_to_dict(raw_wkt)
+    bounds = gdf.total_bounds.tolist()
+
+    q_issues = []
+    # 几何有效性检测
+    invalid_mask = ~gdf.is_valid
+    invalid_count = int(invalid_mask.sum())
+    if invalid_count > 0:
+        q_issues.append(f"invalid_geometry_found_{invalid_count}_features")
+
+    # 空几何检测
+    empty_mask = gdf.is_empty
+    empty_count = int(empty_mask.sum())
+    if empty_count > 0:
+        q_issues.append(f"empty_geometry_found_{empty_count}_features")
+
+    # 坐标系缺失风险
+    if not raw_wkt:
+        q_issues.append("missing_crs_definition")
+
+    # 属性完整性检测
+    null_cols = [col for col in gdf.columns if gdf[col].isnull().all() and col != 'geometry']
+    if null_cols:
+        q_issues.append(f"empty_attribute_columns_{len(null_cols)}")
+
+    # 属性统计摘要
+    # 提取数值型列的描述统计
+    desc = gdf.describe().to_dict()
+
+    detailed_attributes = []
+    for col in gdf.columns:
+        if col == 'geometry': continue
+
+        attr_info = {
+            "name": col,
+            "type": str(gdf[col].dtype),
+            "null_count": int(gdf[col].isna().sum()),
+            "unique_count": int(gdf[col].nunique())
+        }
+
+        # 如果是数值列，把 summary 合并进去
+        if col in desc:
+            attr_info["stats"] = {
+                "min": desc[col]["min"],
+                "max": desc[col]["max"],
+                "mean": desc[col]["mean"]
+            }
+
+        detailed_attributes.append(attr_info)
+
+    geom_type = "Unknown"
+    if not gdf.empty:
+        g_type = gdf.geom_type.mode()[0]
+        if 'Point' in g_type: geom_type = 'Point'
+        elif 'Line' in g_type: geom_type = 'Line'
+        elif 'Polygon' in g_type: geom_type = 'Polygon'
+
+    return {
+        "Spatial": {
+            "Crs": crs_info,
+            "Extent": {
+                "min_x": bounds[0],
+                "max_x": bounds[2],
+                "min_y": bounds[1],
+                "max_y": bounds[3],
+                "unit": crs_info["Unit"],
+                "label_x": "Easting (X)" if crs_info["Is_Projected"] else "Longitude",
+                "label_y": "Northing (Y)" if crs_info["Is_Projected"] else "Latitude"
+            }
+        },
+        "Geometry_type": {
+            "Type": geom_type,
+            "Feature_count": len(gdf),
+        },
+        "Quality": generate_quality_report(q_issues, empty_count/max(len(gdf),1)),
+        "Attributes": detailed_attributes
+    }
+
 @tool
 def tool_analyze_table(file_path: str) -> Dict[str, Any]:
     """
@@ -1150,24 +1244,16 @@ def tool_analyze_table(file_path: str) -> Dict[str, Any]:
             Row_count: 行数,
             Columns: [列名],
             Dtypes: {列名: 数据类型},
-            Sample_rows: [样本行]
+            Sample_rows: [样本行],
+            Column_stats: {列名: {null_count, distinct_approx, min, max}},
+            Profiling: 分块遍历信息
         }
     """
     try:
         target_file = resolve_primary_file(file_path).get("primary_file") or file_path
-        if target_file.endswith('.csv'):
-            df = pd.read_csv(target_file, nrows=100)
-        else:
-            df = pd.read_excel(target_file, nrows=100)
-        
         return {
             "status": "success",
-            "data": {
-                "Row_count": len(df),
-                "Columns": list(df.columns),
-                "Dtypes": df.dtypes.astype(str).to_dict(),
-                "Sample_rows": df.head(3).to_dict(orient='records')
-            }
+            "data": profile_table(target_file)
         }
     except Exception as e:
         return {"status": "error", "error": str(e)}
@@ -1183,28 +1269,37 @@ def tool_analyze_timeseries(file_path: str) -> Dict[str, Any]:
         data: {
             Dimensions: {维度名: 大小},
             Variables: [变量名],
-            Has_time: 是否包含时间维度
+            Has_time: 是否包含时间维度,
+            Time: {start, end, steps, frequency},
+            Variable_stats: {变量名: 抽样统计}
         }
+        CSV 文件返回 Columns、Row_count 与 Column_stats
     """
     try:
         target_file = resolve_primary_file(file_path).get("primary_file") or file_path
-        if target_file.endswith('.nc'):
-            ds = xr.open_dataset(target_file)
+        ext = Path(target_file).suffix.lower()
+        # 扩展名无法识别时按魔数判断，与 tool_detect_format 的识别结果保持一致
+        magic = None
+        if ext not in ['.nc', '.netcdf', '.h5', '.hdf', '.hdf5', '.csv'] and os.path.isfile(target_file):
+            magic = sniff_magic(read_prefix(target_file))
+        if ext in ['.nc', '.netcdf'] or magic == "netcdf":
             return {
                 "status": "success",
-                "data": {
-                    "Dimensions": dict(ds.dims),
-                    "Variables": list(ds.data_vars),
-                    "Has_time": "time" in ds.dims
-                }
+                "data": profile_netcdf(target_file)
+            }
+        elif ext in ['.h5', '.hdf', '.hdf5'] or magic == "hdf5":
+            return {
+                "status": "success",
+                "data": profile_hdf5(target_file)
             }
         else:
-            df = pd.read_csv(target_file, nrows=100)
+            profile = profile_table(target_file)
             return {
                 "status": "success",
                 "data": {
-                    "Columns": list(df.columns),
-                    "Row_count": len(df)
+                    "Columns": profile["Columns"],
+                    "Row_count": profile["Row_count"],
+                    "Column_stats": profile["Column_stats"]
                 }
             }
     except Exception as e:
@@ -1292,61 +1387,9 @@ def normalize_kernel_type(kernel_type: Optional[str]) -> str:
 
 def parse_wkt_to_dict(wkt_str: str) -> Dict[str, Any]:
     """
-    使用 pyproj 优化解析 WKT 字符串
+    使用 pyproj 解析 WKT 字符串（按 WKT 哈希缓存，多文件共用同一 CRS 时只解析一次）
     """
-    if not wkt_str or len(wkt_str) < 10:
-        return {"Name": "Unknown", "Wkt": wkt_str}
-    
-    try:
-        # 将 WKT 转换为 CRS 对象
-        crs_obj = CRS.from_wkt(wkt_str)
-        epsg_code = crs_obj.to_epsg()
-        is_engineering = bool(getattr(crs_obj, "is_engineering", False))
-        is_projected_like = bool(crs_obj.is_projected or is_engineering)
-        
-        # 提取单位：优先读取轴单位，避免 LOCAL_CS / engineering CRS 被误判
-        unit = "Unknown"
-        if crs_obj.axis_info:
-            unit = getattr(crs_obj.axis_info[0], "unit_name", None) or "Unknown"
-        elif crs_obj.is_geographic:
-            unit = "degree"
-
-        # 提取投影信息
-        proj_name = "Unknown"
-        if crs_obj.coordinate_operation and hasattr(crs_obj.coordinate_operation, 'method_name'):
-            proj_name = crs_obj.coordinate_operation.method_name
-        elif is_engineering:
-            proj_name = "Engineering"
-        elif crs_obj.is_projected:
-            proj_name = "Projected"
-        elif crs_obj.is_geographic:
-            proj_name = "Geographic"
-        else:
-            proj_name = "Unknown"
-
-        # 提取中央经线
-        cm = "N/A"
-        if crs_obj.coordinate_operation and hasattr(crs_obj.coordinate_operation, 'params'):
-            # 遍历投影参数寻找中央经线
-            for param in crs_obj.coordinate_operation.params:
-                if "central_meridian" in param.name.lower():
-                    cm = f"{param.value}°E"
-                    break
-
-        return {
-            "Name": crs_obj.name,           # 'CGCS2000_3_Degree_GK_CM_113E'
-            "EPSG": f"EPSG:{epsg_code}" if epsg_code else "Unknown",
-            "Datum": crs_obj.datum.name if crs_obj.datum else "Unknown",
-            "Projection": proj_name,
-            "Central_meridian": cm,
-            "Unit": unit,
-            "Is_Projected": is_projected_like,
-            "Is_Engineering": is_engineering,
-            "Wkt": wkt_str
-        }
-    except Exception as e:
-        # 兜底：如果解析失败，返回基础信息
-        return {"Name": "Parse Error", "Error": str(e), "Wkt": wkt_str}
+    return resolve_crs(wkt_str)
 
 def generate_quality_report(issues: List[str], nodata_ratio: float = 0.0) -> Dict[str, Any]:
     """统一质量报告结构"""
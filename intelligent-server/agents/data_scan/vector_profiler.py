@@ -0,0 +1,265 @@
+"""
+流式矢量画像
+
+tool_analyze_vector 原先 gpd.read_file 整层读入，再对全部几何做 is_valid / is_empty、对每列做 describe / nunique，
+两百万要素的地块 shapefile 需要数分钟和数 GB 内存。这里改为：
+- 元数据（CRS、范围、要素数、字段）由 pyogrio.read_info 从图层头部读取，不加载要素
+- 要素按 Arrow 批次流式读取，属性的空值数、数值列 min/max/mean 逐批精确累计
+- 几何有效性 / 空几何比例与属性基数由有界随机样本（bottom-k 随机键抽样）估计，并给出 95% 置信区间
+样本覆盖全部要素时结果为精确值。
+"""
+
+import logging
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .crs import crs_to_wkt
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyogrio
+    from pyogrio.raw import open_arrow
+except Exception:
+    pa = None
+    pc = None
+    pyogrio = None
+    open_arrow = None
+
+try:
+    import shapely
+except Exception:
+    shapely = None
+
+logger = logging.getLogger(__name__)
+
+DATA_SCAN_VECTOR_BATCH_SIZE = int(os.getenv("DATA_SCAN_VECTOR_BATCH_SIZE", "65536"))
+DATA_SCAN_VECTOR_SAMPLE_SIZE = int(os.getenv("DATA_SCAN_VECTOR_SAMPLE_SIZE", "10000"))
+
+_Z_95 = 1.959963984540054
+_GEOMETRY_FAMILIES = (("Point", "Point"), ("Line", "Line"), ("Polygon", "Polygon"))
+
+
+def streaming_available() -> bool:
+    return pyogrio is not None and open_arrow is not None and shapely is not None
+
+
+def wilson_interval(successes: int, trials: int, z: float = _Z_95) -> List[float]:
+    """二项比例的 Wilson 置信区间"""
+    if trials <= 0:
+        return [0.0, 1.0]
+    p = successes / trials
+    denom = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denom
+    half = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denom
+    return [round(max(0.0, centre - half), 6), round(min(1.0, centre + half), 6)]
+
+
+def estimate_distinct(sample_values: List[Any], population: int) -> int:
+    """基于样本的不同值个数估计（GEE 估计量：sqrt(N/n)·f1 + Σ_{j≥2} f_j）"""
+    n = len(sample_values)
+    if n == 0:
+        return 0
+    counts: Dict[Any, int] = {}
+    for value in sample_values:
+        counts[value] = counts.get(value, 0) + 1
+    if n >= population:
+        return len(counts)
+    singletons = sum(1 for count in counts.values() if count == 1)
+    repeated = len(counts) - singletons
+    return int(min(population, round(math.sqrt(population / n) * singletons + repeated)))
+
+
+def _all_hashable(values: List[Any]) -> bool:
+    """OGR 的 list 类型字段（StringList / IntegerList 等）读出为 list，无法参与不同值计数"""
+    try:
+        for value in values:
+            hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _BottomKSample:
+    """为每行分配均匀随机键，保留键最小的 k 行，等价于无放回简单随机抽样"""
+
+    def __init__(self, k: int, seed: int = 0):
+        self.k = max(1, k)
+        self._rng = np.random.default_rng(seed)
+        self._keys = np.empty((0,), dtype=np.float64)
+        self._table = None
+
+    def add(self, batch: Any) -> None:
+        keys = self._rng.random(batch.num_rows)
+        table = pa.Table.from_batches([batch])
+        if self._table is not None:
+            table = pa.concat_tables([self._table, table])
+            keys = np.concatenate([self._keys, keys])
+        if keys.shape[0] > self.k:
+            keep = np.argpartition(keys, self.k - 1)[: self.k]
+            table = table.take(pa.array(keep))
+            keys = keys[keep]
+        self._table, self._keys = table, keys
+
+    @property
+    def table(self) -> Any:
+        return self._table
+
+
+def _geometry_family(geometry_type: Optional[str]) -> str:
+    for token, family in _GEOMETRY_FAMILIES:
+        if token in str(geometry_type or ""):
+            return family
+    return "Unknown"
+
+
+def _geometry_column(schema: Any, meta: Dict[str, Any]) -> Optional[str]:
+    names = list(schema.names)
+    for candidate in (meta.get("geometry_name"), "wkb_geometry", "geometry"):
+        if candidate and candidate in names:
+            return candidate
+    return None
+
+
+def profile_vector(
+    file_path: str,
+    batch_size: int = DATA_SCAN_VECTOR_BATCH_SIZE,
+    sample_size: int = DATA_SCAN_VECTOR_SAMPLE_SIZE,
+) -> Dict[str, Any]:
+    """流式矢量画像，返回结构与 tool_analyze_vector 的 data 一致，另附 Profiling 抽样信息"""
+    info = pyogrio.read_info(file_path, force_feature_count=True, force_total_bounds=True)
+    feature_count = int(info.get("features") or 0)
+    raw_wkt = crs_to_wkt(info.get("crs"))
+    field_names = [str(name) for name in list(info.get("fields", []))]
+    field_dtypes = [str(dtype) for dtype in list(info.get("dtypes", []))]
+    bounds = info.get("total_bounds")
+
+    null_counts: Dict[str, int] = {name: 0 for name in field_names}
+    numeric: Dict[str, Dict[str, float]] = {}
+    null_geometries = 0
+    rows_read = 0
+    sample = _BottomKSample(sample_size)
+    geometry_name = None
+
+    try:
+        stream = open_arrow(file_path, batch_size=max(1, batch_size), use_pyarrow=True)
+    except TypeError:
+        # pyogrio < 0.10 直接返回 pyarrow RecordBatchReader
+        stream = open_arrow(file_path, batch_size=max(1, batch_size))
+    with stream as (meta, reader):
+        for batch in reader:
+            if geometry_name is None:
+                geometry_name = _geometry_column(batch.schema, meta)
+            rows_read += batch.num_rows
+            for name in field_names:
+                if name not in batch.schema.names:
+                    continue
+                column = batch.column(name)
+                null_counts[name] += column.null_count
+                if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+                    valid = column.drop_null()
+                    if len(valid) == 0:
+                        continue
+                    bounds_pair = pc.min_max(valid)
+                    acc = numeric.setdefault(name, {"min": math.inf, "max": -math.inf, "sum": 0.0, "count": 0})
+                    acc["min"] = min(acc["min"], float(bounds_pair["min"].as_py()))
+                    acc["max"] = max(acc["max"], float(bounds_pair["max"].as_py()))
+                    acc["sum"] += float(pc.sum(valid, min_count=1).as_py() or 0.0)
+                    acc["count"] += len(valid)
+            if geometry_name:
+                null_geometries += batch.column(geometry_name).null_count
+            sample.add(batch)
+
+    feature_count = feature_count or rows_read
+    sample_table = sample.table
+    sampled = sample_table.num_rows if sample_table is not None else 0
+    exact = sampled >= feature_count
+
+    # 样本上的几何检查
+    invalid_in_sample = 0
+    empty_in_sample = 0
+    type_counts: Dict[int, int] = {}
+    if sampled and geometry_name:
+        wkb = sample_table.column(geometry_name).to_pylist()
+        geometries = shapely.from_wkb(np.array([value for value in wkb if value is not None], dtype=object))
+        if len(geometries):
+            invalid_in_sample = int((~shapely.is_valid(geometries)).sum())
+            empty_in_sample = int(shapely.is_empty(geometries).sum())
+            for type_name in shapely.get_type_id(geometries):
+                type_counts[int(type_name)] = type_counts.get(int(type_name), 0) + 1
+    non_null_sampled = sampled - (sample_table.column(geometry_name).null_count if sampled and geometry_name else 0)
+
+    invalid_ratio = invalid_in_sample / non_null_sampled if non_null_sampled else 0.0
+    empty_ratio = empty_in_sample / non_null_sampled if non_null_sampled else 0.0
+    non_null_total = max(feature_count - null_geometries, 0)
+    invalid_estimate = int(round(invalid_ratio * non_null_total))
+    empty_estimate = null_geometries + int(round(empty_ratio * non_null_total))
+
+    geometry_type = _geometry_family(info.get("geometry_type"))
+    if geometry_type == "Unknown" and type_counts:
+        # 0/4 点，1/2/5 线，3/6 面
+        dominant = max(type_counts, key=type_counts.get)
+        geometry_type = {0: "Point", 4: "Point", 1: "Line", 2: "Line", 5: "Line", 3: "Polygon", 6: "Polygon"}.get(dominant, "Unknown")
+
+    attributes = []
+    for name, dtype in zip(field_names, field_dtypes):
+        values = sample_table.column(name).to_pylist() if sampled and name in sample_table.schema.names else []
+        non_null_values = [value for value in values if value is not None]
+        non_null_total_attr = feature_count - null_counts.get(name, 0)
+        attr_info: Dict[str, Any] = {
+            "name": name,
+            "type": dtype,
+            "null_count": int(null_counts.get(name, 0)),
+        }
+        # 不可哈希的列表型字段跳过不同值统计
+        if _all_hashable(non_null_values):
+            attr_info["unique_count"] = (
+                estimate_distinct(non_null_values, non_null_total_attr) if not exact else len(set(non_null_values))
+            )
+            attr_info["unique_count_estimated"] = not exact
+        acc = numeric.get(name)
+        if acc and acc["count"]:
+            attr_info["stats"] = {"min": acc["min"], "max": acc["max"], "mean": acc["sum"] / acc["count"]}
+        attributes.append(attr_info)
+
+    q_issues = []
+    if invalid_estimate > 0:
+        q_issues.append(
+            f"invalid_geometry_found_{invalid_estimate}_features" if exact else f"invalid_geometry_estimated_{invalid_estimate}_features"
+        )
+    if empty_estimate > 0:
+        q_issues.append(
+            f"empty_geometry_found_{empty_estimate}_features" if exact else f"empty_geometry_estimated_{empty_estimate}_features"
+        )
+    if not raw_wkt:
+        q_issues.append("missing_crs_definition")
+    null_cols = [name for name in field_names if feature_count and null_counts.get(name, 0) >= feature_count]
+    if null_cols:
+        q_issues.append(f"empty_attribute_columns_{len(null_cols)}")
+
+    return {
+        "raw_wkt": raw_wkt,
+        "bounds": list(bounds) if bounds is not None else [None, None, None, None],
+        "geometry_type": geometry_type,
+        "feature_count": feature_count,
+        "issues": q_issues,
+        "empty_ratio": empty_estimate / max(feature_count, 1),
+        "attributes": attributes,
+        "profiling": {
+            "method": "pyogrio_arrow_stream",
+            "batch_size": batch_size,
+            "sampled_features": sampled,
+            "sample_ratio": round(sampled / feature_count, 6) if feature_count else 1.0,
+            "exact": exact,
+            "geometry_validity": {
+                "invalid_ratio": round(invalid_ratio, 6),
+                "invalid_ratio_ci95": [round(invalid_ratio, 6)] * 2 if exact else wilson_interval(invalid_in_sample, non_null_sampled),
+                "empty_ratio": round(empty_ratio, 6),
+                "empty_ratio_ci95": [round(empty_ratio, 6)] * 2 if exact else wilson_interval(empty_in_sample, non_null_sampled),
+                "null_geometries": int(null_geometries),
+            },
+        },
+    }
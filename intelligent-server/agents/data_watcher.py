@@ -0,0 +1,246 @@
+"""
+上传目录监听与增量重扫
+
+DataScanner.rescan_with_diff 需要调用方给出文件列表。这里监听上传目录：
+- 优先使用 watchdog（Linux 上为 inotify），不可用或启动失败时退回定时 stat 轮询
+- 文件事件按路径去抖：最后一次事件后静默 DATA_WATCH_DEBOUNCE_SECONDS 才视为写入完成
+- 只把新增 / 修改 / 删除的文件交给 rescan_with_diff；内容未变化的文件由指纹判定，只花一次 stat
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from agents.data_monitor import DataScanner, get_data_scanner, is_scannable_file
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except Exception:
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+# 逗号分隔的监听目录，为空时不启用
+DATA_WATCH_DIRS = [path.strip() for path in os.getenv("DATA_WATCH_DIRS", "").split(",") if path.strip()]
+DATA_WATCH_DEBOUNCE_SECONDS = float(os.getenv("DATA_WATCH_DEBOUNCE_SECONDS", "2.0"))
+DATA_WATCH_POLL_INTERVAL_SECONDS = float(os.getenv("DATA_WATCH_POLL_INTERVAL_SECONDS", "5.0"))
+# auto: 优先 watchdog；watchdog / polling: 指定后端
+DATA_WATCH_BACKEND = os.getenv("DATA_WATCH_BACKEND", "auto").strip().lower()
+
+BACKEND_WATCHDOG = "watchdog"
+BACKEND_POLLING = "polling"
+
+ChangeCallback = Callable[[Dict[str, Any]], Any]
+
+
+def snapshot_directory(directory: str) -> Dict[str, Tuple[int, int]]:
+    """目录下可扫描文件的 (大小, 修改时间) 快照"""
+    snapshot: Dict[str, Tuple[int, int]] = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not is_scannable_file(name):
+                continue
+            path = os.path.abspath(os.path.join(root, name))
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+class _EventForwarder(FileSystemEventHandler):
+    """把 watchdog 线程中的事件转发到事件循环"""
+
+    def __init__(self, watcher: "DataDirectoryWatcher"):
+        super().__init__()
+        self._watcher = watcher
+
+    def on_any_event(self, event: Any) -> None:
+        if event.is_directory:
+            return
+        event_type = event.event_type
+        if event_type == "deleted":
+            self._watcher.notify(event.src_path, deleted=True)
+        elif event_type == "moved":
+            self._watcher.notify(event.src_path, deleted=True)
+            self._watcher.notify(event.dest_path)
+        elif event_type in ("created", "modified", "closed"):
+            self._watcher.notify(event.src_path)
+
+
+class DataDirectoryWatcher:
+    """监听单个目录，去抖后调用 rescan_with_diff"""
+
+    def __init__(
+        self,
+        directory: str,
+        scanner: Optional[DataScanner] = None,
+        debounce_seconds: float = DATA_WATCH_DEBOUNCE_SECONDS,
+        poll_interval: float = DATA_WATCH_POLL_INTERVAL_SECONDS,
+        backend: str = DATA_WATCH_BACKEND,
+        on_change: Optional[ChangeCallback] = None,
+    ):
+        self.directory = os.path.abspath(directory)
+        self.scanner = scanner or get_data_scanner()
+        self.debounce_seconds = max(0.1, debounce_seconds)
+        self.poll_interval = max(0.5, poll_interval)
+        self.requested_backend = backend
+        self.backend: Optional[str] = None
+        self.on_change = on_change
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[str, float] = {}
+        self._deleted: Set[str] = set()
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._observer = None
+        self._tasks: List[asyncio.Task] = []
+        # 画像缓存文件可能位于监听目录内，忽略以免自触发
+        self._ignored = {os.path.abspath(self.scanner.cache.cache_file)}
+        self.events = 0
+        self.rescans = 0
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    # --- 事件接收 ---
+
+    def notify(self, path: str, deleted: bool = False) -> None:
+        """线程安全地登记一个文件事件"""
+        if self._loop is None or not is_scannable_file(path):
+            return
+        self._loop.call_soon_threadsafe(self._mark, os.path.abspath(path), deleted)
+
+    def _mark(self, path: str, deleted: bool) -> None:
+        if path in self._ignored:
+            return
+        self.events += 1
+        if deleted:
+            self._pending.pop(path, None)
+            self._deleted.add(path)
+        else:
+            self._deleted.discard(path)
+            self._pending[path] = self._loop.time()
+
+    # --- 生命周期 ---
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._snapshot = await asyncio.to_thread(snapshot_directory, self.directory)
+        # 启动时对全部文件做一次增量核对，未变化的文件只做 stat
+        now = self._loop.time() - self.debounce_seconds
+        for path in self._snapshot:
+            if path not in self._ignored:
+                self._pending[path] = now
+
+        if self.requested_backend != BACKEND_POLLING and Observer is not None:
+            try:
+                observer = Observer()
+                observer.schedule(_EventForwarder(self), self.directory, recursive=True)
+                observer.start()
+                self._observer = observer
+                self.backend = BACKEND_WATCHDOG
+            except Exception as e:
+                logger.warning(f"watchdog 启动失败，改用轮询: {self.directory}, 错误: {e}")
+        if self._observer is None:
+            self.backend = BACKEND_POLLING
+            # 轮询只能在采样时刻发现变化，静默期至少覆盖一个轮询周期
+            self.debounce_seconds = max(self.debounce_seconds, self.poll_interval * 1.5)
+            self._tasks.append(asyncio.create_task(self._poll_loop()))
+        self._tasks.append(asyncio.create_task(self._debounce_loop()))
+        logger.info(f"开始监听数据目录: {self.directory}（{self.backend}）")
+
+    async def stop(self) -> None:
+        if self._observer is not None:
+            self._observer.stop()
+            await asyncio.to_thread(self._observer.join, 5)
+            self._observer = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --- 后台任务 ---
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                current = await asyncio.to_thread(snapshot_directory, self.directory)
+            except Exception as e:
+                logger.warning(f"轮询数据目录失败: {self.directory}, 错误: {e}")
+                continue
+            for path, signature in current.items():
+                if self._snapshot.get(path) != signature:
+                    self._mark(path, False)
+            for path in self._snapshot.keys() - current.keys():
+                self._mark(path, True)
+            self._snapshot = current
+
+    async def _debounce_loop(self) -> None:
+        interval = min(self.debounce_seconds / 2, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            now = self._loop.time()
+            ready = [path for path, last in self._pending.items() if now - last >= self.debounce_seconds]
+            deleted = list(self._deleted)
+            if not ready and not deleted:
+                continue
+            for path in ready:
+                self._pending.pop(path, None)
+            self._deleted.difference_update(deleted)
+            try:
+                await self._rescan(ready + deleted)
+            except Exception as e:
+                logger.error(f"增量重扫失败: {self.directory}, 错误: {e}")
+
+    async def _rescan(self, paths: List[str]) -> None:
+        result = await self.scanner.rescan_with_diff(paths)
+        self.rescans += 1
+        self.last_result = {
+            "files": len(paths),
+            "added": len(result["added_files"]),
+            "changed": len(result["changed_files"]),
+            "unchanged": len(result["unchanged_files"]),
+            "removed": len(result["removed_files"]),
+        }
+        logger.info(f"数据目录增量重扫完成: {self.directory}, {self.last_result}")
+        if self.on_change and (result["added_files"] or result["changed_files"] or result["removed_files"]):
+            outcome = self.on_change(result)
+            if asyncio.iscoroutine(outcome):
+                await outcome
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "backend": self.backend,
+            "pending": len(self._pending),
+            "pending_deletes": len(self._deleted),
+            "events": self.events,
+            "rescans": self.rescans,
+            "last_result": self.last_result,
+        }
+
+
+_watchers: List[DataDirectoryWatcher] = []
+
+
+async def start_data_watchers(directories: Optional[List[str]] = None) -> List[DataDirectoryWatcher]:
+    """按 DATA_WATCH_DIRS 启动目录监听"""
+    for directory in directories if directories is not None else DATA_WATCH_DIRS:
+        if not os.path.isdir(directory):
+            logger.warning(f"监听目录不存在，已跳过: {directory}")
+            continue
+        watcher = DataDirectoryWatcher(directory)
+        await watcher.start()
+        _watchers.append(watcher)
+    return _watchers
+
+
+async def stop_data_watchers() -> None:
+    while _watchers:
+        await _watchers.pop().stop()
+
+
+def data_watch_metrics() -> List[Dict[str, Any]]:
+    return [watcher.metrics() for watcher in _watchers]
@@ -0,0 +1,124 @@
+"""
+记忆向量的紧凑存储编码
+
+userMemories 原先把 embedding 以 float64 列表（BSON double 数组）写入 MongoDB，
+1536 维约占 12 KB。这里提供二进制编码：
+- float32: 原始向量按 float32 小端字节写入 BinData，约为原来的 1/2
+- int8: 按向量最大绝对值量化到 [-127, 127]，附带 per-vector scale，约为原来的 1/8
+- list: 保持旧格式（兼容 Atlas knnVector 搜索索引）
+
+两种二进制编码都会预先写入原始向量的 L2 范数，读取时直接 np.frombuffer 打分。
+Store 只在 migrate_memory_embeddings 全量迁移完成后启用二进制编码，迁移前继续写 embedding 列表。
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from bson import Binary
+except Exception:
+    Binary = bytes
+
+ENCODING_LIST = "list"
+ENCODING_FLOAT32 = "float32"
+ENCODING_INT8 = "int8"
+SUPPORTED_ENCODINGS = (ENCODING_LIST, ENCODING_FLOAT32, ENCODING_INT8)
+
+# 紧凑编码写入的字段；切换编码或迁移时需要一并清理
+COMPACT_FIELDS = ("embedding_bin", "embedding_dtype", "embedding_dim", "embedding_norm", "embedding_scale")
+
+_FLOAT32_LE = np.dtype("<f4")
+_INT8 = np.dtype("i1")
+
+
+def encode_embedding(vector: Sequence[float], encoding: str = ENCODING_FLOAT32) -> Dict[str, Any]:
+    """将向量编码为需要 $set 到 MongoDB 文档中的字段"""
+    if encoding not in SUPPORTED_ENCODINGS:
+        raise ValueError(f"Unsupported embedding encoding: {encoding}")
+    if encoding == ENCODING_LIST:
+        return {"embedding": [float(value) for value in vector]}
+
+    array = np.asarray(vector, dtype=np.float32)
+    if array.ndim != 1 or array.size == 0:
+        raise ValueError("embedding must be a non-empty one-dimensional vector")
+
+    fields: Dict[str, Any] = {
+        "embedding_dtype": encoding,
+        "embedding_dim": int(array.shape[0]),
+        "embedding_norm": float(np.linalg.norm(array)),
+    }
+    if encoding == ENCODING_FLOAT32:
+        fields["embedding_bin"] = Binary(array.astype(_FLOAT32_LE, copy=False).tobytes())
+        return fields
+
+    max_abs = float(np.max(np.abs(array)))
+    scale = max_abs / 127.0 if max_abs > 0 else 1.0
+    quantized = np.clip(np.rint(array / scale), -127, 127).astype(_INT8)
+    fields["embedding_bin"] = Binary(quantized.tobytes())
+    fields["embedding_scale"] = scale
+    return fields
+
+
+def decode_embedding(doc: Dict[str, Any]) -> Optional[np.ndarray]:
+    """从 MongoDB 文档中解码 float32 向量，兼容旧的列表格式"""
+    raw = doc.get("embedding_bin")
+    if raw is not None:
+        dtype = doc.get("embedding_dtype") or ENCODING_FLOAT32
+        if dtype == ENCODING_FLOAT32:
+            # 只读视图，不复制缓冲区
+            return np.frombuffer(raw, dtype=_FLOAT32_LE)
+        if dtype == ENCODING_INT8:
+            scale = float(doc.get("embedding_scale") or 1.0)
+            return np.frombuffer(raw, dtype=_INT8).astype(np.float32) * np.float32(scale)
+        return None
+
+    legacy = doc.get("embedding")
+    if isinstance(legacy, list) and legacy:
+        try:
+            return np.asarray(legacy, dtype=np.float32)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def decode_embedding_norm(doc: Dict[str, Any], vector: np.ndarray) -> float:
+    """读取预计算范数；旧文档没有范数时现场计算"""
+    norm = doc.get("embedding_norm")
+    if norm is not None:
+        try:
+            return float(norm)
+        except (TypeError, ValueError):
+            pass
+    return float(np.linalg.norm(vector))
+
+
+def decode_embedding_matrix(docs: Sequence[Dict[str, Any]], dim: int) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+    """批量解码文档向量
+
+    Returns:
+        (matrix, norms, kept_indices)，matrix 行未归一化，norms 为各行原始范数
+    """
+    rows: List[np.ndarray] = []
+    norms: List[float] = []
+    kept: List[int] = []
+    for index, doc in enumerate(docs):
+        vector = decode_embedding(doc)
+        if vector is None or vector.shape[0] != dim:
+            continue
+        rows.append(vector)
+        norms.append(decode_embedding_norm(doc, vector))
+        kept.append(index)
+    if not rows:
+        return np.empty((0, dim), dtype=np.float32), np.empty((0,), dtype=np.float32), []
+    return np.vstack(rows), np.asarray(norms, dtype=np.float32), kept
+
+
+def encoded_size_bytes(fields: Dict[str, Any]) -> int:
+    """估算编码后向量占用的字节数（BSON double 每个元素 8 字节 + 数组下标开销）"""
+    raw = fields.get("embedding_bin")
+    if raw is not None:
+        return len(raw)
+    legacy = fields.get("embedding") or []
+    # BSON 数组元素：1 字节类型 + 十进制下标 cstring + 8 字节 double
+    return sum(1 + len(str(index)) + 1 + 8 for index in range(len(legacy)))
@@ -0,0 +1,105 @@
+"""
+Milvus 记忆集合布局
+
+旧布局把所有用户的记忆放在同一个集合里，检索时用 expr 过滤 userId / namespace，
+每次检索都是对全体用户记忆的过滤 ANN。新布局：
+- userId 作为 partition key，expr 中带 userId == "..." 时 Milvus 只检索对应分区
+- namespace 建 INVERTED 标量索引，分区内按 namespace 过滤
+- 主键 memory_id = userId/namespace/memory_key，避免不同用户相同记忆内容互相覆盖
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+try:
+    from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+except Exception:
+    Collection = None
+    CollectionSchema = None
+    DataType = None
+    FieldSchema = None
+    utility = None
+
+logger = logging.getLogger(__name__)
+
+MEMORY_PRIMARY_FIELD = "memory_id"
+MEMORY_PARTITION_KEY_FIELD = "userId"
+MEMORY_OUTPUT_FIELDS = ["memory_key", "userId", "namespace", "kind", "text", "payload_json", "embedding"]
+DEFAULT_NUM_PARTITIONS = 64
+DEFAULT_VECTOR_INDEX = {
+    "index_type": "HNSW",
+    "metric_type": "COSINE",
+    "params": {"M": 16, "efConstruction": 200},
+}
+
+
+def memory_primary_key(user_id: str, namespace: str, memory_key: str) -> str:
+    """分区布局下的主键：同一用户同一 namespace 内 memory_key 唯一"""
+    raw = f"{user_id}\x1f{namespace}\x1f{memory_key}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def build_memory_schema(dim: int, partition_key: bool = True) -> "CollectionSchema":
+    """记忆集合 schema；partition_key=False 时生成旧的单集合过滤布局（用于基准对比）"""
+    if CollectionSchema is None:
+        raise RuntimeError("pymilvus is not installed")
+    fields = [
+        FieldSchema(MEMORY_PRIMARY_FIELD, DataType.VARCHAR, is_primary=True, max_length=64),
+        FieldSchema("memory_key", DataType.VARCHAR, max_length=256),
+        FieldSchema(MEMORY_PARTITION_KEY_FIELD, DataType.VARCHAR, max_length=128, is_partition_key=partition_key),
+        FieldSchema("namespace", DataType.VARCHAR, max_length=64),
+        FieldSchema("kind", DataType.VARCHAR, max_length=64),
+        FieldSchema("text", DataType.VARCHAR, max_length=8192),
+        FieldSchema("payload_json", DataType.VARCHAR, max_length=65535),
+        FieldSchema("embedding", DataType.FLOAT_VECTOR, dim=dim),
+    ]
+    return CollectionSchema(fields, description="user long-term memories")
+
+
+def create_memory_collection(
+    name: str,
+    dim: int,
+    using: str = "default",
+    partition_key: bool = True,
+    num_partitions: int = DEFAULT_NUM_PARTITIONS,
+    vector_index: Optional[Dict[str, Any]] = None,
+) -> "Collection":
+    """创建记忆集合并建立向量索引和 namespace 标量索引"""
+    kwargs: Dict[str, Any] = {"using": using}
+    if partition_key:
+        kwargs["num_partitions"] = num_partitions
+    collection = Collection(name, schema=build_memory_schema(dim, partition_key=partition_key), **kwargs)
+    collection.create_index("embedding", vector_index or DEFAULT_VECTOR_INDEX)
+    collection.create_index("namespace", {"index_type": "INVERTED"}, index_name="namespace_inverted")
+    if not partition_key:
+        collection.create_index(MEMORY_PARTITION_KEY_FIELD, {"index_type": "INVERTED"}, index_name="userId_inverted")
+    return collection
+
+
+def ensure_memory_collection(name: str, dim: int, using: str = "default", **kwargs: Any) -> "Collection":
+    """集合不存在时按分区布局创建"""
+    if utility is None:
+        raise RuntimeError("pymilvus is not installed")
+    if utility.has_collection(name, using=using):
+        return Collection(name, using=using)
+    logger.info("Creating partition-key memory collection %s", name)
+    return create_memory_collection(name, dim, using=using, **kwargs)
+
+
+def collection_field_names(collection: Any) -> List[str]:
+    try:
+        return [field.name for field in collection.schema.fields]
+    except Exception:
+        return []
+
+
+def uses_partition_key_layout(collection: Any) -> bool:
+    """判断集合是否为 userId partition key 布局"""
+    try:
+        return any(
+            field.name == MEMORY_PARTITION_KEY_FIELD and getattr(field, "is_partition_key", False)
+            for field in collection.schema.fields
+        )
+    except Exception:
+        return False
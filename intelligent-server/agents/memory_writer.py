@@ -0,0 +1,303 @@
+"""
+记忆写入后台队列（write-behind）
+
+图节点中的 task/model 记忆写入原先在请求线程内同步完成 MongoDB 写入、Milvus upsert
+和 embedding 调用。这里改为：
+- 请求线程只把写入请求放入有界队列（O(1)，不做任何 I/O）
+- 后台线程按批取出，交给 Store.add_memories 完成一次 bulk_write + 一次批量 embedding + 一次 Milvus upsert
+- 批次失败按指数退避重试，仍失败则写入 dead-letter JSONL 文件，队列满时同样直接落入 dead-letter
+- 进程退出时 drain 剩余队列
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MEMORY_WRITER_ENABLED = os.getenv("MEMORY_WRITER_ENABLED", "true").strip().lower() not in {"0", "false", "no", "off"}
+MEMORY_WRITER_QUEUE_SIZE = int(os.getenv("MEMORY_WRITER_QUEUE_SIZE", "1000"))
+MEMORY_WRITER_BATCH_SIZE = int(os.getenv("MEMORY_WRITER_BATCH_SIZE", "32"))
+MEMORY_WRITER_FLUSH_INTERVAL = float(os.getenv("MEMORY_WRITER_FLUSH_INTERVAL", "0.5"))
+MEMORY_WRITER_MAX_RETRIES = int(os.getenv("MEMORY_WRITER_MAX_RETRIES", "3"))
+MEMORY_WRITER_DEAD_LETTER_FILE = os.getenv("MEMORY_WRITER_DEAD_LETTER_FILE") or str(
+    Path(__file__).resolve().parents[1] / "data" / "memory_dead_letter.jsonl"
+)
+
+_STOP = object()
+
+
+class MemoryWriter:
+    """有界队列 + 单后台线程的批量记忆写入器"""
+
+    def __init__(
+        self,
+        store_factory=None,
+        max_queue_size: int = MEMORY_WRITER_QUEUE_SIZE,
+        batch_size: int = MEMORY_WRITER_BATCH_SIZE,
+        flush_interval: float = MEMORY_WRITER_FLUSH_INTERVAL,
+        max_retries: int = MEMORY_WRITER_MAX_RETRIES,
+        dead_letter_file: str = MEMORY_WRITER_DEAD_LETTER_FILE,
+    ):
+        self._store_factory = store_factory
+        self._store = None
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_queue_size))
+        self._batch_size = max(1, batch_size)
+        self._flush_interval = max(0.01, flush_interval)
+        self._max_retries = max(0, max_retries)
+        self._dead_letter_file = dead_letter_file
+        self._dead_letter_lock = threading.Lock()
+        self._lifecycle_lock = threading.Lock()
+        # 生产者线程与后台线程都会更新统计，计数需在锁内累加
+        self._stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "retries": 0,
+            "dead_lettered": 0,
+            "rejected_full": 0,
+            "last_batch_size": 0,
+            "last_batch_ms": 0.0,
+            "last_error": None,
+        }
+
+    # --- 生产者接口 ---
+
+    def submit_task_memory(self, user_id: str, task_summary: str, task_spec: Dict[str, Any]) -> bool:
+        return self.submit({
+            "op": "task_memory",
+            "user_id": user_id,
+            "task_summary": task_summary,
+            "task_spec": task_spec,
+        })
+
+    def submit_model_memory(
+        self, user_id: str, model_md5: str, model_name: str, reason: str = None, success: bool = True
+    ) -> bool:
+        return self.submit({
+            "op": "model_memory",
+            "user_id": user_id,
+            "model_md5": model_md5,
+            "model_name": model_name,
+            "reason": reason,
+            "success": bool(success),
+        })
+
+    def submit(self, request: Dict[str, Any]) -> bool:
+        """非阻塞入队；队列已满或已停止时写入 dead-letter 并返回 False"""
+        if not request.get("user_id"):
+            return False
+        request.setdefault("enqueued_at", datetime.utcnow().isoformat())
+        # 与 stop() 共用生命周期锁：通过检查后入队的请求一定排在 _STOP 之前，不会启动无人 drain 的线程
+        with self._lifecycle_lock:
+            if self._stopping:
+                reason = "writer stopped"
+            else:
+                self._ensure_started()
+                try:
+                    self._queue.put_nowait(request)
+                    reason = None
+                except queue.Full:
+                    reason = "queue full"
+        if reason is not None:
+            if reason == "queue full":
+                self._bump(rejected_full=1)
+            self._dead_letter([request], reason)
+            return False
+        self._bump(enqueued=1)
+        return True
+
+    # --- 生命周期 ---
+
+    def _ensure_started(self) -> None:
+        """调用方需持有 _lifecycle_lock"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """停止接收新请求，等待后台线程写完队列中的剩余请求"""
+        with self._lifecycle_lock:
+            self._stopping = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            thread.join(timeout=timeout)
+        # 后台线程未能及时退出时，剩余请求直接落入 dead-letter，避免丢失
+        leftovers: List[Dict[str, Any]] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            self._dead_letter(leftovers, "shutdown timeout")
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "running": bool(self._thread is not None and self._thread.is_alive()),
+            **stats,
+        }
+
+    def _bump(self, **counters: int) -> None:
+        with self._stats_lock:
+            for name, value in counters.items():
+                self._stats[name] += value
+
+    def _set_stats(self, **values: Any) -> None:
+        with self._stats_lock:
+            self._stats.update(values)
+
+    # --- 后台线程 ---
+
+    def _run(self) -> None:
+        while True:
+            batch, stop = self._next_batch()
+            if batch:
+                self._write_with_retry(batch)
+            if stop:
+                return
+
+    def _next_batch(self):
+        """阻塞等待第一条请求，随后在 flush_interval 内尽量凑满一批"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self._flush_interval
+        while len(batch) < self._batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _get_store(self):
+        if self._store is None:
+            if self._store_factory is None:
+                from .store import Store
+                self._store_factory = Store
+            self._store = self._store_factory()
+        return self._store
+
+    def _to_entries(self, store, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        entries = []
+        for request in batch:
+            if request.get("op") == "task_memory":
+                entry = store._task_memory_entry(request["user_id"], request.get("task_summary"), request.get("task_spec") or {})
+            else:
+                entry = store._model_memory_entry(
+                    request["user_id"],
+                    request.get("model_md5"),
+                    request.get("model_name"),
+                    request.get("reason"),
+                    request.get("success", True),
+                )
+            if entry:
+                entries.append(entry)
+        return entries
+
+    def _write_with_retry(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.monotonic()
+        for attempt in range(self._max_retries + 1):
+            try:
+                store = self._get_store()
+                store.add_memories(self._to_entries(store, batch))
+                self._bump(written=len(batch), batches=1)
+                self._set_stats(
+                    last_batch_size=len(batch),
+                    last_batch_ms=round((time.monotonic() - started) * 1000, 2),
+                )
+                return
+            except Exception as e:
+                self._set_stats(last_error=str(e)[:200])
+                if attempt >= self._max_retries:
+                    logger.warning("Memory write batch failed after %s attempts: %s", attempt + 1, str(e)[:100])
+                    self._dead_letter(batch, str(e)[:200])
+                    return
+                self._bump(retries=1)
+                # 连接类错误时丢弃缓存的 Store，下次重建
+                self._store = None
+                time.sleep(min(0.2 * (2 ** attempt), 5.0))
+
+    def _dead_letter(self, batch: List[Dict[str, Any]], reason: str) -> None:
+        self._bump(dead_lettered=len(batch))
+        failed_at = datetime.utcnow().isoformat()
+        try:
+            with self._dead_letter_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self._dead_letter_file)), exist_ok=True)
+                with open(self._dead_letter_file, "a", encoding="utf-8") as f:
+                    for request in batch:
+                        record = {**request, "failed_at": failed_at, "error": reason}
+                        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except Exception as e:
+            logger.error("Failed to write memory dead-letter file: %s", str(e)[:100])
+
+
+_memory_writer: Optional[MemoryWriter] = None
+_memory_writer_lock = threading.Lock()
+
+
+def get_memory_writer() -> MemoryWriter:
+    """进程内共享的记忆写入器"""
+    global _memory_writer
+    with _memory_writer_lock:
+        if _memory_writer is None:
+            _memory_writer = MemoryWriter()
+        return _memory_writer
+
+
+def submit_task_memory(user_id: str, task_summary: str, task_spec: Dict[str, Any]) -> None:
+    """写入 task 记忆：默认进入后台队列，MEMORY_WRITER_ENABLED=false 时同步写入"""
+    if MEMORY_WRITER_ENABLED:
+        get_memory_writer().submit_task_memory(user_id, task_summary, task_spec)
+        return
+    from .store import Store
+    Store().add_task_memory(user_id, task_summary, task_spec)
+
+
+def submit_model_memory(user_id: str, model_md5: str, model_name: str, reason: str = None, success: bool = True) -> None:
+    """写入 model 记忆：默认进入后台队列，MEMORY_WRITER_ENABLED=false 时同步写入"""
+    if MEMORY_WRITER_ENABLED:
+        get_memory_writer().submit_model_memory(user_id, model_md5, model_name, reason, success)
+        return
+    from .store import Store
+    Store().add_model_memory(user_id, model_md5, model_name, reason=reason, success=success)
+
+
+def memory_writer_metrics() -> Dict[str, Any]:
+    with _memory_writer_lock:
+        writer = _memory_writer
+    if writer is None:
+        return {"enabled": MEMORY_WRITER_ENABLED, "queue_depth": 0, "running": False}
+    return {"enabled": MEMORY_WRITER_ENABLED, **writer.metrics()}
+
+
+def shutdown_memory_writer(timeout: float = 10.0) -> None:
+    """进程退出前写完队列中的剩余记忆"""
+    with _memory_writer_lock:
+        writer = _memory_writer
+    if writer is not None:
+        writer.stop(timeout=timeout)
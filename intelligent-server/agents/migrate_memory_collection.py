@@ -0,0 +1,134 @@
+"""
+Milvus 记忆集合迁移脚本：旧的单集合过滤布局 -> userId partition key 布局
+
+使用方式（在 intelligent-server 目录下）:
+  python -m agents.migrate_memory_collection --target userMemories_v2
+  python -m agents.migrate_memory_collection --source userMemories --target userMemories_v2 --num-partitions 128
+迁移完成后把 MEMORY_MILVUS_COLLECTION 指向新集合（或使用 --swap-alias 切换别名）。
+"""
+
+import argparse
+import logging
+import time
+from typing import Any, Dict, List
+
+from pymilvus import Collection, connections, utility
+
+from .memory_collection import (
+    DEFAULT_NUM_PARTITIONS,
+    MEMORY_OUTPUT_FIELDS,
+    MEMORY_PRIMARY_FIELD,
+    create_memory_collection,
+    memory_primary_key,
+)
+from .store import MEMORY_EMBEDDING_DIM, MEMORY_MILVUS_COLLECTION, MILVUS_HOST, MILVUS_PORT
+
+logger = logging.getLogger(__name__)
+
+_ALIAS = "memory_migration"
+
+
+def _to_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    user_id = str(record.get("userId") or "")
+    namespace = str(record.get("namespace") or "")
+    memory_key = str(record.get("memory_key") or "")
+    return {
+        MEMORY_PRIMARY_FIELD: memory_primary_key(user_id, namespace, memory_key),
+        "memory_key": memory_key,
+        "userId": user_id,
+        "namespace": namespace,
+        "kind": str(record.get("kind") or namespace),
+        "text": str(record.get("text") or ""),
+        "payload_json": str(record.get("payload_json") or "{}"),
+        "embedding": list(record.get("embedding") or []),
+    }
+
+
+def migrate_collection(
+    source: str,
+    target: str,
+    batch_size: int = 1000,
+    num_partitions: int = DEFAULT_NUM_PARTITIONS,
+    drop_target: bool = False,
+) -> Dict[str, Any]:
+    """逐批读取旧集合并写入分区布局的新集合，返回迁移统计"""
+    if not utility.has_collection(source, using=_ALIAS):
+        raise RuntimeError(f"Source collection '{source}' does not exist")
+    if utility.has_collection(target, using=_ALIAS):
+        if not drop_target:
+            raise RuntimeError(f"Target collection '{target}' already exists; pass --drop-target to recreate it")
+        utility.drop_collection(target, using=_ALIAS)
+
+    source_collection = Collection(source, using=_ALIAS)
+    source_collection.load()
+    source_fields = {field.name for field in source_collection.schema.fields}
+    output_fields = [field for field in MEMORY_OUTPUT_FIELDS if field in source_fields]
+
+    dim = MEMORY_EMBEDDING_DIM
+    for field in source_collection.schema.fields:
+        if field.name == "embedding":
+            dim = int(field.params.get("dim", dim))
+
+    target_collection = create_memory_collection(target, dim, using=_ALIAS, num_partitions=num_partitions)
+    stats = {"source": source, "target": target, "copied": 0, "skipped": 0}
+    started = time.time()
+
+    iterator = source_collection.query_iterator(batch_size=batch_size, expr="", output_fields=output_fields)
+    try:
+        while True:
+            records: List[Dict[str, Any]] = iterator.next()
+            if not records:
+                break
+            rows = []
+            for record in records:
+                row = _to_row(record)
+                if len(row["embedding"]) != dim or not row["userId"]:
+                    stats["skipped"] += 1
+                    continue
+                rows.append(row)
+            if rows:
+                target_collection.upsert(rows)
+                stats["copied"] += len(rows)
+                logger.info("Copied %s memories so far", stats["copied"])
+    finally:
+        iterator.close()
+
+    target_collection.flush()
+    stats["elapsed_seconds"] = round(time.time() - started, 2)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrate Milvus memories to a userId partition-key collection")
+    parser.add_argument("--source", default=MEMORY_MILVUS_COLLECTION, help="旧集合名（默认取 MEMORY_MILVUS_COLLECTION）")
+    parser.add_argument("--target", required=True, help="新集合名")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--num-partitions", type=int, default=DEFAULT_NUM_PARTITIONS, help="partition key 哈希分区数")
+    parser.add_argument("--drop-target", action="store_true", help="目标集合已存在时删除重建")
+    parser.add_argument("--swap-alias", default=None, help="迁移完成后把该别名指向新集合")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.source:
+        parser.error("--source is required when MEMORY_MILVUS_COLLECTION is not configured")
+
+    connections.connect(alias=_ALIAS, host=MILVUS_HOST, port=MILVUS_PORT)
+    stats = migrate_collection(
+        source=args.source,
+        target=args.target,
+        batch_size=max(1, args.batch_size),
+        num_partitions=max(1, args.num_partitions),
+        drop_target=args.drop_target,
+    )
+    if args.swap_alias:
+        try:
+            utility.alter_alias(args.target, args.swap_alias, using=_ALIAS)
+        except Exception:
+            utility.create_alias(args.target, args.swap_alias, using=_ALIAS)
+        stats["alias"] = args.swap_alias
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+userMemories 向量编码迁移脚本
+
+把 MongoDB 降级存储中的旧 float64 列表向量改写为紧凑二进制编码（或反向回退）。
+全量迁移（未指定 --user-id）完成后在 memoryEmbeddingState 中记录编码，Store 此后才按新编码写入。
+
+使用方式（在 intelligent-server 目录下）:
+  python -m agents.migrate_memory_embeddings --encoding float32
+  python -m agents.migrate_memory_embeddings --encoding int8 --user-id <userId> --dry-run
+"""
+
+import argparse
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from pymongo import MongoClient, UpdateOne
+
+from .embedding_codec import (
+    COMPACT_FIELDS,
+    ENCODING_LIST,
+    SUPPORTED_ENCODINGS,
+    decode_embedding,
+    encode_embedding,
+    encoded_size_bytes,
+)
+from .store import (
+    MEMORY_COLLECTION,
+    MEMORY_EMBEDDING_ENCODING,
+    MONGO_DB_NAME,
+    MONGO_URI,
+    Store,
+    record_migrated_encoding,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _source_filter(encoding: str, user_id: Optional[str]) -> Dict[str, Any]:
+    """筛选需要迁移的文档：编码与目标不一致的向量"""
+    if encoding == ENCODING_LIST:
+        query: Dict[str, Any] = {"embedding_bin": {"$exists": True}}
+    else:
+        query = {
+            "$or": [
+                {"embedding": {"$exists": True}},
+                {"embedding_bin": {"$exists": True}, "embedding_dtype": {"$ne": encoding}},
+            ]
+        }
+    if user_id:
+        query["userId"] = user_id
+    return query
+
+
+def migrate_embeddings(
+    encoding: str,
+    batch_size: int = 500,
+    user_id: Optional[str] = None,
+    dry_run: bool = False,
+    mongo_uri: str = MONGO_URI,
+    db_name: str = MONGO_DB_NAME,
+) -> Dict[str, Any]:
+    """分批改写 userMemories 中的向量字段，返回迁移统计"""
+    if encoding not in SUPPORTED_ENCODINGS:
+        raise ValueError(f"Unsupported embedding encoding: {encoding}")
+    if not mongo_uri or not db_name:
+        raise RuntimeError("MONGO_URI and MONGO_DB_NAME must be configured in intelligent-server/.env")
+
+    db = MongoClient(mongo_uri)[db_name]
+    collection = db[MEMORY_COLLECTION]
+    projection = {"embedding": 1, **{field: 1 for field in COMPACT_FIELDS}}
+    stats = {
+        "encoding": encoding,
+        "scanned": 0,
+        "migrated": 0,
+        "skipped": 0,
+        "bytes_before": 0,
+        "bytes_after": 0,
+        "dry_run": dry_run,
+    }
+    started = time.time()
+    pending: List[UpdateOne] = []
+
+    def flush() -> None:
+        if pending and not dry_run:
+            collection.bulk_write(pending, ordered=False)
+        pending.clear()
+
+    cursor = collection.find(_source_filter(encoding, user_id), projection, no_cursor_timeout=True).batch_size(batch_size)
+    try:
+        for doc in cursor:
+            stats["scanned"] += 1
+            vector = decode_embedding(doc)
+            if vector is None:
+                stats["skipped"] += 1
+                continue
+
+            previous = {key: doc[key] for key in ("embedding", "embedding_bin") if key in doc}
+            fields = encode_embedding(vector.tolist(), encoding)
+            stats["bytes_before"] += encoded_size_bytes(previous)
+            stats["bytes_after"] += encoded_size_bytes(fields)
+            stats["migrated"] += 1
+
+            pending.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": fields, "$unset": Store._stale_embedding_fields(encoding)},
+            ))
+            if len(pending) >= batch_size:
+                flush()
+                logger.info("Migrated %s memory embeddings so far", stats["migrated"])
+        flush()
+    finally:
+        cursor.close()
+
+    # 全量迁移完成后才让 Store 切换到目标编码（此前仍写 embedding 列表，保持 knnVector 索引有效）
+    if not dry_run and not user_id:
+        record_migrated_encoding(db, encoding)
+        stats["encoding_activated"] = True
+
+    stats["elapsed_seconds"] = round(time.time() - started, 2)
+    if stats["bytes_after"]:
+        stats["shrink_ratio"] = round(stats["bytes_before"] / stats["bytes_after"], 2)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rewrite userMemories embeddings into a compact binary encoding")
+    parser.add_argument(
+        "--encoding",
+        choices=list(SUPPORTED_ENCODINGS),
+        default=MEMORY_EMBEDDING_ENCODING,
+        help="目标编码（默认取 MEMORY_EMBEDDING_ENCODING）",
+    )
+    parser.add_argument("--batch-size", type=int, default=500, help="每批 bulk_write 的文档数")
+    parser.add_argument("--user-id", default=None, help="只迁移指定用户的记忆")
+    parser.add_argument("--dry-run", action="store_true", help="只统计体积变化，不写回")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stats = migrate_embeddings(
+        encoding=args.encoding,
+        batch_size=max(1, args.batch_size),
+        user_id=args.user_id,
+        dry_run=args.dry_run,
+    )
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+托管的 Milvus 连接
+
+原先 get_milvus_collection 在首个用户请求时才连接并 load 集合，冷启动延迟落在第一个用户身上；
+连接断开后缓存的 Collection 也不会恢复。ManagedMilvusClient 负责：
+- 应用启动时预热：建立连接、load 集合并做一次轻量查询
+- 多个连接别名（各自独立的 gRPC 通道），检索按轮询分摊到不同别名
+- 后台健康检查；检索遇到连接类错误或检查失败时标记为不可用，并按指数退避重连
+- readiness() 供健康检查接口返回
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    from pymilvus import Collection, connections, utility
+except Exception:
+    Collection = None
+    connections = None
+    utility = None
+
+try:
+    from pymilvus import exceptions as milvus_exceptions
+except Exception:
+    milvus_exceptions = None
+
+try:
+    import grpc
+except Exception:
+    grpc = None
+
+logger = logging.getLogger(__name__)
+
+MILVUS_POOL_SIZE = int(os.getenv("MILVUS_POOL_SIZE", "2"))
+MILVUS_HEALTH_CHECK_INTERVAL = float(os.getenv("MILVUS_HEALTH_CHECK_INTERVAL", "30"))
+MILVUS_RECONNECT_BACKOFF_BASE = float(os.getenv("MILVUS_RECONNECT_BACKOFF_BASE", "1"))
+MILVUS_RECONNECT_BACKOFF_MAX = float(os.getenv("MILVUS_RECONNECT_BACKOFF_MAX", "60"))
+
+STATE_IDLE = "idle"
+STATE_READY = "ready"
+STATE_DOWN = "down"
+
+# pymilvus 的 Status.CONNECT_FAILED / 服务端 ServiceUnavailable
+_MILVUS_CONNECTION_ERROR_CODES = {2}
+_MILVUS_CONNECTION_EXCEPTIONS = tuple(
+    getattr(milvus_exceptions, name)
+    for name in ("ConnectError", "ConnectionNotExistException", "MilvusUnavailableException")
+    if milvus_exceptions is not None and hasattr(milvus_exceptions, name)
+) + (ConnectionError,)
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """连接类错误（gRPC UNAVAILABLE / DEADLINE_EXCEEDED、连接类 MilvusException）才需要重连
+
+    参数错误、schema / BM25 不匹配等查询错误与连接无关，不应影响连接池状态。
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, _MILVUS_CONNECTION_EXCEPTIONS):
+            return True
+        if grpc is not None and isinstance(error, grpc.RpcError) and callable(getattr(error, "code", None)):
+            if error.code() in (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED):
+                return True
+        if milvus_exceptions is not None and isinstance(error, milvus_exceptions.MilvusException):
+            if getattr(error, "code", None) in _MILVUS_CONNECTION_ERROR_CODES:
+                return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class ManagedMilvusClient:
+    """单个集合的 Milvus 连接池（按别名轮询）+ 健康检查 + 退避重连"""
+
+    def __init__(
+        self,
+        collection_name: str,
+        host: str,
+        port: int,
+        pool_size: int = MILVUS_POOL_SIZE,
+        alias_prefix: str = "milvus",
+        health_check_interval: float = MILVUS_HEALTH_CHECK_INTERVAL,
+    ):
+        self.collection_name = collection_name
+        self.host = host
+        self.port = port
+        self.aliases = [f"{alias_prefix}_{index}" for index in range(max(1, pool_size))]
+        self._health_check_interval = max(1.0, health_check_interval)
+        self._collections: List[Any] = []
+        self._round_robin = itertools.count()
+        self._lock = threading.RLock()
+        self._state = STATE_IDLE
+        self._last_error: Optional[str] = None
+        self._failures = 0
+        self._next_attempt_at = 0.0
+        self._ready_at: Optional[float] = None
+        self._last_check_at: Optional[float] = None
+        self._monitor: Optional[threading.Thread] = None
+        self._monitor_stop = threading.Event()
+
+    # --- 连接管理 ---
+
+    def _disconnect(self) -> None:
+        self._collections = []
+        if connections is None:
+            return
+        for alias in self.aliases:
+            try:
+                connections.disconnect(alias)
+            except Exception:
+                pass
+
+    def _connect(self) -> None:
+        """建立所有别名连接并 load 集合（集合 load 是服务端状态，只需一次）"""
+        if Collection is None or connections is None:
+            raise RuntimeError("pymilvus is not installed")
+        if not self.collection_name:
+            raise RuntimeError("Milvus collection is not configured")
+        self._disconnect()
+        collections = []
+        for alias in self.aliases:
+            connections.connect(alias=alias, host=self.host, port=self.port)
+            collections.append(Collection(self.collection_name, using=alias))
+        collections[0].load()
+        self._collections = collections
+
+    def _mark_ready(self) -> None:
+        self._state = STATE_READY
+        self._failures = 0
+        self._last_error = None
+        self._next_attempt_at = 0.0
+        self._ready_at = time.time()
+
+    def _mark_down(self, error: Exception) -> None:
+        self._state = STATE_DOWN
+        self._failures += 1
+        self._last_error = str(error)[:200]
+        backoff = min(MILVUS_RECONNECT_BACKOFF_BASE * (2 ** (self._failures - 1)), MILVUS_RECONNECT_BACKOFF_MAX)
+        self._next_attempt_at = time.monotonic() + backoff
+        self._collections = []
+
+    def connect(self, force: bool = False) -> bool:
+        """尝试连接；处于退避窗口内且非强制时直接返回当前状态"""
+        with self._lock:
+            if self._state == STATE_READY and self._collections and not force:
+                return True
+            if not force and time.monotonic() < self._next_attempt_at:
+                return False
+            try:
+                self._connect()
+                self._mark_ready()
+                logger.info("✓ Milvus collection %s ready on %s aliases", self.collection_name, len(self.aliases))
+                return True
+            except Exception as e:
+                self._mark_down(e)
+                logger.warning(
+                    "Milvus connection failed (attempt %s): %s", self._failures, str(e)[:100]
+                )
+                return False
+
+    def warmup(self) -> bool:
+        """启动时调用：连接、load 并做一次轻量访问，使首个请求无需等待"""
+        if not self.connect(force=True):
+            return False
+        with self._lock:
+            collections = list(self._collections)
+        try:
+            if not collections:
+                raise RuntimeError("Milvus connection dropped during warmup")
+            _ = collections[0].num_entities
+            for extra in collections[1:]:
+                _ = extra.schema
+            return True
+        except Exception as e:
+            with self._lock:
+                self._mark_down(e)
+            return False
+
+    def get_collection(self) -> Any:
+        """轮询返回一个别名上的 Collection；不可用时按退避策略尝试重连"""
+        # 快照须在锁内读取：并发的 _mark_down 会清空 _collections
+        for _ in range(2):
+            with self._lock:
+                collections = self._collections if self._state == STATE_READY else []
+            if collections:
+                return collections[next(self._round_robin) % len(collections)]
+            if not self.connect():
+                break
+        raise RuntimeError(f"Milvus unavailable: {self._last_error or 'not connected'}")
+
+    def report_failure(self, error: Exception) -> bool:
+        """检索调用失败时上报；只有连接类错误会标记为不可用并在下一次请求前重连，返回是否标记"""
+        if not is_connection_error(error):
+            return False
+        with self._lock:
+            if self._state == STATE_READY:
+                logger.warning("Milvus call failed, marking connection for reconnect: %s", str(error)[:100])
+                self._mark_down(error)
+                # 首次失败立即允许重连，后续失败按退避
+                self._next_attempt_at = 0.0 if self._failures == 1 else self._next_attempt_at
+        return True
+
+    # --- 健康检查 ---
+
+    def health_check(self) -> bool:
+        self._last_check_at = time.time()
+        if self._state != STATE_READY:
+            return self.connect()
+        try:
+            utility.get_server_version(using=self.aliases[0])
+            return True
+        except Exception as e:
+            with self._lock:
+                self._mark_down(e)
+            return self.connect()
+
+    def _monitor_loop(self) -> None:
+        while not self._monitor_stop.wait(self._health_check_interval):
+            try:
+                self.health_check()
+            except Exception:
+                logger.exception("Milvus health check failed")
+
+    def start_health_monitor(self) -> None:
+        if self._monitor is not None and self._monitor.is_alive():
+            return
+        self._monitor_stop.clear()
+        self._monitor = threading.Thread(target=self._monitor_loop, name=f"{self.aliases[0]}-health", daemon=True)
+        self._monitor.start()
+
+    def close(self) -> None:
+        self._monitor_stop.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout=5)
+            self._monitor = None
+        with self._lock:
+            self._disconnect()
+            self._state = STATE_IDLE
+
+    def readiness(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection_name,
+            "state": self._state,
+            "ready": self._state == STATE_READY,
+            "aliases": len(self.aliases),
+            "failures": self._failures,
+            "last_error": self._last_error,
+            "ready_since": self._ready_at,
+            "last_check_at": self._last_check_at,
+        }
@@ -0,0 +1,70 @@
+"""
+客户端多路召回融合
+
+与 Milvus 服务端 WeightedRanker / RRFRanker 的计算方式保持一致，
+使稠密检索和 BM25 稀疏检索并发执行后能在客户端合并，任一路失败时仍可直接使用另一路结果。
+"""
+
+import math
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+FUSION_WEIGHTED = "weighted"
+FUSION_RRF = "rrf"
+DEFAULT_RRF_K = 60
+
+
+def normalize_score(score: float, metric_type: str) -> float:
+    """按度量类型把原始得分映射到 [0, 1]（与 Milvus WeightedRanker 的归一化一致）"""
+    metric = (metric_type or "").upper()
+    if metric == "COSINE":
+        return (1.0 + score) / 2.0
+    if metric == "L2":
+        return 1.0 - 2.0 * math.atan(score) / math.pi
+    # IP / BM25 等无界得分
+    return 0.5 + math.atan(score) / math.pi
+
+
+def _default_key(hit: Dict[str, Any]) -> Any:
+    return hit.get("modelMd5") or hit.get("modelId")
+
+
+def fuse_results(
+    routes: Sequence[Optional[List[Dict[str, Any]]]],
+    metric_types: Sequence[str],
+    weights: Sequence[float],
+    top_k: int,
+    fusion: str = FUSION_WEIGHTED,
+    rrf_k: int = DEFAULT_RRF_K,
+    key: Callable[[Dict[str, Any]], Any] = _default_key,
+) -> List[Dict[str, Any]]:
+    """合并多路按得分降序排列的命中
+
+    Args:
+        routes: 每一路的命中列表，失败的路传 None 或空列表
+        metric_types: 每一路的度量类型（weighted 归一化使用）
+        weights: 每一路的权重（weighted 使用）
+        fusion: "weighted" 或 "rrf"
+    Returns:
+        融合后的前 top_k 条命中，score 为融合得分，rank 从 1 开始
+    """
+    fused: Dict[Any, float] = {}
+    hits: Dict[Any, Dict[str, Any]] = {}
+    for route_index, route in enumerate(routes):
+        if not route:
+            continue
+        for position, hit in enumerate(route):
+            hit_key = key(hit)
+            if hit_key is None:
+                continue
+            if fusion == FUSION_RRF:
+                contribution = 1.0 / (rrf_k + position + 1)
+            else:
+                contribution = weights[route_index] * normalize_score(float(hit.get("score") or 0.0), metric_types[route_index])
+            fused[hit_key] = fused.get(hit_key, 0.0) + contribution
+            hits.setdefault(hit_key, hit)
+
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    results: List[Dict[str, Any]] = []
+    for rank, (hit_key, score) in enumerate(ordered, start=1):
+        results.append({**hits[hit_key], "score": score, "rank": rank})
+    return results
@@ -2,7 +2,10 @@ from . import tools
 from typing import TypedDict, Dict, Any, Annotated, Optional, get_type_hints, get_origin, get_args
 from langchain.messages import ToolMessage, HumanMessage, SystemMessage, AnyMessage
 from ..context_manager import ContextManager
-from ..store import Store
+from ..memory_writer import submit_model_memory, submit_task_memory
+from ..checkpoint_maintenance import CHECKPOINT_DB_NAME, get_checkpoint_maintainer
+from .tool_result_store import get_tool_result_store
+from .summarizer import MESSAGE_SUMMARY_ASYNC, get_summarizer
 from langgraph.graph import StateGraph, START, END
 import operator
 import json
@@ -17,6 +20,7 @@ from langgraph.checkpoint.mongodb import MongoDBSaver
 from pydantic import BaseModel, Field
 from langgraph.prebuilt import InjectedState
 from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig
 from dotenv import load_dotenv
 
 # 连接配置
@@ -391,7 +395,10 @@ def get_scoped_tool_results(state: ModelState) -> Dict[str, Any]:
     scope_id = get_tool_scope_id(state)
     if tool_results.get("_scope_id") and tool_results.get("_scope_id") != scope_id:
         return {}
-    return {k: v for k, v in tool_results.items() if not str(k).startswith("_")}
+    # 大结果在检查点中只保存引用，读取时还原
+    return get_tool_result_store(tools.get_db).resolve(
+        {k: v for k, v in tool_results.items() if not str(k).startswith("_")}
+    )
 
 def get_scoped_recommended_model(state: ModelState) -> Dict[str, Any]:
     recommended_model = dict(state.get("recommended_model", {}) or {})
@@ -413,7 +420,7 @@ def scoped_tool_results_envelope(state: ModelState, base_results: Optional[Dict[
         "_scope_id": scope_id,
         "_request_id": state.get("request_id", ""),
         "_task_hash": state.get("task_hash", ""),
-        **(base_results or {}),
+        **get_tool_result_store(tools.get_db).externalize(base_results or {}),
     }
 
 def compact_tool_results(tool_results: Optional[Dict[str, Any]]) -> Dict[str, Any]:
@@ -484,23 +491,10 @@ def build_structured_history_digest(messages: list[AnyMessage], ctx_mgr: Context
     return "\n\n".join(rows)
 
 
-def memory_maintenance_node(state: ModelState) -> Dict[str, Any]:
-    """负责对消息历史进行总结和压缩，生成对话摘要，并更新状态中的 messages 和 conversation_summary 字段"""
-    messages = state.get("messages", []) or []
-    if len(messages) <= MESSAGE_SUMMARY_TRIGGER:
-        return {}
-
-    keep_recent = max(MESSAGE_KEEP_RECENT, 4)
-    old_messages = messages[:-keep_recent]
-    recent_messages = messages[-keep_recent:]
-    if not old_messages:
-        return {}
-
+def summarize_history(old_messages: list[AnyMessage], previous_summary: str, latest_query: str) -> str:
+    """调用 LLM 把旧消息吸收进滚动摘要"""
     ctx_mgr = ContextManager(max_tokens=4000)
-    previous_summary = state.get("conversation_summary") or ""
     digest = build_structured_history_digest(old_messages, ctx_mgr)
-    latest_query = state.get("latest_user_query") or get_latest_user_query(messages)
-
     summary_prompt = (
         "请更新对话滚动摘要，用于后续地理建模智能体恢复上下文。"
         "摘要必须保留：用户目标、任务规范、关键约束、已调用工具、候选/已选模型、待确认问题。"
@@ -517,7 +511,10 @@ def memory_maintenance_node(state: ModelState) -> Dict[str, Any]:
     except Exception:
         summary_text = ""
 
-    summary_text = ctx_mgr._truncate_text(summary_text, 700)
+    return ctx_mgr._truncate_text(summary_text, 700)
+
+
+def build_summary_update(summary_text: str, recent_messages: list[AnyMessage]) -> Dict[str, Any]:
     summary_msg = HumanMessage(content=f"[Conversation Summary]\n{summary_text}")
     return {
         "messages": {
@@ -528,11 +525,42 @@ def memory_maintenance_node(state: ModelState) -> Dict[str, Any]:
     }
 
 
+def memory_maintenance_node(state: ModelState, config: RunnableConfig) -> Dict[str, Any]:
+    """负责对消息历史进行总结和压缩，生成对话摘要，并更新状态中的 messages 和 conversation_summary 字段
+
+    MESSAGE_SUMMARY_ASYNC 开启时摘要在后台生成并写回 thread 状态，本轮不等待。
+    """
+    messages = state.get("messages", []) or []
+    if len(messages) <= MESSAGE_SUMMARY_TRIGGER:
+        return {}
+
+    keep_recent = max(MESSAGE_KEEP_RECENT, 4)
+    old_messages = messages[:-keep_recent]
+    recent_messages = messages[-keep_recent:]
+    if not old_messages:
+        return {}
+
+    previous_summary = state.get("conversation_summary") or ""
+    latest_query = state.get("latest_user_query") or get_latest_user_query(messages)
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+
+    if MESSAGE_SUMMARY_ASYNC and thread_id:
+        get_summarizer().schedule(
+            thread_id,
+            old_messages,
+            lambda: summarize_history(old_messages, previous_summary, latest_query),
+            build_summary_update,
+        )
+        return {}
+
+    summary_text = summarize_history(old_messages, previous_summary, latest_query)
+    return build_summary_update(summary_text, recent_messages)
+
+
 def _persist_task_memory(user_id: Optional[str], task_spec: Dict[str, Any], latest_query: str) -> None:
     if not user_id or not task_spec or not any(str(v or "").strip() for v in task_spec.values()):
         return
     try:
-        store = Store()
         summary_parts = []
         if latest_query:
             summary_parts.append(f"query={latest_query}")
@@ -543,7 +571,7 @@ def _persist_task_memory(user_id: Optional[str], task_spec: Dict[str, Any], late
         if target:
             summary_parts.append(f"target={target}")
         summary = " | ".join(summary_parts) if summary_parts else "task_memory"
-        store.add_task_memory(user_id, summary, task_spec)
+        submit_task_memory(user_id, summary, task_spec)
     except Exception:
         pass
 
@@ -772,13 +800,12 @@ def recommend_model_node(state: ModelState) -> Dict[str, Any]:
 
     # 推荐后，若命中了具体模型则把推荐记入 user model memory
     try:
-        store = Store()
         user_id = state.get("user_id")
         if user_id and isinstance(response, dict):
             # 如果响应包含推荐模型信息，尝试写入
             rec = response.get("recommended_model") or {}
             if rec and rec.get("md5"):
-                store.add_model_memory(user_id, rec.get("md5"), rec.get("name", ""), reason="auto-recommend")
+                submit_model_memory(user_id, rec.get("md5"), rec.get("name", ""), reason="auto-recommend")
     except Exception:
         pass
 
@@ -938,7 +965,7 @@ def tool_node(state: ModelState) -> Dict[str, Any]:
                         model_name = observation.get("name", "")
                         reason = f"selected for task: {(state.get('Task_spec') or {}).get('Target_object', '')}"
                         if model_md5:
-                            Store().add_model_memory(
+                            submit_model_memory(
                                 user_id=user_id,
                                 model_md5=model_md5,
                                 model_name=model_name,
@@ -1031,6 +1058,8 @@ agent_builder.add_edge("model_contract_node", "memory_maintenance_node")
 agent_builder.add_edge("memory_maintenance_node", END)
 
 mongo_client = MongoClient(MONGO_URI)
-checkpointer = MongoDBSaver(mongo_client)
+checkpointer = MongoDBSaver(mongo_client, db_name=CHECKPOINT_DB_NAME)
+get_checkpoint_maintainer(mongo_client)
 
 agent = agent_builder.compile(checkpointer=checkpointer)
+get_summarizer().bind(agent)
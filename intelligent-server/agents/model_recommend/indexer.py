@@ -0,0 +1,501 @@
+"""
+模型目录离线索引（Milvus 模型集合的增量构建）
+
+读取 modelResource，生成与 NestJS ResourceService.buildResourceEmbeddingText 一致的 modelText，
+按内容哈希只为变化的模型重新生成 embedding 并写入 Milvus：
+- 内容哈希 = sha256(modelText + embedding 模型 + 维度)，记录在 modelIndexHashes 集合中；
+  没有哈希记录的模型先按 Milvus 中已有行的 modelText 补齐哈希，首次运行不会重新生成全部 embedding
+- 缺少 modelId 的模型直接跳过（检索结果无法关联回模型资源）
+- 稀疏向量由集合上的 BM25 function（model_text_bm25）在服务端根据 modelText 生成，无需客户端计算
+- 按 md5 顺序分批处理，每批写入成功后保存检查点，--resume 从上次中断处继续
+- embedding 请求按批并发（--workers），输出吞吐统计
+- 有变更时递增 modelIndexState 版本号，使检索缓存失效
+
+使用方式（在 intelligent-server 目录下）:
+  python -m agents.model_recommend.indexer
+  python -m agents.model_recommend.indexer --workers 4 --embed-batch-size 10 --resume
+  python -m agents.model_recommend.indexer --prune --dry-run
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from openai import OpenAI
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, Function, FunctionType, connections, utility
+from pymongo import MongoClient, UpdateOne
+
+from .local_index import MODEL_LOCAL_INDEX_DIR, export_local_index
+from .retrieval_cache import MODEL_INDEX_STATE_COLLECTION, bump_collection_version
+from .tools import (
+    AIHUBMIX_API_KEY,
+    AIHUBMIX_BASE_URL,
+    DB_NAME,
+    MILVUS_COLLECTION,
+    MILVUS_HOST,
+    MILVUS_PORT,
+    MODEL_RECOMMEND_EMBEDDING_MODEL,
+    MONGO_URI,
+)
+
+logger = logging.getLogger(__name__)
+
+MODEL_INDEX_HASH_COLLECTION = "modelIndexHashes"
+EMBEDDING_SOURCE = "RETRIEVAL_DOCUMENT"
+DEFAULT_EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "3072"))
+_ALIAS = "model_indexer"
+
+
+# --- modelText（与 NestJS 端保持一致） ---
+
+def _normalize_text(value: Any, max_length: int = 0) -> str:
+    if not isinstance(value, str):
+        return ""
+    normalized = re.sub(r"\s+", " ", value).strip()
+    if not normalized:
+        return ""
+    return normalized[:max_length] if max_length > 0 else normalized
+
+
+def _push_text_part(parts: List[str], label: str, value: Any, max_length: int = 0) -> None:
+    text = _normalize_text(value, max_length)
+    if text:
+        parts.append(f"{label}: {text}")
+
+
+def _extract_mdl_summary(value: Any) -> str:
+    if not isinstance(value, str):
+        return ""
+    text = re.sub(r"<[^>]+>", " ", value)
+    text = re.sub(r"&[a-zA-Z]+;", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _format_event_data(data: Any) -> str:
+    data_parts = []
+    for item in (data if isinstance(data, list) else [])[:6]:
+        item = item or {}
+        nodes = item.get("nodes") if isinstance(item.get("nodes"), list) else []
+        node_parts = [
+            " ".join(filter(None, [
+                _normalize_text((node or {}).get("name")),
+                _normalize_text((node or {}).get("description"), 160),
+                _normalize_text((node or {}).get("dataType")),
+            ]))
+            for node in nodes[:8]
+        ]
+        item_text = " ".join(filter(None, [
+            _normalize_text(item.get("name")),
+            _normalize_text(item.get("type")),
+            _normalize_text(item.get("description"), 180),
+            " ".join(filter(None, node_parts)),
+        ]))
+        if item_text:
+            data_parts.append(item_text)
+    return " ".join(data_parts)
+
+
+def _build_mdl_structured_text(mdl_json: Optional[Dict[str, Any]]) -> str:
+    mdl = (mdl_json or {}).get("mdl") or {}
+    en_attr = mdl.get("enAttr") or {}
+    parts: List[str] = []
+    _push_text_part(parts, "mdlName", mdl.get("name"))
+    _push_text_part(parts, "mdlLocalName", en_attr.get("localName"))
+    _push_text_part(parts, "mdlKeywords", en_attr.get("keywords"))
+    _push_text_part(parts, "mdlAbstract", en_attr.get("abstract"), 1600)
+    _push_text_part(parts, "mdlPrinciple", mdl.get("principle"), 1200)
+
+    states = mdl.get("states") if isinstance(mdl.get("states"), list) else []
+    state_parts: List[str] = []
+    input_parts: List[str] = []
+    output_parts: List[str] = []
+    for state in states[:24]:
+        state = state or {}
+        state_name = _normalize_text(state.get("stateName"))
+        state_desc = _normalize_text(state.get("stateDesc"), 300)
+        if state_name or state_desc:
+            state_parts.append(" - ".join(filter(None, [state_name, state_desc])))
+
+        events = state.get("event") if isinstance(state.get("event"), list) else []
+        for event in events[:24]:
+            event = event or {}
+            event_text = " - ".join(filter(None, [
+                _normalize_text(event.get("eventName")),
+                _normalize_text(event.get("eventDesc"), 240),
+                _format_event_data(event.get("data")),
+            ]))
+            if not event_text:
+                continue
+            if event.get("eventType") == "response":
+                input_parts.append(event_text)
+            else:
+                output_parts.append(event_text)
+
+    _push_text_part(parts, "mdlStates", "; ".join(state_parts[:40]), 2400)
+    _push_text_part(parts, "inputEvents", "; ".join(input_parts[:80]), 3600)
+    _push_text_part(parts, "outputEvents", "; ".join(output_parts[:80]), 3600)
+    return ". ".join(parts)
+
+
+def build_model_text(resource: Dict[str, Any]) -> str:
+    """模型检索文本：名称 + 描述 + MDL 结构化摘要（无结构化信息时退回 MDL 文本摘要）"""
+    parts: List[str] = []
+
+    def push_distinct(label: str, value: Any, max_length: int = 0) -> None:
+        text = _normalize_text(value, max_length)
+        if not text or text in " ".join(parts):
+            return
+        parts.append(f"{label}: {text}")
+
+    structured = _build_mdl_structured_text(resource.get("mdlJson"))
+    push_distinct("modelName", _normalize_text(resource.get("name")))
+    push_distinct("modelDescription", _normalize_text(resource.get("description")), 1600)
+    push_distinct("mdlStructured", structured, 11000)
+    if not structured:
+        push_distinct("mdlSummary", _extract_mdl_summary(_normalize_text(resource.get("mdl"))), 3000)
+    return ". ".join(parts)[:15000]
+
+
+def content_hash(model_text: str, embedding_model: str, dim: int) -> str:
+    raw = f"{embedding_model}\x1f{dim}\x1f{model_text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# --- Milvus 集合 ---
+
+def build_model_collection_schema(dim: int) -> CollectionSchema:
+    """与 NestJS MilvusService.createCollection 相同的混合检索 schema"""
+    fields = [
+        FieldSchema("id", DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema("modelId", DataType.VARCHAR, max_length=255),
+        FieldSchema("modelMd5", DataType.VARCHAR, max_length=255),
+        FieldSchema("modelName", DataType.VARCHAR, max_length=1024),
+        FieldSchema("modelDescription", DataType.VARCHAR, max_length=8192),
+        FieldSchema(
+            "modelText",
+            DataType.VARCHAR,
+            max_length=16384,
+            enable_analyzer=True,
+            enable_match=True,
+            analyzer_params={"type": "chinese"},
+        ),
+        FieldSchema("embeddingSource", DataType.VARCHAR, max_length=255),
+        FieldSchema("embedding", DataType.FLOAT_VECTOR, dim=dim),
+        FieldSchema("sparse", DataType.SPARSE_FLOAT_VECTOR),
+    ]
+    schema = CollectionSchema(fields, enable_dynamic_field=False)
+    schema.add_function(Function(
+        name="model_text_bm25",
+        function_type=FunctionType.BM25,
+        input_field_names=["modelText"],
+        output_field_names=["sparse"],
+    ))
+    return schema
+
+
+def ensure_model_collection(name: str, dim: int) -> Tuple[Collection, int]:
+    """集合不存在时创建；存在时沿用其向量维度"""
+    if utility.has_collection(name, using=_ALIAS):
+        collection = Collection(name, using=_ALIAS)
+        for field in collection.schema.fields:
+            if field.name == "embedding":
+                dim = int(field.params.get("dim", dim))
+        return collection, dim
+
+    logger.info("Creating Milvus model collection %s (dim=%s)", name, dim)
+    collection = Collection(name, schema=build_model_collection_schema(dim), using=_ALIAS)
+    collection.create_index("embedding", {"index_type": "HNSW", "metric_type": "COSINE", "params": {"M": 8, "efConstruction": 200}})
+    collection.create_index("sparse", {"index_type": "SPARSE_INVERTED_INDEX", "metric_type": "BM25", "params": {}})
+    return collection, dim
+
+
+def _md5_filter(md5s: List[str]) -> str:
+    escaped = ",".join('"' + md5.replace("\\", "\\\\").replace('"', '\\"') + '"' for md5 in md5s)
+    return f"modelMd5 in [{escaped}]"
+
+
+# --- 索引流程 ---
+
+class ModelCatalogIndexer:
+    """modelResource -> Milvus 模型集合的增量索引器"""
+
+    def __init__(
+        self,
+        collection_name: str = MILVUS_COLLECTION,
+        embedding_model: str = MODEL_RECOMMEND_EMBEDDING_MODEL,
+        dim: int = DEFAULT_EMBEDDING_DIM,
+        batch_size: int = 100,
+        embed_batch_size: int = 10,
+        workers: int = 4,
+        dry_run: bool = False,
+    ):
+        self.db = MongoClient(MONGO_URI)[DB_NAME]
+        self.hashes = self.db[MODEL_INDEX_HASH_COLLECTION]
+        self.state = self.db[MODEL_INDEX_STATE_COLLECTION]
+        self.collection_name = collection_name
+        self.embedding_model = embedding_model
+        self.batch_size = max(1, batch_size)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.workers = max(1, workers)
+        self.dry_run = dry_run
+        self.embedding_client = OpenAI(api_key=AIHUBMIX_API_KEY, base_url=AIHUBMIX_BASE_URL)
+        self.collection, self.dim = ensure_model_collection(collection_name, dim)
+        self._collection_loaded = False
+        self.stats: Dict[str, Any] = {
+            "scanned": 0,
+            "unchanged": 0,
+            "seeded": 0,
+            "skipped": 0,
+            "changed": 0,
+            "upserted": 0,
+            "failed": 0,
+            "pruned": 0,
+            "embed_seconds": 0.0,
+        }
+
+    @property
+    def _checkpoint_id(self) -> str:
+        return f"{self.collection_name}:checkpoint"
+
+    def _load_checkpoint(self) -> Optional[str]:
+        doc = self.state.find_one({"_id": self._checkpoint_id})
+        return (doc or {}).get("last_md5")
+
+    def _save_checkpoint(self, last_md5: Optional[str]) -> None:
+        if self.dry_run:
+            return
+        self.state.update_one(
+            {"_id": self._checkpoint_id},
+            {"$set": {"last_md5": last_md5, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    def _embed_chunk(self, texts: List[str]) -> List[List[float]]:
+        response = self.embedding_client.embeddings.create(model=self.embedding_model, input=texts)
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: getattr(item, "index", 0))]
+        if len(vectors) != len(texts):
+            raise RuntimeError(f"Embedding API returned {len(vectors)} vectors for {len(texts)} texts")
+        return vectors
+
+    def _embed_all(self, executor: ThreadPoolExecutor, texts: List[str]) -> List[Optional[List[float]]]:
+        """按 embed_batch_size 切分，多个批次并发请求；失败批次返回 None"""
+        started = time.perf_counter()
+        chunks = [texts[i:i + self.embed_batch_size] for i in range(0, len(texts), self.embed_batch_size)]
+        futures = [executor.submit(self._embed_chunk, chunk) for chunk in chunks]
+        vectors: List[Optional[List[float]]] = []
+        for chunk, future in zip(chunks, futures):
+            try:
+                vectors.extend(future.result())
+            except Exception as e:
+                logger.warning("Embedding batch failed (%s models): %s", len(chunk), str(e)[:100])
+                vectors.extend([None] * len(chunk))
+        self.stats["embed_seconds"] += time.perf_counter() - started
+        return vectors
+
+    def _existing_row_hashes(self, md5s: List[str]) -> Dict[str, str]:
+        """没有哈希记录的模型按 Milvus 中已有行的 modelText 计算哈希（如由 NestJS 端写入的行）"""
+        if not md5s:
+            return {}
+        try:
+            if not self._collection_loaded:
+                self.collection.load()
+                self._collection_loaded = True
+            rows = self.collection.query(
+                expr=_md5_filter(md5s),
+                output_fields=["modelMd5", "modelText", "embeddingSource"],
+            )
+        except Exception as e:
+            logger.warning("Existing model rows lookup failed; re-embedding %s models: %s", len(md5s), str(e)[:100])
+            return {}
+        return {
+            str(row.get("modelMd5")): content_hash(row.get("modelText") or "", self.embedding_model, self.dim)
+            for row in rows
+            if row.get("embeddingSource") == EMBEDDING_SOURCE
+        }
+
+    def _process_batch(self, executor: ThreadPoolExecutor, resources: List[Dict[str, Any]]) -> None:
+        md5s = [str(resource.get("md5")) for resource in resources]
+        known = {doc["_id"]: doc.get("content_hash") for doc in self.hashes.find({"_id": {"$in": md5s}}, {"content_hash": 1})}
+        seeded = self._existing_row_hashes([md5 for md5 in md5s if md5 not in known])
+
+        now = datetime.utcnow()
+        pending: List[Tuple[Dict[str, Any], str, str]] = []
+        hash_updates = []
+        for resource in resources:
+            if not _normalize_text(resource.get("id")):
+                self.stats["skipped"] += 1
+                continue
+            md5 = str(resource.get("md5"))
+            model_text = build_model_text(resource)
+            digest = content_hash(model_text, self.embedding_model, self.dim)
+            if known.get(md5) == digest:
+                self.stats["unchanged"] += 1
+                continue
+            if seeded.get(md5) == digest:
+                # Milvus 中已有相同文本的向量，只补写哈希记录
+                self.stats["unchanged"] += 1
+                self.stats["seeded"] += 1
+                hash_updates.append(UpdateOne(
+                    {"_id": md5},
+                    {"$set": {"content_hash": digest, "collection": self.collection_name, "indexed_at": now}},
+                    upsert=True,
+                ))
+                continue
+            pending.append((resource, model_text, digest))
+
+        self.stats["changed"] += len(pending)
+        if self.dry_run:
+            return
+        if hash_updates:
+            self.hashes.bulk_write(hash_updates, ordered=False)
+            hash_updates = []
+        if not pending:
+            return
+
+        vectors = self._embed_all(executor, [model_text for _, model_text, _ in pending])
+        rows = []
+        for (resource, model_text, digest), vector in zip(pending, vectors):
+            if vector is None or len(vector) != self.dim:
+                self.stats["failed"] += 1
+                continue
+            md5 = str(resource.get("md5"))
+            rows.append({
+                "modelId": _normalize_text(resource.get("id")),
+                "modelMd5": md5,
+                "modelName": _normalize_text(resource.get("name"))[:1024],
+                "modelDescription": _normalize_text(resource.get("description"))[:8192],
+                "modelText": model_text,
+                "embeddingSource": EMBEDDING_SOURCE,
+                "embedding": vector,
+            })
+            hash_updates.append(UpdateOne(
+                {"_id": md5},
+                {"$set": {"content_hash": digest, "collection": self.collection_name, "indexed_at": now}},
+                upsert=True,
+            ))
+        if not rows:
+            return
+
+        # 主键为 autoID，按 modelMd5 先删后插实现 upsert（与 NestJS 端一致）
+        self.collection.delete(_md5_filter([row["modelMd5"] for row in rows]))
+        self.collection.insert(rows)
+        self.hashes.bulk_write(hash_updates, ordered=False)
+        self.stats["upserted"] += len(rows)
+
+    def _prune(self, active_md5s: set) -> None:
+        """删除 modelResource 中已不存在的模型向量"""
+        stale = [doc["_id"] for doc in self.hashes.find({"collection": self.collection_name}, {"_id": 1}) if doc["_id"] not in active_md5s]
+        self.stats["pruned"] = len(stale)
+        if self.dry_run or not stale:
+            return
+        for start in range(0, len(stale), 200):
+            chunk = stale[start:start + 200]
+            self.collection.delete(_md5_filter(chunk))
+            self.hashes.delete_many({"_id": {"$in": chunk}})
+
+    def run(self, resume: bool = False, prune: bool = False, limit: Optional[int] = None) -> Dict[str, Any]:
+        started = time.perf_counter()
+        query: Dict[str, Any] = {"type": "MODEL", "md5": {"$nin": [None, ""]}}
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint:
+            query["md5"] = {"$gt": checkpoint}
+            logger.info("Resuming model indexing after md5 %s", checkpoint)
+
+        projection = {"id": 1, "md5": 1, "name": 1, "description": 1, "mdl": 1, "mdlJson": 1}
+        cursor = self.db["modelResource"].find(query, projection).sort("md5", 1).batch_size(self.batch_size)
+        if limit:
+            cursor = cursor.limit(limit)
+
+        batch: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="model-embed") as executor:
+            try:
+                for resource in cursor:
+                    self.stats["scanned"] += 1
+                    batch.append(resource)
+                    if len(batch) >= self.batch_size:
+                        self._process_batch(executor, batch)
+                        self._save_checkpoint(str(batch[-1].get("md5")))
+                        self._log_progress(started)
+                        batch = []
+                if batch:
+                    self._process_batch(executor, batch)
+                    self._save_checkpoint(str(batch[-1].get("md5")))
+            finally:
+                cursor.close()
+
+        if not limit:
+            # 完整跑完一轮后清除检查点，下次从头做增量比对
+            self._save_checkpoint(None)
+        if prune and not checkpoint and not limit:
+            active = {str(doc.get("md5")) for doc in self.db["modelResource"].find({"type": "MODEL"}, {"md5": 1}) if doc.get("md5")}
+            self._prune(active)
+
+        if not self.dry_run and (self.stats["upserted"] or self.stats["pruned"]):
+            self.collection.flush()
+            self.stats["collection_version"] = bump_collection_version(self.db, self.collection_name)
+
+        elapsed = time.perf_counter() - started
+        self.stats["elapsed_seconds"] = round(elapsed, 2)
+        self.stats["embed_seconds"] = round(self.stats["embed_seconds"], 2)
+        self.stats["models_per_second"] = round(self.stats["scanned"] / elapsed, 2) if elapsed else 0.0
+        self.stats["embedded_per_second"] = (
+            round(self.stats["upserted"] / self.stats["embed_seconds"], 2) if self.stats["embed_seconds"] else 0.0
+        )
+        return self.stats
+
+    def _log_progress(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Indexed %s models (%s changed, %s upserted, %s failed) in %.1fs, %.1f models/s",
+            self.stats["scanned"],
+            self.stats["changed"],
+            self.stats["upserted"],
+            self.stats["failed"],
+            elapsed,
+            self.stats["scanned"] / elapsed if elapsed else 0.0,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Incrementally index modelResource into the Milvus model collection")
+    parser.add_argument("--collection", default=MILVUS_COLLECTION, help="Milvus 集合名（默认取 MILVUS_COLLECTION）")
+    parser.add_argument("--batch-size", type=int, default=100, help="每批读取并写入的模型数")
+    parser.add_argument("--embed-batch-size", type=int, default=10, help="单次 embedding 请求的文本数")
+    parser.add_argument("--workers", type=int, default=4, help="并发 embedding 请求数")
+    parser.add_argument("--dim", type=int, default=DEFAULT_EMBEDDING_DIM, help="新建集合时的向量维度")
+    parser.add_argument("--resume", action="store_true", help="从上次检查点继续")
+    parser.add_argument("--prune", action="store_true", help="删除 modelResource 中已不存在的模型向量")
+    parser.add_argument("--limit", type=int, default=None, help="只处理前 N 个模型（调试用）")
+    parser.add_argument("--dry-run", action="store_true", help="只统计需要更新的模型，不调用 embedding 也不写入")
+    parser.add_argument("--export-local", action="store_true", help="索引完成后导出本地向量快照（见 local_index.py）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.collection:
+        parser.error("--collection is required when MILVUS_COLLECTION is not configured")
+
+    connections.connect(alias=_ALIAS, host=MILVUS_HOST, port=MILVUS_PORT)
+    indexer = ModelCatalogIndexer(
+        collection_name=args.collection,
+        dim=args.dim,
+        batch_size=args.batch_size,
+        embed_batch_size=args.embed_batch_size,
+        workers=args.workers,
+        dry_run=args.dry_run,
+    )
+    stats = indexer.run(resume=args.resume, prune=args.prune, limit=args.limit)
+    if args.export_local and not args.dry_run:
+        indexer.collection.load()
+        stats["local_index_version"] = export_local_index(indexer.collection, MODEL_LOCAL_INDEX_DIR)["version"]
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
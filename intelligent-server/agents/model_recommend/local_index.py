@@ -0,0 +1,258 @@
+"""
+模型集合的本地向量索引
+
+Milvus 不可用时 search_relevant_models 会直接失败，推荐流程随之中断。
+这里把模型集合的 embedding 定期导出为磁盘上的 float32 矩阵快照，进程内以 mmap 方式加载并做精确（flat）余弦检索：
+- 导出时行向量已归一化，检索即一次矩阵-向量乘法 + argpartition
+- 快照文件带版本号，manifest.json 最后原子替换，读取方不会看到写了一半的快照
+- 返回结果与 _milvus_vector_search 格式一致
+- MODEL_LOCAL_INDEX_MODE=fallback 时仅在 Milvus 无结果时使用；primary 时直接在进程内检索（单机低延迟部署）
+
+导出（在 intelligent-server 目录下）:
+  python -m agents.model_recommend.local_index
+  python -m agents.model_recommend.local_index --output-dir data/model_index --batch-size 500
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from ..similarity import cosine_top_k, normalize_vector
+
+logger = logging.getLogger(__name__)
+
+LOCAL_INDEX_OFF = "off"
+LOCAL_INDEX_FALLBACK = "fallback"
+LOCAL_INDEX_PRIMARY = "primary"
+
+MODEL_LOCAL_INDEX_MODE = os.getenv("MODEL_LOCAL_INDEX_MODE", LOCAL_INDEX_FALLBACK).strip().lower()
+MODEL_LOCAL_INDEX_DIR = os.getenv("MODEL_LOCAL_INDEX_DIR") or str(Path(__file__).resolve().parents[2] / "data" / "model_index")
+# 检查快照是否有更新的间隔
+MODEL_LOCAL_INDEX_RELOAD_SECONDS = float(os.getenv("MODEL_LOCAL_INDEX_RELOAD_SECONDS", "60"))
+# 服务进程内定期从 Milvus 导出快照的间隔，0 表示不在服务内导出
+MODEL_LOCAL_INDEX_EXPORT_INTERVAL_SECONDS = float(os.getenv("MODEL_LOCAL_INDEX_EXPORT_INTERVAL_SECONDS", "0"))
+
+MANIFEST_FILE = "manifest.json"
+META_FIELDS = ["modelId", "modelMd5", "modelName", "modelDescription", "embeddingSource"]
+_KEEP_SNAPSHOTS = 2
+
+
+def _snapshot_dir(base_dir: str, collection_name: str) -> Path:
+    return Path(base_dir) / collection_name
+
+
+def export_local_index(collection: Any, output_dir: str = MODEL_LOCAL_INDEX_DIR, batch_size: int = 500) -> Dict[str, Any]:
+    """从 Milvus 集合导出 embedding 快照
+
+    向量边读边写入文件，不在内存中保留整份矩阵。
+    Returns:
+        新快照的 manifest
+    """
+    target = _snapshot_dir(output_dir, collection.name)
+    target.mkdir(parents=True, exist_ok=True)
+    version = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+    vectors_name = f"vectors-{version}.f32"
+    meta_name = f"meta-{version}.jsonl"
+
+    started = time.perf_counter()
+    count = 0
+    dim = None
+    iterator = collection.query_iterator(
+        batch_size=max(1, batch_size),
+        expr='modelMd5 != ""',
+        output_fields=META_FIELDS + ["embedding"],
+    )
+    try:
+        with open(target / vectors_name, "wb") as vectors_file, open(target / meta_name, "w", encoding="utf-8") as meta_file:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                for row in rows:
+                    unit = normalize_vector(row.get("embedding"))
+                    if unit is None:
+                        continue
+                    if dim is None:
+                        dim = int(unit.shape[0])
+                    if unit.shape[0] != dim:
+                        continue
+                    vectors_file.write(unit.astype("<f4", copy=False).tobytes())
+                    meta_file.write(json.dumps({field: row.get(field) for field in META_FIELDS}, ensure_ascii=False) + "\n")
+                    count += 1
+    finally:
+        iterator.close()
+
+    manifest = {
+        "collection": collection.name,
+        "version": version,
+        "count": count,
+        "dim": dim or 0,
+        "vectors": vectors_name,
+        "meta": meta_name,
+        "exported_at": datetime.utcnow().isoformat(),
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+    }
+    temp_manifest = target / f"{MANIFEST_FILE}.{version}.tmp"
+    temp_manifest.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(temp_manifest, target / MANIFEST_FILE)
+    _prune_old_snapshots(target, keep_version=version)
+    logger.info("Exported %s model vectors (dim=%s) to %s", count, dim, target)
+    return manifest
+
+
+def _prune_old_snapshots(target: Path, keep_version: str) -> None:
+    """保留最近几份快照，正在被其它进程 mmap 的旧文件在 POSIX 上删除后仍可读"""
+    versions = sorted({path.stem.split("-", 1)[1] for path in target.glob("vectors-*.f32")}, reverse=True)
+    for version in versions[_KEEP_SNAPSHOTS:]:
+        if version == keep_version:
+            continue
+        for name in (f"vectors-{version}.f32", f"meta-{version}.jsonl"):
+            try:
+                (target / name).unlink()
+            except OSError:
+                pass
+
+
+class LocalModelIndex:
+    """mmap 加载的模型向量快照，按间隔检查 manifest 自动切换到新快照"""
+
+    def __init__(self, collection_name: str, base_dir: str = MODEL_LOCAL_INDEX_DIR, reload_seconds: float = MODEL_LOCAL_INDEX_RELOAD_SECONDS):
+        self.collection_name = collection_name or ""
+        self._dir = _snapshot_dir(base_dir, self.collection_name)
+        self._reload_seconds = max(0.0, reload_seconds)
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._meta: List[Dict[str, Any]] = []
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self.searches = 0
+
+    def _load(self, manifest: Dict[str, Any]) -> None:
+        count, dim = int(manifest["count"]), int(manifest["dim"])
+        if count and dim:
+            matrix = np.memmap(self._dir / manifest["vectors"], dtype="<f4", mode="r", shape=(count, dim))
+        else:
+            matrix = np.empty((0, dim), dtype=np.float32)
+        with open(self._dir / manifest["meta"], "r", encoding="utf-8") as meta_file:
+            meta = [json.loads(line) for line in meta_file if line.strip()]
+        if len(meta) != count:
+            raise ValueError(f"Local index metadata has {len(meta)} rows, expected {count}")
+        self._matrix, self._meta, self._manifest = matrix, meta, manifest
+        logger.info("Loaded local model index %s (%s vectors, dim=%s)", manifest["version"], count, dim)
+
+    def refresh(self, force: bool = False) -> bool:
+        """manifest 版本变化时重新加载；返回当前是否有可用快照"""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._checked_at < self._reload_seconds:
+                return self._matrix is not None
+            self._checked_at = now
+            try:
+                manifest = json.loads((self._dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                return self._matrix is not None
+            except Exception as e:
+                logger.warning("Failed to read local model index manifest: %s", str(e)[:100])
+                return self._matrix is not None
+            if self._manifest is None or manifest.get("version") != self._manifest.get("version"):
+                try:
+                    self._load(manifest)
+                except Exception as e:
+                    logger.warning("Failed to load local model index %s: %s", manifest.get("version"), str(e)[:100])
+            return self._matrix is not None
+
+    def available(self) -> bool:
+        return self.refresh()
+
+    def search(self, query_vector: List[float], top_k: int) -> List[Dict[str, Any]]:
+        """与 _milvus_vector_search 相同格式的稠密检索结果"""
+        if not self.refresh():
+            return []
+        matrix, meta = self._matrix, self._meta
+        if matrix is None or matrix.shape[0] == 0 or len(query_vector) != matrix.shape[1]:
+            return []
+        self.searches += 1
+        results: List[Dict[str, Any]] = []
+        for rank, (index, score) in enumerate(cosine_top_k(query_vector, matrix, top_k, normalized=True), start=1):
+            results.append({**{field: meta[index].get(field) for field in META_FIELDS}, "score": score, "rank": rank})
+        return results
+
+    def status(self) -> Dict[str, Any]:
+        manifest = self._manifest or {}
+        return {
+            "mode": MODEL_LOCAL_INDEX_MODE,
+            "available": self._matrix is not None,
+            "version": manifest.get("version"),
+            "count": manifest.get("count"),
+            "dim": manifest.get("dim"),
+            "exported_at": manifest.get("exported_at"),
+            "searches": self.searches,
+        }
+
+
+class PeriodicExporter:
+    """服务进程内的定期导出线程"""
+
+    def __init__(self, collection_getter: Callable[[], Any], interval_seconds: float, on_export: Optional[Callable[[], None]] = None):
+        self._collection_getter = collection_getter
+        self._interval = max(60.0, interval_seconds)
+        self._on_export = on_export
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                export_local_index(self._collection_getter())
+                if self._on_export is not None:
+                    self._on_export()
+            except Exception as e:
+                logger.warning("Periodic local model index export failed: %s", str(e)[:100])
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="model-index-export", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def main() -> None:
+    from pymilvus import Collection, connections
+
+    from .tools import MILVUS_COLLECTION, MILVUS_HOST, MILVUS_PORT
+
+    parser = argparse.ArgumentParser(description="Export the Milvus model collection to a local float32 index snapshot")
+    parser.add_argument("--collection", default=MILVUS_COLLECTION, help="Milvus 集合名（默认取 MILVUS_COLLECTION）")
+    parser.add_argument("--output-dir", default=MODEL_LOCAL_INDEX_DIR, help="快照目录")
+    parser.add_argument("--batch-size", type=int, default=500, help="query_iterator 每批行数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.collection:
+        parser.error("--collection is required when MILVUS_COLLECTION is not configured")
+
+    connections.connect(alias="model_index_export", host=MILVUS_HOST, port=MILVUS_PORT)
+    collection = Collection(args.collection, using="model_index_export")
+    collection.load()
+    manifest = export_local_index(collection, args.output_dir, args.batch_size)
+    for key, value in manifest.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
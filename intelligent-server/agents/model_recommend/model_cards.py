@@ -0,0 +1,221 @@
+"""
+模型卡片（model card）投影缓存
+
+modelResource 文档包含完整的 data 树，search_most_model 和候选卡片展示每次都要
+读取整棵树并重新遍历。这里把每个模型预先投影成紧凑卡片（基础信息 + inputs/outputs + workflow）：
+- 进程内 LRU：按 md5 缓存，记录生成时的 updateTime
+- 侧集合 modelCards：跨进程共享的物化投影
+- 每次读取先批量查询 modelResource 的 updateTime（只投影两个字段），不一致即视为失效并重建
+"""
+
+import copy
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MODEL_CARD_CACHE_SIZE = int(os.getenv("MODEL_CARD_CACHE_SIZE", "512"))
+MODEL_CARD_COLLECTION = os.getenv("MODEL_CARD_COLLECTION", "modelCards")
+# 卡片结构变更时递增，旧版本物化结果自动失效
+MODEL_CARD_VERSION = 1
+CARD_SUMMARY_LIMIT = 8
+
+
+def _extract_io_names(data: Dict[str, Any], direction: str) -> List[str]:
+    names: List[str] = []
+    for state in data.get(direction, []) or []:
+        for event in state.get("events", []) or []:
+            event_data = event.get("eventData") or {}
+            values = event_data.get("nodeList") or []
+            if values:
+                for node in values:
+                    name = str(node.get("name") or node.get("description") or "").strip()
+                    if name and name not in names:
+                        names.append(name)
+            else:
+                name = str(event_data.get("eventDataName") or event.get("eventName") or "").strip()
+                if name and name not in names:
+                    names.append(name)
+    return names
+
+
+def _build_workflow(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    workflow_steps = []
+    for s in data.get("input") or []:
+        events = []
+        for event in s.get("events", []):
+            event_data = event.get("eventData", {})
+            inputs = []
+
+            if event_data.get("eventDataType") == "internal" and event_data.get("nodeList"):
+                for node in event_data.get("nodeList", []):
+                    inputs.append({
+                        "name": node.get("name", ""),
+                        "type": node.get("dataType", ""),
+                        "description": node.get("description", "")
+                    })
+
+            if event_data.get("eventDataType") == "external":
+                inputs.append({
+                    "name": event_data.get("eventDataName") or event.get("eventName", ""),
+                    "type": "FILE",
+                    "description": event_data.get("exentDataDesc", ""),
+                    "nodeList": event_data.get("nodeList", [])
+                })
+
+            events.append({
+                "eventName": event.get("eventName", ""),
+                "eventDescription": event.get("eventDescription", ""),
+                "inputs": inputs
+            })
+
+        workflow_steps.append({
+            "stateName": s.get("stateName", ""),
+            "stateDescription": s.get("stateDescription", ""),
+            "events": events
+        })
+    return workflow_steps
+
+
+def build_model_card(model: Dict[str, Any]) -> Dict[str, Any]:
+    """由 modelResource 文档生成紧凑模型卡片"""
+    data = model.get("data") or {}
+    return {
+        "md5": str(model.get("md5") or ""),
+        "name": str(model.get("name") or ""),
+        "description": str(model.get("description") or ""),
+        "inputs": _extract_io_names(data, "input")[:CARD_SUMMARY_LIMIT],
+        "outputs": _extract_io_names(data, "output")[:CARD_SUMMARY_LIMIT],
+        "workflow": _build_workflow(data),
+        "updateTime": model.get("updateTime"),
+        "card_version": MODEL_CARD_VERSION,
+    }
+
+
+class ModelCardCache:
+    """按 md5 批量获取模型卡片：LRU -> modelCards 侧集合 -> modelResource 重建"""
+
+    def __init__(self, db_getter: Callable[[], Any], max_size: int = MODEL_CARD_CACHE_SIZE, side_collection: str = MODEL_CARD_COLLECTION):
+        self._db_getter = db_getter
+        self._max_size = max(1, max_size)
+        self._side_collection = side_collection
+        self._cards: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._side_index_ready = False
+        self.hits = 0
+        self.misses = 0
+
+    def _lru_get(self, md5: str, update_time: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            card = self._cards.get(md5)
+            if card is None or card.get("updateTime") != update_time:
+                return None
+            self._cards.move_to_end(md5)
+            return card
+
+    def _lru_put(self, card: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cards[card["md5"]] = card
+            self._cards.move_to_end(card["md5"])
+            while len(self._cards) > self._max_size:
+                self._cards.popitem(last=False)
+
+    def invalidate(self, md5s: Optional[Iterable[str]] = None) -> None:
+        """清除进程内缓存；md5s 为空时清空全部"""
+        with self._lock:
+            if md5s is None:
+                self._cards.clear()
+                return
+            for md5 in md5s:
+                self._cards.pop(str(md5), None)
+
+    def get_many(self, md5s: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量获取卡片，返回 {md5: card}；不存在的模型不出现在结果中"""
+        wanted = list(dict.fromkeys(str(md5) for md5 in md5s if md5))
+        if not wanted:
+            return {}
+        db = self._db_getter()
+        stamps = {
+            str(doc.get("md5")): doc.get("updateTime")
+            for doc in db["modelResource"].find({"md5": {"$in": wanted}}, {"md5": 1, "updateTime": 1})
+        }
+
+        cards: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for md5 in wanted:
+            if md5 not in stamps:
+                continue
+            card = self._lru_get(md5, stamps[md5])
+            if card is not None:
+                cards[md5] = card
+            else:
+                missing.append(md5)
+        self.hits += len(cards)
+
+        if missing and self._side_collection:
+            try:
+                for card in db[self._side_collection].find({"md5": {"$in": missing}}, {"_id": 0}):
+                    md5 = str(card.get("md5"))
+                    if card.get("card_version") == MODEL_CARD_VERSION and card.get("updateTime") == stamps.get(md5):
+                        cards[md5] = card
+                        self._lru_put(card)
+                missing = [md5 for md5 in missing if md5 not in cards]
+            except Exception as e:
+                logger.warning("Model card side collection read failed: %s", str(e)[:100])
+
+        if missing:
+            self.misses += len(missing)
+            rebuilt = [
+                build_model_card(model)
+                for model in db["modelResource"].find(
+                    {"md5": {"$in": missing}},
+                    {"name": 1, "md5": 1, "description": 1, "data": 1, "updateTime": 1},
+                )
+            ]
+            for card in rebuilt:
+                cards[card["md5"]] = card
+                self._lru_put(card)
+            self._materialize(db, rebuilt)
+
+        return {md5: cards[md5] for md5 in wanted if md5 in cards}
+
+    def get(self, md5: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([md5]).get(str(md5))
+
+    def _materialize(self, db: Any, cards: List[Dict[str, Any]]) -> None:
+        if not cards or not self._side_collection:
+            return
+        now = datetime.utcnow()
+        try:
+            if not self._side_index_ready:
+                db[self._side_collection].create_index("md5", unique=True)
+                self._side_index_ready = True
+            db[self._side_collection].bulk_write(
+                [UpdateOne({"md5": card["md5"]}, {"$set": {**card, "built_at": now}}, upsert=True) for card in cards],
+                ordered=False,
+            )
+        except Exception as e:
+            logger.warning("Model card materialization failed: %s", str(e)[:100])
+
+
+_model_card_cache: Optional[ModelCardCache] = None
+_model_card_cache_lock = threading.Lock()
+
+
+def get_model_card_cache(db_getter: Callable[[], Any]) -> ModelCardCache:
+    global _model_card_cache
+    with _model_card_cache_lock:
+        if _model_card_cache is None:
+            _model_card_cache = ModelCardCache(db_getter)
+        return _model_card_cache
+
+
+def copy_card_field(card: Dict[str, Any], field: str) -> Any:
+    """只复制卡片中的单个字段，避免为取 workflow 深拷贝整张卡片"""
+    return copy.deepcopy(card.get(field))
@@ -0,0 +1,213 @@
+"""
+模型候选重排（可选）
+
+search_relevant_models 返回 Milvus top_k 候选后，recommend_model_node 中的 LLM 需要阅读全部候选。
+这里在两者之间提供一个本地重排阶段，只把重排后的前 MODEL_RERANK_KEEP 个候选交给 LLM：
+- bm25: 以模型卡片（名称、描述、输入输出）为文档，对候选集合做 BM25 重新打分，与检索得分加权
+- cross_encoder: 使用本地 CPU cross-encoder（sentence-transformers，可选依赖）按批打分
+两种模式都受延迟预算约束：超出预算时未打分的候选保持原检索顺序排在后面。
+cross-encoder 在应用启动时由 warmup_reranker 预加载；若仍在请求中惰性加载，加载耗时不计入预算。
+默认关闭（MODEL_RERANK_MODE=off）。
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from sentence_transformers import CrossEncoder
+except Exception:
+    CrossEncoder = None
+
+logger = logging.getLogger(__name__)
+
+RERANK_OFF = "off"
+RERANK_BM25 = "bm25"
+RERANK_CROSS_ENCODER = "cross_encoder"
+
+MODEL_RERANK_MODE = os.getenv("MODEL_RERANK_MODE", RERANK_OFF).strip().lower()
+MODEL_RERANK_KEEP = int(os.getenv("MODEL_RERANK_KEEP", "5"))
+MODEL_RERANK_BUDGET_MS = float(os.getenv("MODEL_RERANK_BUDGET_MS", "300"))
+MODEL_RERANK_BATCH_SIZE = int(os.getenv("MODEL_RERANK_BATCH_SIZE", "16"))
+# 重排得分与检索得分的混合比例（1.0 表示只看重排得分）
+MODEL_RERANK_WEIGHT = float(os.getenv("MODEL_RERANK_WEIGHT", "0.6"))
+MODEL_RERANK_CROSS_ENCODER = os.getenv("MODEL_RERANK_CROSS_ENCODER", "BAAI/bge-reranker-base")
+
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def _tokenize(text: str) -> List[str]:
+    """英文/数字词 + 中文单字与双字，与记忆检索的分词方式一致"""
+    normalized = re.sub(r"\s+", " ", str(text or "").strip().lower())
+    tokens = re.findall(r"[a-z0-9_./-]+", normalized)
+    chinese_chars = re.findall(r"[\u4e00-\u9fff]", normalized)
+    tokens.extend(chinese_chars)
+    tokens.extend("".join(chinese_chars[i:i + 2]) for i in range(max(len(chinese_chars) - 1, 0)))
+    return [token for token in tokens if token]
+
+
+def card_text(candidate: Dict[str, Any], card: Optional[Dict[str, Any]]) -> str:
+    """重排使用的候选文本：优先模型卡片，缺失时退回检索结果字段"""
+    if card:
+        return " ".join([
+            card.get("name") or "",
+            card.get("description") or "",
+            " ".join(card.get("inputs") or []),
+            " ".join(card.get("outputs") or []),
+        ])
+    return " ".join([str(candidate.get("modelName") or ""), str(candidate.get("modelDescription") or "")])
+
+
+def _min_max(values: List[float]) -> List[float]:
+    if not values:
+        return []
+    low, high = min(values), max(values)
+    if high - low < 1e-12:
+        return [1.0 for _ in values]
+    return [(value - low) / (high - low) for value in values]
+
+
+def _bm25_scores(query: str, documents: List[str], deadline: float) -> List[Optional[float]]:
+    query_tokens = set(_tokenize(query))
+    doc_tokens = [_tokenize(document) for document in documents]
+    n_docs = len(doc_tokens)
+    avg_len = sum(len(tokens) for tokens in doc_tokens) / n_docs if n_docs else 0.0
+    doc_freq: Dict[str, int] = {}
+    for tokens in doc_tokens:
+        for token in set(tokens) & query_tokens:
+            doc_freq[token] = doc_freq.get(token, 0) + 1
+
+    scores: List[Optional[float]] = []
+    for tokens in doc_tokens:
+        if time.monotonic() > deadline:
+            scores.append(None)
+            continue
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            if token in query_tokens:
+                counts[token] = counts.get(token, 0) + 1
+        length_norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * (len(tokens) / avg_len if avg_len else 0.0))
+        score = 0.0
+        for token, tf in counts.items():
+            idf = math.log(1 + (n_docs - doc_freq[token] + 0.5) / (doc_freq[token] + 0.5))
+            score += idf * tf * (_BM25_K1 + 1) / (tf + length_norm)
+        scores.append(score)
+    return scores
+
+
+def _get_cross_encoder():
+    global _cross_encoder
+    if CrossEncoder is None:
+        return None
+    with _cross_encoder_lock:
+        if _cross_encoder is None:
+            _cross_encoder = CrossEncoder(MODEL_RERANK_CROSS_ENCODER, device="cpu")
+        return _cross_encoder
+
+
+def warmup_reranker(mode: str = MODEL_RERANK_MODE) -> bool:
+    """启动时预加载 cross-encoder，避免首个请求因加载模型超出预算而退回检索顺序"""
+    if mode != RERANK_CROSS_ENCODER:
+        return False
+    try:
+        return _get_cross_encoder() is not None
+    except Exception as e:
+        logger.warning("Cross-encoder warmup failed: %s", str(e)[:100])
+        return False
+
+
+def _cross_encoder_scores(query: str, documents: List[str], deadline: float, batch_size: int) -> List[Optional[float]]:
+    load_started = time.monotonic()
+    model = _get_cross_encoder()
+    # 模型加载是一次性开销，不占用本次请求的打分预算
+    deadline += time.monotonic() - load_started
+    if model is None:
+        logger.warning("sentence-transformers is not installed; falling back to BM25 rerank")
+        return _bm25_scores(query, documents, deadline)
+    scores: List[Optional[float]] = [None] * len(documents)
+    for start in range(0, len(documents), max(1, batch_size)):
+        if time.monotonic() > deadline:
+            break
+        batch = documents[start:start + batch_size]
+        predictions = model.predict([(query, document) for document in batch])
+        for offset, value in enumerate(predictions):
+            scores[start + offset] = float(value)
+    return scores
+
+
+def rerank_candidates(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    card_loader: Optional[Callable[[List[str]], Dict[str, Dict[str, Any]]]] = None,
+    mode: str = MODEL_RERANK_MODE,
+    keep: int = MODEL_RERANK_KEEP,
+    budget_ms: float = MODEL_RERANK_BUDGET_MS,
+    batch_size: int = MODEL_RERANK_BATCH_SIZE,
+    weight: float = MODEL_RERANK_WEIGHT,
+) -> Dict[str, Any]:
+    """对检索候选重排并截断
+
+    Returns:
+        {"models": 重排后的候选, "rerank": 重排元信息}；mode=off 或候选为空时原样返回
+    """
+    if mode not in (RERANK_BM25, RERANK_CROSS_ENCODER) or not candidates:
+        return {"models": candidates, "rerank": None}
+
+    started = time.monotonic()
+    deadline = started + max(0.0, budget_ms) / 1000.0
+    cards: Dict[str, Dict[str, Any]] = {}
+    if card_loader is not None:
+        try:
+            cards = card_loader([str(item.get("modelMd5")) for item in candidates if item.get("modelMd5")])
+        except Exception as e:
+            logger.warning("Model card lookup for rerank failed: %s", str(e)[:100])
+    documents = [card_text(item, cards.get(str(item.get("modelMd5")))) for item in candidates]
+
+    try:
+        if mode == RERANK_CROSS_ENCODER:
+            rerank_scores = _cross_encoder_scores(query, documents, deadline, batch_size)
+        else:
+            rerank_scores = _bm25_scores(query, documents, deadline)
+    except Exception as e:
+        logger.warning("Model rerank failed, keeping retrieval order: %s", str(e)[:100])
+        return {"models": candidates[:keep] if keep > 0 else candidates, "rerank": {"mode": mode, "error": str(e)[:200]}}
+
+    retrieval_norm = _min_max([float(item.get("score") or 0.0) for item in candidates])
+    scored_indices = [index for index, score in enumerate(rerank_scores) if score is not None]
+    rerank_norm = dict(zip(scored_indices, _min_max([rerank_scores[index] for index in scored_indices])))
+
+    def sort_key(index: int):
+        if index in rerank_norm:
+            return (0, -(weight * rerank_norm[index] + (1 - weight) * retrieval_norm[index]), index)
+        # 超出预算未打分的候选排在已打分候选之后，保持原检索顺序
+        return (1, 0.0, index)
+
+    order = sorted(range(len(candidates)), key=sort_key)
+    limit = keep if keep > 0 else len(order)
+    models = []
+    for rank, index in enumerate(order[:limit], start=1):
+        item = dict(candidates[index])
+        item["retrievalRank"] = item.get("rank")
+        item["rank"] = rank
+        if index in rerank_norm:
+            item["rerankScore"] = round(rerank_scores[index], 6)
+        models.append(item)
+
+    return {
+        "models": models,
+        "rerank": {
+            "mode": mode,
+            "candidates": len(candidates),
+            "kept": len(models),
+            "scored": len(scored_indices),
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 2),
+        },
+    }
@@ -0,0 +1,174 @@
+"""
+跨会话的模型检索结果缓存
+
+search_relevant_models 的 Milvus 路径每次都要做一次 embedding 和一次混合检索。
+reusable_tool_observation 只能在同一任务哈希内复用结果，不同用户的相同查询无法共享。
+这里提供进程内 TTL 缓存：
+- key = (规范化查询, top_k, 集合版本, 排序权重)
+- 集合版本 = modelIndexState 中的重建版本号 + Milvus 实体数，按间隔刷新，
+  模型集合重建索引后调用 bump_collection_version 即可让旧结果全部失效
+"""
+
+import copy
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+MODEL_SEARCH_CACHE_ENABLED = os.getenv("MODEL_SEARCH_CACHE_ENABLED", "true").strip().lower() not in {"0", "false", "no", "off"}
+MODEL_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("MODEL_SEARCH_CACHE_TTL_SECONDS", "600"))
+MODEL_SEARCH_CACHE_SIZE = int(os.getenv("MODEL_SEARCH_CACHE_SIZE", "1024"))
+# 集合版本的检查间隔，避免每次查询都访问 Mongo / Milvus
+MODEL_SEARCH_CACHE_VERSION_CHECK_SECONDS = float(os.getenv("MODEL_SEARCH_CACHE_VERSION_CHECK_SECONDS", "30"))
+MODEL_INDEX_STATE_COLLECTION = "modelIndexState"
+
+
+def normalize_query(query: str) -> str:
+    """大小写、首尾空白和连续空白不影响缓存命中"""
+    return re.sub(r"\s+", " ", str(query or "").strip().lower())
+
+
+class TTLCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._max_size = max(1, max_size)
+        self._ttl = max(0.0, ttl_seconds)
+        self._items: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + self._ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class RetrievalCache:
+    """按集合版本隔离的检索结果缓存"""
+
+    def __init__(
+        self,
+        collection_name: str,
+        db_getter: Callable[[], Any],
+        entity_counter: Optional[Callable[[], Optional[int]]] = None,
+        max_size: int = MODEL_SEARCH_CACHE_SIZE,
+        ttl_seconds: float = MODEL_SEARCH_CACHE_TTL_SECONDS,
+        version_check_seconds: float = MODEL_SEARCH_CACHE_VERSION_CHECK_SECONDS,
+    ):
+        self._collection_name = collection_name or ""
+        self._db_getter = db_getter
+        self._entity_counter = entity_counter
+        self._cache = TTLCache(max_size, ttl_seconds)
+        self._version_check_seconds = max(0.0, version_check_seconds)
+        self._version: Optional[str] = None
+        self._marker = 0
+        self._entities: Optional[int] = None
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def collection_version(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < self._version_check_seconds:
+                return self._version
+            # 任一查询失败时沿用上次成功读取的值，避免瞬时故障被当作版本变化而清空缓存
+            marker, entities = self._marker, self._entities
+
+        try:
+            state = self._db_getter()[MODEL_INDEX_STATE_COLLECTION].find_one({"_id": self._collection_name}, {"version": 1})
+            marker = int((state or {}).get("version") or 0)
+        except Exception as e:
+            logger.warning("Model index state lookup failed: %s", str(e)[:100])
+        if self._entity_counter is not None:
+            try:
+                counted = self._entity_counter()
+            except Exception:
+                counted = None
+            if counted is not None:
+                entities = counted
+        version = f"{marker}:{entities if entities is not None else '-'}"
+
+        with self._lock:
+            if self._version is not None and self._version != version:
+                logger.info("Model collection version changed %s -> %s; clearing retrieval cache", self._version, version)
+                self._cache.clear()
+            self._version = version
+            self._marker, self._entities = marker, entities
+            self._version_checked_at = now
+        return version
+
+    def make_key(self, query: str, top_k: int, weights: Tuple[float, ...]) -> str:
+        raw = "\x1f".join([
+            normalize_query(query),
+            str(int(top_k)),
+            self.collection_version(),
+            ",".join(f"{weight:.4f}" for weight in weights),
+        ])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        cached = self._cache.get(key)
+        # 缓存结果在请求间共享，返回副本避免调用方修改
+        return copy.deepcopy(cached) if cached is not None else None
+
+    def set(self, key: str, value: List[Dict[str, Any]]) -> None:
+        if value:
+            self._cache.set(key, copy.deepcopy(value))
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version = None
+            self._version_checked_at = 0.0
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._cache),
+            "hits": self._cache.hits,
+            "misses": self._cache.misses,
+            "collection_version": self._version,
+        }
+
+
+def bump_collection_version(db: Any, collection_name: str) -> int:
+    """模型集合重建索引后调用：递增版本号，使所有进程的检索缓存在下次版本检查时失效"""
+    state = db[MODEL_INDEX_STATE_COLLECTION].find_one_and_update(
+        {"_id": collection_name},
+        {"$inc": {"version": 1}, "$set": {"reindexed_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return int((state or {}).get("version") or 0)
@@ -0,0 +1,201 @@
+"""
+后台滚动摘要
+
+memory_maintenance_node 原先在每轮对话末尾同步调用 LLM 生成摘要，final 事件要等摘要完成才能发出。
+这里把摘要移出关键路径：
+- 节点只登记任务（同一 thread 同时最多一个摘要任务在执行）
+- 摘要在线程池中生成，完成后通过 agent.update_state 写回该 thread 的状态
+- 写回前比对被摘要消息前缀的指纹，前缀已变化（被其他摘要替换或历史被改写）时丢弃本次结果
+- 该 thread 有进行中的对话轮次时暂存结果，轮次结束后再写回，避免与正在运行的图并发写检查点；
+  写回期间 begin_turn 会等待写回完成，检查与写回之间不会插入新的轮次
+下一轮对话使用最近一次已完成的摘要。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_SUMMARY_ASYNC = os.getenv("MESSAGE_SUMMARY_ASYNC", "true").strip().lower() not in {"0", "false", "no", "off"}
+MESSAGE_SUMMARY_WORKERS = int(os.getenv("MESSAGE_SUMMARY_WORKERS", "2"))
+
+
+def messages_fingerprint(messages: List[Any]) -> str:
+    """按消息类型、文本内容和工具调用 id 计算指纹"""
+    rows = []
+    for message in messages:
+        content = getattr(message, "content", "")
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+        rows.append([
+            getattr(message, "type", type(message).__name__),
+            content,
+            getattr(message, "tool_call_id", None),
+            [call.get("id") for call in (getattr(message, "tool_calls", None) or []) if isinstance(call, dict)],
+        ])
+    return hashlib.sha1(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class BackgroundSummarizer:
+    """按 thread 串行化的后台摘要执行器"""
+
+    def __init__(self, workers: int = MESSAGE_SUMMARY_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="message-summary")
+        self._lock = threading.Lock()
+        self._applied_cond = threading.Condition(self._lock)
+        self._closed = False
+        self._inflight: set = set()
+        # 正在写回摘要的 thread，begin_turn 需等待其写回完成
+        self._applying: set = set()
+        self._active_turns: Dict[str, int] = {}
+        self._deferred: Dict[str, Callable[[], None]] = {}
+        self._agent = None
+        self.applied = 0
+        self.discarded = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def bind(self, agent: Any) -> None:
+        """绑定编译后的图，用于读取和写回 thread 状态"""
+        self._agent = agent
+
+    # --- 对话轮次跟踪 ---
+
+    def begin_turn(self, thread_id: str) -> None:
+        with self._applied_cond:
+            # 最多等待一次 update_state，确保新轮次开始时没有并发的检查点写回
+            while thread_id in self._applying:
+                self._applied_cond.wait()
+            self._active_turns[thread_id] = self._active_turns.get(thread_id, 0) + 1
+
+    def end_turn(self, thread_id: str) -> None:
+        with self._lock:
+            remaining = self._active_turns.get(thread_id, 0) - 1
+            if remaining > 0:
+                self._active_turns[thread_id] = remaining
+                return
+            self._active_turns.pop(thread_id, None)
+            apply = self._deferred.pop(thread_id, None)
+        if apply is not None:
+            self._submit_or_run(apply)
+
+    def _submit_or_run(self, task: Callable[[], None]) -> None:
+        """执行器已关闭（进程退出中）时在当前线程直接写回"""
+        if not self._closed:
+            try:
+                self._executor.submit(task)
+                return
+            except RuntimeError:
+                pass
+        task()
+
+    # --- 摘要任务 ---
+
+    def schedule(
+        self,
+        thread_id: Optional[str],
+        prefix: List[Any],
+        summarize: Callable[[], str],
+        build_update: Callable[[str, List[Any]], Dict[str, Any]],
+    ) -> bool:
+        """登记一次摘要任务
+
+        Args:
+            prefix: 需要被摘要替换的旧消息（当前消息列表的前缀）
+            summarize: 生成摘要文本（在后台线程中执行）
+            build_update: (summary_text, 当前前缀之后的消息) -> update_state 的更新内容
+        Returns:
+            是否已登记；同一 thread 已有任务在执行时返回 False
+        """
+        if not thread_id or self._agent is None or not prefix:
+            return False
+        with self._lock:
+            if self._closed or thread_id in self._inflight:
+                self.skipped += 1
+                return False
+            self._inflight.add(thread_id)
+        fingerprint = messages_fingerprint(prefix)
+        try:
+            self._executor.submit(self._run, thread_id, len(prefix), fingerprint, summarize, build_update)
+        except RuntimeError:
+            with self._lock:
+                self._inflight.discard(thread_id)
+            return False
+        return True
+
+    def _run(self, thread_id: str, prefix_len: int, fingerprint: str, summarize, build_update) -> None:
+        try:
+            summary_text = summarize()
+        except Exception:
+            logger.exception("Background summary failed for thread %s", thread_id)
+            summary_text = ""
+        if not summary_text:
+            with self._lock:
+                self.failed += 1
+                self._inflight.discard(thread_id)
+            return
+
+        def apply() -> None:
+            # 检查轮次与标记写回在同一把锁内完成，之后的 begin_turn 会等待本次写回结束
+            with self._lock:
+                if self._active_turns.get(thread_id):
+                    self._deferred[thread_id] = apply
+                    return
+                self._applying.add(thread_id)
+            try:
+                self._apply(thread_id, prefix_len, fingerprint, summary_text, build_update)
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                logger.exception("Failed to write background summary for thread %s", thread_id)
+            finally:
+                with self._applied_cond:
+                    self._applying.discard(thread_id)
+                    self._inflight.discard(thread_id)
+                    self._applied_cond.notify_all()
+
+        apply()
+
+    def _apply(self, thread_id: str, prefix_len: int, fingerprint: str, summary_text: str, build_update) -> None:
+        config = {"configurable": {"thread_id": thread_id}}
+        snapshot = self._agent.get_state(config)
+        messages = list((snapshot.values or {}).get("messages") or [])
+        if len(messages) < prefix_len or messages_fingerprint(messages[:prefix_len]) != fingerprint:
+            self.discarded += 1
+            logger.info("Discarding stale summary for thread %s (message prefix changed)", thread_id)
+            return
+        self._agent.update_state(config, build_update(summary_text, messages[prefix_len:]), as_node="memory_maintenance_node")
+        self.applied += 1
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=wait)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "inflight": len(self._inflight),
+                "deferred": len(self._deferred),
+                "applied": self.applied,
+                "discarded": self.discarded,
+                "failed": self.failed,
+                "skipped": self.skipped,
+            }
+
+
+_summarizer: Optional[BackgroundSummarizer] = None
+_summarizer_lock = threading.Lock()
+
+
+def get_summarizer() -> BackgroundSummarizer:
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            _summarizer = BackgroundSummarizer()
+        return _summarizer
@@ -0,0 +1,193 @@
+"""
+工具结果的大对象外置
+
+ModelState.tool_results 会随每个检查点完整写入 MongoDBSaver，
+search_relevant_models / search_most_model 的结果（候选列表、模型工作流）往往有几十 KB，
+在长会话里被重复写入每一份检查点。这里把超过 TOOL_RESULT_INLINE_MAX_BYTES 的结果
+按内容哈希写入 toolResultBlobs 集合，状态中只保留引用：
+- externalize_tool_results: 写入检查点前替换为 {"_blob_ref", "status", "bytes"}
+- resolve_tool_results: 读取时还原；blob 已过期时丢弃该条结果，由节点重新调用工具
+- TTL 按 last_used_at 计算，写入和读取时刷新，仍被检查点引用的 blob 不会过期
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TOOL_RESULT_BLOB_COLLECTION = "toolResultBlobs"
+# 序列化后超过该字节数的工具结果写入外部集合，0 表示不外置
+TOOL_RESULT_INLINE_MAX_BYTES = int(os.getenv("TOOL_RESULT_INLINE_MAX_BYTES", "8192"))
+TOOL_RESULT_BLOB_TTL_DAYS = int(os.getenv("TOOL_RESULT_BLOB_TTL_DAYS", "30"))
+_CACHE_SIZE = 256
+# 同一 blob 的 last_used_at 最多每隔这么多秒刷新一次，避免每次命中都写 Mongo
+_TOUCH_INTERVAL_SECONDS = 3600
+
+BLOB_REF_KEY = "_blob_ref"
+
+
+class ToolResultStore:
+    """按内容哈希去重的工具结果存储，带进程内 LRU"""
+
+    def __init__(self, db_getter: Callable[[], Any], inline_max_bytes: int = TOOL_RESULT_INLINE_MAX_BYTES):
+        self._db_getter = db_getter
+        self.inline_max_bytes = max(0, inline_max_bytes)
+        # blob_id -> (value, 上次刷新 last_used_at 的 monotonic 时间)
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._indexes_ready = False
+        self.externalized = 0
+        self.externalized_bytes = 0
+        self.missing = 0
+
+    def _collection(self):
+        collection = self._db_getter()[TOOL_RESULT_BLOB_COLLECTION]
+        if not self._indexes_ready:
+            if TOOL_RESULT_BLOB_TTL_DAYS > 0:
+                try:
+                    # 旧版本按 created_at 过期，迁移到 last_used_at 并为旧文档补上该字段
+                    if "created_at_1" in (collection.index_information() or {}):
+                        collection.drop_index("created_at_1")
+                    collection.update_many(
+                        {"last_used_at": {"$exists": False}},
+                        [{"$set": {"last_used_at": {"$ifNull": ["$created_at", "$$NOW"]}}}],
+                    )
+                except Exception as e:
+                    logger.warning("Failed to migrate tool result blob TTL index: %s", str(e)[:100])
+                collection.create_index("last_used_at", expireAfterSeconds=TOOL_RESULT_BLOB_TTL_DAYS * 86400)
+            self._indexes_ready = True
+        return collection
+
+    def _remember(self, blob_id: str, value: Any) -> None:
+        with self._lock:
+            self._cache[blob_id] = (value, time.monotonic())
+            self._cache.move_to_end(blob_id)
+            while len(self._cache) > _CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _cached(self, blob_id: str):
+        """LRU 命中时返回 (True, value, 是否需要刷新 last_used_at)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(blob_id)
+            if entry is None:
+                return False, None, False
+            self._cache.move_to_end(blob_id)
+            value, touched_at = entry
+            stale = now - touched_at >= _TOUCH_INTERVAL_SECONDS
+            if stale:
+                self._cache[blob_id] = (value, now)
+        return True, value, stale
+
+    def _touch(self, blob_id: str) -> None:
+        try:
+            self._collection().update_one({"_id": blob_id}, {"$set": {"last_used_at": datetime.utcnow()}})
+        except Exception as e:
+            logger.warning("Failed to refresh tool result blob %s: %s", blob_id[:12], str(e)[:100])
+
+    def put(self, value: Any) -> Dict[str, Any]:
+        """写入一个工具结果并返回引用（相同内容只写一次）"""
+        payload = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+        blob_id = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        size = len(payload.encode("utf-8"))
+        known, _, stale = self._cached(blob_id)
+        if not known:
+            now = datetime.utcnow()
+            self._collection().update_one(
+                {"_id": blob_id},
+                {
+                    "$set": {"last_used_at": now},
+                    "$setOnInsert": {"value": json.loads(payload), "bytes": size, "created_at": now},
+                },
+                upsert=True,
+            )
+            self._remember(blob_id, value)
+            self.externalized += 1
+            self.externalized_bytes += size
+        elif stale:
+            self._touch(blob_id)
+        return {
+            BLOB_REF_KEY: blob_id,
+            "status": value.get("status") if isinstance(value, dict) else None,
+            "bytes": size,
+        }
+
+    def get(self, blob_id: str) -> Optional[Any]:
+        known, value, stale = self._cached(blob_id)
+        if known:
+            if stale:
+                self._touch(blob_id)
+            return value
+        doc = self._collection().find_one_and_update(
+            {"_id": blob_id},
+            {"$set": {"last_used_at": datetime.utcnow()}},
+            projection={"value": 1},
+        )
+        if doc is None:
+            self.missing += 1
+            return None
+        self._remember(blob_id, doc["value"])
+        return doc["value"]
+
+    def externalize(self, tool_results: Dict[str, Any]) -> Dict[str, Any]:
+        """把大结果替换为引用；以下划线开头的范围标识保持内联"""
+        if self.inline_max_bytes <= 0:
+            return tool_results
+        compacted: Dict[str, Any] = {}
+        for name, value in (tool_results or {}).items():
+            if str(name).startswith("_") or is_blob_ref(value):
+                compacted[name] = value
+                continue
+            try:
+                size = len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+                compacted[name] = self.put(value) if size > self.inline_max_bytes else value
+            except Exception as e:
+                logger.warning("Failed to externalize tool result %s: %s", name, str(e)[:100])
+                compacted[name] = value
+        return compacted
+
+    def resolve(self, tool_results: Dict[str, Any]) -> Dict[str, Any]:
+        """还原引用；无法还原的条目被丢弃"""
+        resolved: Dict[str, Any] = {}
+        for name, value in (tool_results or {}).items():
+            if not is_blob_ref(value):
+                resolved[name] = value
+                continue
+            try:
+                blob = self.get(value[BLOB_REF_KEY])
+            except Exception as e:
+                logger.warning("Failed to load tool result blob for %s: %s", name, str(e)[:100])
+                blob = None
+            if blob is not None:
+                resolved[name] = blob
+        return resolved
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "inline_max_bytes": self.inline_max_bytes,
+            "externalized": self.externalized,
+            "externalized_bytes": self.externalized_bytes,
+            "missing": self.missing,
+            "cached": len(self._cache),
+        }
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and BLOB_REF_KEY in value
+
+
+_store: Optional[ToolResultStore] = None
+
+
+def get_tool_result_store(db_getter: Callable[[], Any]) -> ToolResultStore:
+    global _store
+    if _store is None:
+        _store = ToolResultStore(db_getter)
+    return _store
@@ -7,12 +7,18 @@ from langchain.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain.messages import HumanMessage
 from pymongo import MongoClient
-from pymilvus import connections, Collection, AnnSearchRequest, WeightedRanker
-import math
+from concurrent.futures import ThreadPoolExecutor
+from pymilvus import Collection
 from dotenv import load_dotenv
 from langgraph.prebuilt import InjectedState
 from openai import OpenAI
 from rapidfuzz import fuzz
+from ..milvus_client import ManagedMilvusClient
+from .model_cards import copy_card_field, get_model_card_cache
+from .retrieval_cache import MODEL_SEARCH_CACHE_ENABLED, RetrievalCache, bump_collection_version
+from .fusion import DEFAULT_RRF_K, FUSION_RRF, FUSION_WEIGHTED, fuse_results
+from .rerank import rerank_candidates
+from .local_index import LOCAL_INDEX_FALLBACK, LOCAL_INDEX_PRIMARY, MODEL_LOCAL_INDEX_MODE, LocalModelIndex
 
 logging.basicConfig(
     level=logging.INFO,
@@ -56,12 +62,19 @@ def _float_env(name: str, default: float) -> float:
 
 DEFAULT_SEMANTIC_WEIGHT = _float_env("MODEL_SEARCH_SEMANTIC_WEIGHT", 0.7)
 DEFAULT_KEYWORD_WEIGHT = _float_env("MODEL_SEARCH_KEYWORD_WEIGHT", 0.3)
+# 稠密 + 稀疏两路并发检索后的客户端融合方式：weighted（默认）/ rrf
+MODEL_SEARCH_FUSION = os.getenv("MODEL_SEARCH_FUSION", FUSION_WEIGHTED).strip().lower()
+MODEL_SEARCH_RRF_K = int(_float_env("MODEL_SEARCH_RRF_K", DEFAULT_RRF_K))
 CATALOG_NAME_FUZZY_THRESHOLD = _float_env("CATALOG_NAME_FUZZY_THRESHOLD", 85.0)
 CATALOG_NAME_MIN_FUZZY_LEN = 3
 
 # MongoDB连接池
 _db_client = None
-_milvus_collection = None
+_milvus_client = None
+_retrieval_cache = None
+_local_index = None
+_collection_capabilities_cache: Dict[str, Dict[str, Any]] = {}
+_search_executor = ThreadPoolExecutor(max_workers=int(_float_env("MODEL_SEARCH_WORKERS", 8)), thread_name_prefix="model-search")
 logger = logging.getLogger(__name__)
 
 def _latest_user_query_from_state(state: Optional[Dict[str, Any]]) -> str:
@@ -104,64 +117,90 @@ def get_candidate_model_summaries(md5s: List[str]) -> List[Dict[str, Any]]:
     """Return display-only candidate metadata without changing retrieval order."""
     if not md5s:
         return []
-    collection = get_db()["modelResource"]
-    documents = {
-        str(item.get("md5")): item
-        for item in collection.find(
-            {"md5": {"$in": md5s}},
-            {"name": 1, "md5": 1, "description": 1, "data": 1},
-        )
-    }
+    cards = get_model_card_cache(get_db).get_many(md5s)
     summaries: List[Dict[str, Any]] = []
     for md5 in md5s:
-        model = documents.get(str(md5))
-        if not model:
+        card = cards.get(str(md5))
+        if not card:
             continue
-        inputs: List[str] = []
-        outputs: List[str] = []
-        data = model.get("data") or {}
-        for direction, target in (("input", inputs), ("output", outputs)):
-            for state in data.get(direction, []) or []:
-                for event in state.get("events", []) or []:
-                    event_data = event.get("eventData") or {}
-                    values = event_data.get("nodeList") or []
-                    if values:
-                        for node in values:
-                            name = str(node.get("name") or node.get("description") or "").strip()
-                            if name and name not in target:
-                                target.append(name)
-                    else:
-                        name = str(event_data.get("eventDataName") or event.get("eventName") or "").strip()
-                        if name and name not in target:
-                            target.append(name)
         summaries.append({
-            "md5": str(model.get("md5") or ""),
-            "name": str(model.get("name") or ""),
-            "description": str(model.get("description") or ""),
-            "inputs": inputs[:8],
-            "outputs": outputs[:8],
+            "md5": card["md5"],
+            "name": card["name"],
+            "description": card["description"],
+            "inputs": list(card["inputs"]),
+            "outputs": list(card["outputs"]),
         })
     return summaries
 
+def _milvus_entity_count() -> Optional[int]:
+    return int(get_milvus_collection().num_entities)
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """跨会话共享的 search_relevant_models 结果缓存"""
+    global _retrieval_cache
+    if _retrieval_cache is None:
+        _retrieval_cache = RetrievalCache(MILVUS_COLLECTION, get_db, entity_counter=_milvus_entity_count)
+    return _retrieval_cache
+
+
+def invalidate_model_search_cache(bump_version: bool = True) -> None:
+    """模型集合重建索引后调用，清空本进程缓存并通知其他进程"""
+    if bump_version and MILVUS_COLLECTION:
+        bump_collection_version(get_db(), MILVUS_COLLECTION)
+    get_retrieval_cache().invalidate()
+    _collection_capabilities_cache.clear()
+
+
+def get_milvus_client() -> ManagedMilvusClient:
+    """模型检索使用的托管 Milvus 连接（启动时由 main.py 预热）"""
+    global _milvus_client
+    if _milvus_client is None:
+        _milvus_client = ManagedMilvusClient(MILVUS_COLLECTION, MILVUS_HOST, MILVUS_PORT, alias_prefix="model_search")
+    return _milvus_client
+
+
 def get_milvus_collection():
     """获取 Milvus collection 连接"""
-    global _milvus_collection
-    if _milvus_collection is None:
-        connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
-        _milvus_collection = Collection(MILVUS_COLLECTION)
-        _milvus_collection.load()
-    return _milvus_collection
+    return get_milvus_client().get_collection()
 
-def _collection_has_sparse_field(collection: Collection) -> bool:
+
+def get_local_index() -> LocalModelIndex:
+    """模型集合的本地向量快照（Milvus 不可用时的降级检索）"""
+    global _local_index
+    if _local_index is None:
+        _local_index = LocalModelIndex(MILVUS_COLLECTION)
+    return _local_index
+
+
+def _local_vector_search(query_vector: List[float], top_k: int) -> List[Dict[str, Any]]:
+    if MODEL_LOCAL_INDEX_MODE not in (LOCAL_INDEX_FALLBACK, LOCAL_INDEX_PRIMARY):
+        return []
+    try:
+        return get_local_index().search(query_vector, top_k)
+    except Exception:
+        logger.exception("Local model index search failed")
+        return []
+
+def _collection_capabilities(collection: Collection) -> Dict[str, Any]:
+    """按集合缓存 schema 能力，避免每次检索都读取 schema"""
+    name = getattr(collection, "name", None) or MILVUS_COLLECTION
+    cached = _collection_capabilities_cache.get(name)
+    if cached is not None:
+        return cached
     try:
         schema = getattr(collection, "schema", None)
-        fields = getattr(schema, "fields", None) or []
-        for field in fields:
-            if getattr(field, "name", "") == "sparse":
-                return True
-        return False
+        field_names = {getattr(field, "name", "") for field in (getattr(schema, "fields", None) or [])}
     except Exception:
-        return False
+        # schema 读取失败不缓存，下次重试
+        return {"has_sparse": False}
+    capabilities = {"has_sparse": "sparse" in field_names}
+    _collection_capabilities_cache[name] = capabilities
+    return capabilities
+
+
+def _collection_has_sparse_field(collection: Collection) -> bool:
+    return bool(_collection_capabilities(collection).get("has_sparse"))
 
 def _safe_hit_value(hit: Any, field_name: str) -> Any:
     if isinstance(hit, dict):
@@ -182,13 +221,6 @@ def _safe_hit_value(hit: Any, field_name: str) -> Any:
 
     return getattr(hit, field_name, None)
 
-def _make_weighted_ranker(semantic_weight: float = 0.65, keyword_weight: float = 0.35):
-    """创建一个 WeightedRanker，兼容不同版本的 pymilvus"""
-    try:
-        return WeightedRanker(semantic_weight, keyword_weight)
-    except TypeError:
-        return WeightedRanker([semantic_weight, keyword_weight])
-
 def _extract_hybrid_hits(search_result: Any) -> List[Any]:
     candidates: List[Any] = []
 
@@ -219,107 +251,101 @@ def _extract_hybrid_hits(search_result: Any) -> List[Any]:
 
     return []
 
+_MODEL_OUTPUT_FIELDS = ["modelId", "modelMd5", "modelName", "modelDescription", "embeddingSource"]
+
+
+def _milvus_route_search(collection: Collection, data: Any, anns_field: str, metric_type: str, limit: int, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """单路 ANN 检索（稠密向量或 BM25 稀疏），返回格式化命中"""
+    search_result = collection.search(
+        data=[data],
+        anns_field=anns_field,
+        param={"metric_type": metric_type, "params": params},
+        limit=limit,
+        output_fields=_MODEL_OUTPUT_FIELDS,
+    )
+    rows = _extract_hybrid_hits(search_result)
+    results: List[Dict[str, Any]] = []
+    for rank, hit in enumerate(rows, start=1):
+        results.append({
+            "modelId": _safe_hit_value(hit, "modelId"),
+            "modelMd5": _safe_hit_value(hit, "modelMd5"),
+            "modelName": _safe_hit_value(hit, "modelName"),
+            "modelDescription": _safe_hit_value(hit, "modelDescription"),
+            "embeddingSource": _safe_hit_value(hit, "embeddingSource"),
+            "score": float(getattr(hit, "score", 0.0) or 0.0),
+            "rank": rank,
+        })
+    return results
+
+
 def _milvus_vector_search(query_vector: List[float], top_k: int) -> List[Dict[str, Any]]:
     try:
         collection = get_milvus_collection()
-        search_result = collection.search(
-            data=[query_vector],
-            anns_field="embedding",
-            param={"metric_type": "COSINE", "params": {"ef": 128}},
-            limit=top_k,
-            output_fields=["modelId", "modelMd5", "modelName", "modelDescription", "embeddingSource"],
-        )
-
-        rows = _extract_hybrid_hits(search_result)
-        vector_results: List[Dict[str, Any]] = []
-        for rank, hit in enumerate(rows, start=1):
-            vector_results.append({
-                "modelId": _safe_hit_value(hit, "modelId"),
-                "modelMd5": _safe_hit_value(hit, "modelMd5"),
-                "modelName": _safe_hit_value(hit, "modelName"),
-                "modelDescription": _safe_hit_value(hit, "modelDescription"),
-                "embeddingSource": _safe_hit_value(hit, "embeddingSource"),
-                "score": float(getattr(hit, "score", 0.0) or 0.0),
-                "rank": rank,
-            })
-
-        return vector_results
-    except Exception:
+        return _milvus_route_search(collection, query_vector, "embedding", "COSINE", top_k, {"ef": 128})
+    except Exception as e:
         logger.exception("Milvus vector fallback search failed")
+        get_milvus_client().report_failure(e)
         return []
 
 def _milvus_hybrid_search(query_text: str, query_vector: List[float], top_k: int) -> List[Dict[str, Any]]:
-    """在 Milvus 中执行语义 + 关键词混合检索，并返回格式化结果"""
+    """在 Milvus 中执行语义 + 关键词混合检索，并返回格式化结果
+
+    稠密与 BM25 两路并发检索、客户端融合；任一路失败或为空时直接使用另一路结果，
+    不会再串行补发一次向量检索。
+    """
     try:
         collection = get_milvus_collection()
-        if not _collection_has_sparse_field(collection):
-            logger.info("Milvus collection does not have sparse field; using vector-only search")
-            return _milvus_vector_search(query_vector, top_k)
-
-        search_limit = max(top_k * 5, 50)
-        semantic_request = AnnSearchRequest(
-            data=[query_vector],
-            anns_field="embedding",
-            param={"metric_type": "COSINE", "params": {"ef": 128}},
-            limit=search_limit,
-        )
-        keyword_request = AnnSearchRequest(
-            data=[query_text],
-            anns_field="sparse",
-            param={"metric_type": "BM25", "params": {}},
-            limit=search_limit,
-        )
-        results = collection.hybrid_search(
-            [semantic_request, keyword_request],
-            rerank=_make_weighted_ranker(
-                DEFAULT_SEMANTIC_WEIGHT,
-                DEFAULT_KEYWORD_WEIGHT,
-            ),
-            limit=top_k,
-            output_fields=["modelId", "modelMd5", "modelName", "modelDescription", "embeddingSource"],
-        )
-        logger.info(
-            "Milvus hybrid search weights semantic=%s keyword=%s",
-            DEFAULT_SEMANTIC_WEIGHT,
-            DEFAULT_KEYWORD_WEIGHT,
-        )
+    except Exception as e:
+        logger.warning("Milvus unavailable for hybrid search: %s", str(e)[:100])
+        get_milvus_client().report_failure(e)
+        return []
 
-        hits = _extract_hybrid_hits(results)
-        hybrid_results: List[Dict[str, Any]] = []
-        for rank, hit in enumerate(hits, start=1):
-            hybrid_results.append({
-                "modelId": _safe_hit_value(hit, "modelId"),
-                "modelMd5": _safe_hit_value(hit, "modelMd5"),
-                "modelName": _safe_hit_value(hit, "modelName"),
-                "modelDescription": _safe_hit_value(hit, "modelDescription"),
-                "embeddingSource": _safe_hit_value(hit, "embeddingSource"),
-                "score": float(getattr(hit, "score", 0.0) or 0.0),
-                "rank": rank,
-            })
-
-        if not hybrid_results:
-            logger.warning("Milvus hybrid search returned no hits; falling back to vector-only search")
-            return _milvus_vector_search(query_vector, top_k)
-
-        return hybrid_results
-    except Exception:
-        logger.exception("Milvus hybrid search failed; falling back to vector-only search")
+    if not _collection_has_sparse_field(collection):
+        logger.info("Milvus collection does not have sparse field; using vector-only search")
         return _milvus_vector_search(query_vector, top_k)
 
-def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
-    """计算两个向量的余弦相似度"""
-    if not vec1 or not vec2 or len(vec1) != len(vec2):
-        return 0.0
-    
-    dot_product = sum(a * b for a, b in zip(vec1, vec2))
-    magnitude1 = math.sqrt(sum(a ** 2 for a in vec1))
-    magnitude2 = math.sqrt(sum(b ** 2 for b in vec2))
-    
-    if magnitude1 == 0 or magnitude2 == 0:
-        return 0.0
-    
-    return dot_product / (magnitude1 * magnitude2)
+    search_limit = max(top_k * 5, 50)
+    # 两路使用不同的连接别名，各自独立的 gRPC 通道
+    dense_future = _search_executor.submit(
+        _milvus_route_search, collection, query_vector, "embedding", "COSINE", search_limit, {"ef": 128}
+    )
+    # 第二个别名在工作线程内获取，连接失败时作为该路的异常由下方统一处理
+    sparse_future = _search_executor.submit(
+        lambda: _milvus_route_search(get_milvus_collection(), query_text, "sparse", "BM25", search_limit, {})
+    )
 
+    routes: List[Optional[List[Dict[str, Any]]]] = []
+    failures = []
+    for name, future in (("dense", dense_future), ("sparse", sparse_future)):
+        try:
+            routes.append(future.result())
+        except Exception as e:
+            logger.warning("Milvus %s search failed: %s", name, str(e)[:100])
+            # 连接类错误会使失效的别名连接在下一次请求前重连，查询错误不影响连接状态
+            get_milvus_client().report_failure(e)
+            failures.append(e)
+            routes.append(None)
+
+    if len(failures) == len(routes):
+        return []
+
+    fusion = FUSION_RRF if MODEL_SEARCH_FUSION == FUSION_RRF else FUSION_WEIGHTED
+    logger.info(
+        "Milvus hybrid search fusion=%s semantic=%s keyword=%s dense_hits=%s sparse_hits=%s",
+        fusion,
+        DEFAULT_SEMANTIC_WEIGHT,
+        DEFAULT_KEYWORD_WEIGHT,
+        len(routes[0] or []),
+        len(routes[1] or []),
+    )
+    return fuse_results(
+        routes,
+        metric_types=["COSINE", "BM25"],
+        weights=[DEFAULT_SEMANTIC_WEIGHT, DEFAULT_KEYWORD_WEIGHT],
+        top_k=top_k,
+        fusion=fusion,
+        rrf_k=MODEL_SEARCH_RRF_K,
+    )
 
 def _format_model_hit(model: Dict[str, Any], rank: int, score: float, source: str) -> Dict[str, Any]:
     return {
@@ -475,28 +501,55 @@ def search_relevant_models(
                 "message": "",
             }
 
-        # 生成用户查询向量
-        query_vector = client.embeddings.create(
-            model=MODEL_RECOMMEND_EMBEDDING_MODEL,
-            input=user_query_text
-        ).data[0].embedding
-
-        result = _milvus_hybrid_search(user_query_text, query_vector, top_k)
+        cache_key = None
+        result = None
+        if MODEL_SEARCH_CACHE_ENABLED:
+            cache = get_retrieval_cache()
+            cache_key = cache.make_key(user_query_text, top_k, (DEFAULT_SEMANTIC_WEIGHT, DEFAULT_KEYWORD_WEIGHT))
+            result = cache.get(cache_key)
+
+        if result is None:
+            # 生成用户查询向量
+            query_vector = client.embeddings.create(
+                model=MODEL_RECOMMEND_EMBEDDING_MODEL,
+                input=user_query_text
+            ).data[0].embedding
+
+            if MODEL_LOCAL_INDEX_MODE == LOCAL_INDEX_PRIMARY:
+                result = _local_vector_search(query_vector, top_k)
+            else:
+                result = _milvus_hybrid_search(user_query_text, query_vector, top_k)
+                if cache_key and result:
+                    get_retrieval_cache().set(cache_key, result)
+                elif not result:
+                    # Milvus 不可用或无结果时降级到本地快照的稠密检索（降级结果不写入缓存）
+                    result = _local_vector_search(query_vector, top_k)
+                    if result:
+                        logger.warning("Milvus returned no results; served %s models from local index", len(result))
         if not result:
             return {
                 "status": "error",
-                "message": "Milvus 混合检索未返回结果，请检查 collection、索引、embeddingSource 或 query 向量。",
+                "message": "Milvus 混合检索与本地索引均未返回结果，请检查 collection、索引、embeddingSource 或 query 向量。",
                 "models": [],
                 "count": 0,
             }
         
-        return {
+        # 可选的本地重排：LLM 只阅读重排后的少量候选
+        reranked = rerank_candidates(
+            user_query_text,
+            result,
+            card_loader=lambda md5s: get_model_card_cache(get_db).get_many(md5s),
+        )
+        response = {
             "status": "success",
-            "count": len(result),
+            "count": len(reranked["models"]),
             "query": user_query_text,
             "top_k": top_k,
-            "models": result
+            "models": reranked["models"]
         }
+        if reranked["rerank"]:
+            response["rerank"] = reranked["rerank"]
+        return response
     except Exception as e:
         return {
             "status": "error",
@@ -515,65 +568,21 @@ def search_most_model(
         if not model_md5:
             return {"status": "error", "message": "未提供模型 MD5。"}
 
-        db = get_db()
-        model_resource_collection = db["modelResource"]
+        # 读取预先投影的模型卡片，避免每次拉取完整 data 树并重建工作流
+        card = get_model_card_cache(get_db).get(model_md5)
 
-        # 查询选中的单个模型
-        model = model_resource_collection.find_one({"md5": model_md5})
-        
-        if not model:
+        if not card:
             return {"status": "error", "message": f"未找到 MD5 为 {model_md5} 的模型。"}
 
-        # 1. 提取基础信息
         # 注意：这里直接构建对象，不嵌套在 list 里，方便前端直接 payload.data?.name
-        result = {
+        return {
             "status": "success",
-            "name": model.get("name", ""),
-            "md5": model.get("md5", ""),
-            "description": model.get("description", ""),
-            "workflow": []
+            "name": card["name"],
+            "md5": card["md5"],
+            "description": card["description"],
+            "workflow": copy_card_field(card, "workflow"),
         }
 
-        # 2. 格式化工作流信息 (Workflow)
-        workflow_steps = []
-        if model.get("data") and model["data"].get("input"):
-            for s in model["data"]["input"]:
-                events = []
-                for event in s.get("events", []):
-                    event_data = event.get("eventData", {})
-                    inputs = []
-
-                    if event_data.get("eventDataType") == "internal" and event_data.get("nodeList"):
-                        for node in event_data.get("nodeList", []):
-                            inputs.append({
-                                "name": node.get("name", ""),
-                                "type": node.get("dataType", ""),
-                                "description": node.get("description", "")
-                            })
-
-                    if event_data.get("eventDataType") == "external":
-                        inputs.append({
-                            "name": event_data.get("eventDataName") or event.get("eventName", ""),
-                            "type": "FILE",
-                            "description": event_data.get("exentDataDesc", ""),
-                            "nodeList": event_data.get("nodeList", [])
-                        })
-
-                    events.append({
-                        "eventName": event.get("eventName", ""),
-                        "eventDescription": event.get("eventDescription", ""),
-                        "inputs": inputs
-                    })
-
-                workflow_steps.append({
-                    "stateName": s.get("stateName", ""),
-                    "stateDescription": s.get("stateDescription", ""),
-                    "events": events
-                })
-
-        result["workflow"] = workflow_steps
-        return result  # 直接返回对象
-
     except Exception as e:
         logger.exception("Failed to get model details")
         return {"status": "error", "message": f"获取模型详情失败: {str(e)}"}
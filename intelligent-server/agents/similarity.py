@@ -0,0 +1,151 @@
+"""
+向量相似度工具
+
+统一 Store 的 MongoDB 降级检索、模型推荐工具和评测策略中的余弦相似度计算：
+- 向量统一转为 float32 并预先归一化，余弦相似度退化为点积
+- 多条候选向量按矩阵-向量乘法一次性打分
+- top-k 使用 argpartition，避免对全部候选排序
+"""
+
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_EPS = 1e-9
+
+
+def as_float32_vector(vector: Any) -> Optional[np.ndarray]:
+    """将 list / ndarray 转为一维 float32 向量，无效输入返回 None"""
+    if vector is None:
+        return None
+    try:
+        array = np.asarray(vector, dtype=np.float32)
+    except (TypeError, ValueError):
+        return None
+    if array.ndim != 1 or array.size == 0:
+        return None
+    return array
+
+
+def normalize_vector(vector: Any) -> Optional[np.ndarray]:
+    """返回单位长度的 float32 向量；零向量或无效输入返回 None"""
+    array = as_float32_vector(vector)
+    if array is None:
+        return None
+    norm = float(np.linalg.norm(array))
+    if norm < _EPS:
+        return None
+    return array / norm
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """按行归一化二维 float32 矩阵，零行保持为 0（打分恒为 0）"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim != 2:
+        raise ValueError("matrix must be two-dimensional")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.maximum(norms, _EPS, out=norms)
+    return matrix / norms
+
+
+def stack_vectors(vectors: Sequence[Any], dim: Optional[int] = None) -> Tuple[np.ndarray, List[int]]:
+    """将候选向量堆叠为矩阵，跳过维度不一致或无效的向量
+
+    Returns:
+        (matrix, kept_indices)，kept_indices 为保留向量在输入序列中的下标
+    """
+    rows: List[np.ndarray] = []
+    kept: List[int] = []
+    for index, vector in enumerate(vectors):
+        array = as_float32_vector(vector)
+        if array is None:
+            continue
+        if dim is None:
+            dim = array.shape[0]
+        if array.shape[0] != dim:
+            continue
+        rows.append(array)
+        kept.append(index)
+    if not rows:
+        return np.empty((0, dim or 0), dtype=np.float32), []
+    return np.vstack(rows), kept
+
+
+def cosine_similarity(vec_a: Any, vec_b: Any) -> float:
+    """计算两个向量的余弦相似度"""
+    unit_a = normalize_vector(vec_a)
+    unit_b = normalize_vector(vec_b)
+    if unit_a is None or unit_b is None or unit_a.shape != unit_b.shape:
+        return 0.0
+    return float(np.dot(unit_a, unit_b))
+
+
+def cosine_scores(query: Any, matrix: np.ndarray, normalized: bool = False) -> np.ndarray:
+    """计算 query 与矩阵每一行的余弦相似度
+
+    Args:
+        query: 查询向量
+        matrix: 形状为 (n, dim) 的候选矩阵
+        normalized: 矩阵行是否已预先归一化
+    """
+    unit_query = normalize_vector(query)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if unit_query is None or matrix.ndim != 2 or matrix.shape[0] == 0 or matrix.shape[1] != unit_query.shape[0]:
+        return np.zeros((matrix.shape[0] if matrix.ndim == 2 else 0,), dtype=np.float32)
+    if not normalized:
+        matrix = normalize_rows(matrix)
+    return matrix @ unit_query
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回得分最高的 k 个下标（按得分降序）"""
+    scores = np.asarray(scores)
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty((0,), dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order]
+
+
+def cosine_top_k(
+    query: Any,
+    matrix: np.ndarray,
+    k: int,
+    threshold: Optional[float] = None,
+    normalized: bool = False,
+) -> List[Tuple[int, float]]:
+    """对候选矩阵打分并返回 [(row_index, score)]，可选相似度阈值过滤"""
+    scores = cosine_scores(query, matrix, normalized=normalized)
+    hits: List[Tuple[int, float]] = []
+    for index in top_k_indices(scores, k):
+        score = float(scores[index])
+        if threshold is not None and score <= threshold:
+            continue
+        hits.append((int(index), score))
+    return hits
+
+
+def cosine_top_k_with_norms(
+    query: Any,
+    matrix: np.ndarray,
+    norms: np.ndarray,
+    k: int,
+    threshold: Optional[float] = None,
+) -> List[Tuple[int, float]]:
+    """矩阵行未归一化但已知各行范数时打分，避免再对整块矩阵做归一化"""
+    unit_query = normalize_vector(query)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if unit_query is None or matrix.ndim != 2 or matrix.shape[0] == 0 or matrix.shape[1] != unit_query.shape[0]:
+        return []
+    scores = (matrix @ unit_query) / np.maximum(np.asarray(norms, dtype=np.float32), _EPS)
+    hits: List[Tuple[int, float]] = []
+    for index in top_k_indices(scores, k):
+        score = float(scores[index])
+        if threshold is not None and score <= threshold:
+            continue
+        hits.append((int(index), score))
+    return hits
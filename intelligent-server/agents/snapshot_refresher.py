@@ -0,0 +1,112 @@
+"""
+按 key 去抖的后台刷新器
+
+用户画像（user_snapshot）在每次写入记忆后都需要重新渲染并重新向量化。
+这里把刷新请求按 userId 合并：同一用户在 delay 窗口内的多次写入只触发一次刷新，
+刷新在单个后台线程中执行，不占用请求的关键路径。
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DebouncedRefresher:
+    """单线程去抖执行器：schedule(key) 后延迟 delay 秒执行 refresh_fn(key)"""
+
+    def __init__(
+        self,
+        refresh_fn: Callable[[Hashable], None],
+        delay_seconds: float = 5.0,
+        max_delay_seconds: Optional[float] = None,
+        name: str = "debounced-refresher",
+    ):
+        self._refresh_fn = refresh_fn
+        self._delay = max(0.0, float(delay_seconds))
+        # 持续写入时最多推迟这么久，避免画像永远不刷新
+        self._max_delay = max(self._delay, float(max_delay_seconds if max_delay_seconds is not None else self._delay * 6))
+        self._name = name
+        self._deadlines: Dict[Hashable, float] = {}
+        self._first_seen: Dict[Hashable, float] = {}
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.completed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+
+    def schedule(self, key: Hashable) -> None:
+        """登记一次刷新请求；窗口内重复登记只会推迟执行时间"""
+        if key is None:
+            return
+        self.start()
+        now = time.monotonic()
+        with self._condition:
+            first_seen = self._first_seen.setdefault(key, now)
+            self._deadlines[key] = min(now + self._delay, first_seen + self._max_delay)
+            self._condition.notify()
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._deadlines)
+
+    def flush(self) -> None:
+        """立即执行所有待刷新的 key（在调用线程中执行）"""
+        with self._condition:
+            keys = list(self._deadlines.keys())
+            self._deadlines.clear()
+            self._first_seen.clear()
+        for key in keys:
+            self._execute(key)
+
+    def stop(self, flush: bool = True, timeout: Optional[float] = 5.0) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        if flush:
+            self.flush()
+
+    def _pop_due(self) -> Optional[Hashable]:
+        """在持锁状态下取出一个到期 key；没有到期 key 时等待"""
+        while self._running:
+            if not self._deadlines:
+                self._condition.wait()
+                continue
+            key, deadline = min(self._deadlines.items(), key=lambda item: item[1])
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                self._condition.wait(timeout=remaining)
+                continue
+            self._deadlines.pop(key, None)
+            self._first_seen.pop(key, None)
+            return key
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                key = self._pop_due()
+            if key is None:
+                return
+            self._execute(key)
+
+    def _execute(self, key: Hashable) -> None:
+        try:
+            self._refresh_fn(key)
+            self.completed += 1
+        except Exception:
+            self.failed += 1
+            logger.exception("%s failed to refresh %s", self._name, key)
@@ -0,0 +1,176 @@
+"""
+SSE 事件编码
+
+stream_agent 对每个 LLM token 都单独 json.dumps 并发出一帧，高并发会话下序列化 CPU 和网络帧数都很可观。
+SSEEncoder 负责：
+- 使用 orjson 序列化（未安装时退回标准库 json，输出一致：不转义非 ASCII）
+- token 事件按时间窗口 / 字节数合并为一帧；其他事件发出前先冲刷已缓存的 token，保证顺序
+- with_token_flush 包装事件流：窗口到期而下一个 chunk 尚未到达时也会发出已缓存的 token
+- 可选 gzip：整条流压缩，每次输出做一次 sync flush，客户端可逐帧解压
+帧格式与原先一致："data:<json>\\n\\n"
+"""
+
+import asyncio
+import json
+import os
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+SSE_TOKEN_BATCH_MS = float(os.getenv("SSE_TOKEN_BATCH_MS", "30"))
+SSE_TOKEN_BATCH_BYTES = int(os.getenv("SSE_TOKEN_BATCH_BYTES", "512"))
+# off: 不压缩；auto: 客户端 Accept-Encoding 含 gzip 时压缩
+SSE_COMPRESSION = os.getenv("SSE_COMPRESSION", "off").strip().lower()
+
+COMPRESSION_OFF = "off"
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_AUTO = "auto"
+
+# with_token_flush 插入的定时冲刷项：(TOKEN_FLUSH, 已编码的帧)
+TOKEN_FLUSH = "sse_token_flush"
+_STREAM_END = object()
+
+
+def dumps(payload: Any) -> bytes:
+    """序列化为 UTF-8 JSON（非 ASCII 字符不转义）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def resolve_compression(requested: Optional[str], accept_encoding: Optional[str]) -> str:
+    """按客户端请求头与服务端配置决定是否压缩"""
+    mode = (requested or SSE_COMPRESSION or COMPRESSION_OFF).strip().lower()
+    accepts_gzip = "gzip" in (accept_encoding or "").lower()
+    if mode in (COMPRESSION_GZIP, COMPRESSION_AUTO) and accepts_gzip:
+        return COMPRESSION_GZIP
+    return COMPRESSION_OFF
+
+
+class SSEEncoder:
+    """单条 SSE 流的编码器（非线程安全，每个请求一个实例）"""
+
+    def __init__(
+        self,
+        token_batch_ms: float = SSE_TOKEN_BATCH_MS,
+        token_batch_bytes: int = SSE_TOKEN_BATCH_BYTES,
+        compression: str = COMPRESSION_OFF,
+    ):
+        self._window = max(0.0, token_batch_ms) / 1000.0
+        self._max_bytes = max(0, token_batch_bytes)
+        self._tokens: list = []
+        self._token_bytes = 0
+        self._first_token_at = 0.0
+        # wbits=31 输出带 gzip 头的流
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compression == COMPRESSION_GZIP else None
+        self.frames = 0
+        self.tokens = 0
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        if self._compressor is not None:
+            headers["Content-Encoding"] = "gzip"
+        return headers
+
+    def _frame(self, payload: Any) -> bytes:
+        self.frames += 1
+        return b"data:" + dumps(payload) + b"\n\n"
+
+    def _output(self, data: bytes) -> bytes:
+        if self._compressor is None or not data:
+            return data
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def _drain_tokens(self) -> bytes:
+        if not self._tokens:
+            return b""
+        frame = self._frame({"type": "token", "message": "".join(self._tokens)})
+        self._tokens = []
+        self._token_bytes = 0
+        return frame
+
+    def token(self, text: str) -> bytes:
+        """缓存一个 token；达到时间窗口或字节上限时返回合并后的帧，否则返回空字节串"""
+        if not text:
+            return b""
+        self.tokens += 1
+        now = time.monotonic()
+        if not self._tokens:
+            self._first_token_at = now
+        self._tokens.append(text)
+        self._token_bytes += len(text.encode("utf-8"))
+        if self._token_bytes >= self._max_bytes or now - self._first_token_at >= self._window:
+            return self._output(self._drain_tokens())
+        return b""
+
+    def event(self, payload: Dict[str, Any]) -> bytes:
+        """编码一个普通事件，之前缓存的 token 先行发出"""
+        return self._output(self._drain_tokens() + self._frame(payload))
+
+    def flush(self) -> bytes:
+        return self._output(self._drain_tokens())
+
+    def pending_timeout(self) -> Optional[float]:
+        """距当前 token 窗口到期的秒数；没有缓存的 token 时返回 None"""
+        if not self._tokens:
+            return None
+        return max(0.0, self._first_token_at + self._window - time.monotonic())
+
+    def close(self) -> bytes:
+        """冲刷剩余 token 并结束压缩流"""
+        data = self._drain_tokens()
+        if self._compressor is None:
+            return data
+        tail = self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+        self._compressor = None
+        return tail
+
+
+async def with_token_flush(source: AsyncIterator[Tuple[Any, Any]], encoder: SSEEncoder) -> AsyncIterator[Tuple[Any, Any]]:
+    """转发 (mode, chunk) 事件流；token 窗口到期时插入 (TOKEN_FLUSH, frame)
+
+    source 在独立任务中迭代，等待超时只取消队列读取，不会中断正在产出的图节点。
+    """
+    queue: "asyncio.Queue[Tuple[Any, Optional[BaseException]]]" = asyncio.Queue(maxsize=1)
+
+    async def pump() -> None:
+        try:
+            async for item in source:
+                await queue.put((item, None))
+        except Exception as e:
+            await queue.put((_STREAM_END, e))
+            return
+        await queue.put((_STREAM_END, None))
+
+    task = asyncio.ensure_future(pump())
+    try:
+        while True:
+            try:
+                item, error = await asyncio.wait_for(queue.get(), encoder.pending_timeout())
+            except asyncio.TimeoutError:
+                frame = encoder.flush()
+                if frame:
+                    yield TOKEN_FLUSH, frame
+                continue
+            if item is _STREAM_END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        if not task.done():
+            task.cancel()
+        # 等待事件流真正结束，调用方 finally 中的清理（如 end_turn）不会与仍在运行的图重叠
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
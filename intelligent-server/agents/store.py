@@ -1,13 +1,33 @@
 from typing import List, Dict, Any, Optional
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 import os
 import re
 import json
 import hashlib
+import logging
+import threading
+import time
 from pathlib import Path
 from dotenv import load_dotenv
-from math import sqrt
+from .similarity import cosine_top_k_with_norms
+from .snapshot_refresher import DebouncedRefresher
+from .memory_collection import (
+    MEMORY_PRIMARY_FIELD,
+    collection_field_names,
+    ensure_memory_collection,
+    memory_primary_key,
+    uses_partition_key_layout,
+)
+from .embedding_codec import (
+    COMPACT_FIELDS,
+    ENCODING_FLOAT32,
+    ENCODING_LIST,
+    SUPPORTED_ENCODINGS,
+    decode_embedding_matrix,
+    encode_embedding,
+)
 
 try:
     from openai import OpenAI
@@ -22,6 +42,8 @@ MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
 MEMORY_COLLECTION = "userMemories"
 MEMORY_MILVUS_COLLECTION = os.getenv("MEMORY_MILVUS_COLLECTION", "")
+# 集合不存在时按 userId partition key 布局自动创建（见 agents/memory_collection.py）
+MEMORY_MILVUS_AUTO_CREATE = os.getenv("MEMORY_MILVUS_AUTO_CREATE", "false").strip().lower() in {"1", "true", "yes", "on"}
 MEMORY_EMBEDDING_MODEL = os.getenv("MEMORY_EMBEDDING_MODEL", os.getenv("EMBEDDING_MODEL", "gemini-embedding-001"))
 MEMORY_EMBEDDING_DIM = int(
     os.getenv(
@@ -33,18 +55,88 @@ AIHUBMIX_API_KEY = os.getenv("MEMORY_AGENT_API_KEY") or os.getenv("OPENAI_COMPAT
 AIHUBMIX_BASE_URL = os.getenv("MEMORY_AGENT_BASE_URL") or os.getenv("OPENAI_COMPAT_BASE_URL") or os.getenv("AIHUBMIX_BASE_URL")
 MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
 MILVUS_PORT = int(os.getenv("MILVUS_PORT", "19530"))
+# MongoDB 降级存储的向量编码：float32（默认）/ int8 / list（旧格式）
+# 紧凑编码在 migrate_memory_embeddings 完成迁移前不生效，仍写入 knnVector 索引使用的 embedding 列表
+MEMORY_EMBEDDING_ENCODING = os.getenv("MEMORY_EMBEDDING_ENCODING", ENCODING_FLOAT32).strip().lower()
+if MEMORY_EMBEDDING_ENCODING not in SUPPORTED_ENCODINGS:
+    MEMORY_EMBEDDING_ENCODING = ENCODING_FLOAT32
+EMBEDDING_STATE_COLLECTION = "memoryEmbeddingState"
+# 迁移标记在进程内缓存，超过该秒数后下一个 Store 重新读取
+MEMORY_EMBEDDING_STATE_REFRESH_SECONDS = max(float(os.getenv("MEMORY_EMBEDDING_STATE_REFRESH_SECONDS", "300")), 0.0)
+# 用户画像增量维护：计数按半衰期指数衰减；重新渲染 + 向量化在后台去抖执行（<= 0 表示同步刷新）
+USER_SNAPSHOT_HALF_LIFE_DAYS = max(float(os.getenv("USER_SNAPSHOT_HALF_LIFE_DAYS", "30")), 0.1)
+USER_SNAPSHOT_REFRESH_DELAY_SECONDS = float(os.getenv("USER_SNAPSHOT_REFRESH_DELAY_SECONDS", "5"))
+SNAPSHOT_COUNTERS_NAMESPACE = "user_snapshot_counters"
+# 衰减基准时间距今超过这么多个半衰期时重新定基，避免计数值溢出
+_SNAPSHOT_REBASE_HALF_LIVES = 32
+# 每个维度最多保留的候选值个数
+_SNAPSHOT_MAX_TRACKED_VALUES = 64
+# 维度 -> (来源字段, 画像中保留的个数)
+_SNAPSHOT_TASK_FIELDS = {
+    "domains": ("Domain", 5),
+    "targets": ("Target_object", 5),
+    "spatial": ("Spatial_scope", 3),
+    "temporal": ("Temporal_scope", 3),
+    "resolutions": ("Resolution_requirements", 3),
+}
+_SNAPSHOT_MODEL_FIELDS = {
+    "models": ("model_name", 5),
+}
+
+logger = logging.getLogger(__name__)
+
+# (库名, 配置编码) -> (生效编码, 读取时间)；未迁移提示每个进程只打印一次
+_encoding_cache: Dict[tuple, tuple] = {}
+_encoding_cache_lock = threading.Lock()
+_encoding_warned: set = set()
+
+
+def read_migrated_encoding(db: Any) -> Optional[str]:
+    """迁移脚本记录的 userMemories 当前向量编码，未迁移过时返回 None"""
+    try:
+        doc = db[EMBEDDING_STATE_COLLECTION].find_one({"_id": MEMORY_COLLECTION})
+    except Exception as e:
+        logging.warning(f"Failed to read memory embedding state: {str(e)[:100]}")
+        return None
+    return doc.get("encoding") if doc else None
 
 
-def cosine_similarity(vec_a: List[float], vec_b: List[float]) -> float:
-    """计算两个向量的余弦相似度"""
-    if not vec_a or not vec_b or len(vec_a) != len(vec_b):
-        return 0.0
-    dot_product = sum(a * b for a, b in zip(vec_a, vec_b))
-    norm_a = sqrt(sum(a * a for a in vec_a))
-    norm_b = sqrt(sum(b * b for b in vec_b))
-    if norm_a < 1e-9 or norm_b < 1e-9:
-        return 0.0
-    return dot_product / (norm_a * norm_b)
+def record_migrated_encoding(db: Any, encoding: str) -> None:
+    db[EMBEDDING_STATE_COLLECTION].update_one(
+        {"_id": MEMORY_COLLECTION},
+        {"$set": {"encoding": encoding, "migrated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    with _encoding_cache_lock:
+        _encoding_cache.clear()
+
+
+def resolve_embedding_encoding(db: Any, configured: str = MEMORY_EMBEDDING_ENCODING) -> str:
+    """配置的紧凑编码只有在全量迁移完成后才启用，否则继续写 embedding 列表
+
+    迁移标记按进程缓存 MEMORY_EMBEDDING_STATE_REFRESH_SECONDS 秒，避免每个 Store 都查一次
+    """
+    if configured == ENCODING_LIST:
+        return ENCODING_LIST
+    key = (getattr(db, "name", None), configured)
+    now = time.monotonic()
+    with _encoding_cache_lock:
+        cached = _encoding_cache.get(key)
+        if cached and now - cached[1] < MEMORY_EMBEDDING_STATE_REFRESH_SECONDS:
+            return cached[0]
+    migrated = read_migrated_encoding(db)
+    encoding = configured if migrated == configured else ENCODING_LIST
+    with _encoding_cache_lock:
+        _encoding_cache[key] = (encoding, now)
+        warn = encoding != configured and key not in _encoding_warned
+        if warn:
+            _encoding_warned.add(key)
+    if warn:
+        logger.warning(
+            f"MEMORY_EMBEDDING_ENCODING={configured} is not active until "
+            f"`python -m agents.migrate_memory_embeddings --encoding {configured}` has run; writing list embeddings"
+        )
+    return encoding
 
 
 class Store:
@@ -59,6 +151,7 @@ class Store:
     _shared_milvus_init_attempted = False
     _shared_milvus_available = False
     _shared_memory_vector_collection = None
+    _shared_memory_row_has_primary_id = False
 
     def __init__(self, mongo_uri: str = MONGO_URI, db_name: str = MONGO_DB_NAME):
         if not mongo_uri or not db_name:
@@ -66,6 +159,7 @@ class Store:
         self.client = MongoClient(mongo_uri)
         self.db = self.client[db_name]
         self.collection = self._collection(MEMORY_COLLECTION)
+        self._embedding_encoding = resolve_embedding_encoding(self.db)
         self._embedding_client = None
         self._memory_vector_collection = None
         self._milvus_available = False
@@ -83,7 +177,19 @@ class Store:
             [("userId", ASCENDING), ("namespace", ASCENDING), ("memory_key", ASCENDING)],
             sparse=True,
         )
-        # MongoDB 向量搜索索引（如果版本支持）
+        # 每个用户只有一份画像计数文档，并发的首次事件靠唯一索引去重
+        try:
+            self.collection.create_index(
+                [("userId", ASCENDING), ("namespace", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"namespace": SNAPSHOT_COUNTERS_NAMESPACE},
+                name="snapshot_counters_unique",
+            )
+        except Exception as e:
+            logging.warning(f"Failed to create unique snapshot counters index: {str(e)[:100]}")
+        # MongoDB 向量搜索索引（如果版本支持）；紧凑编码不写 embedding 列表，索引无意义
+        if self._embedding_encoding != ENCODING_LIST:
+            return
         try:
             indexes = self.collection.list_indexes()
             has_vector_index = any("embedding" in idx.get("name", "") for idx in indexes)
@@ -138,7 +244,9 @@ class Store:
                 connections.connect(alias="memory_store", host=MILVUS_HOST, port=MILVUS_PORT)
                 try:
                     from pymilvus import utility
-                    if not utility.has_collection(MEMORY_MILVUS_COLLECTION, using="memory_store"):
+                    if MEMORY_MILVUS_AUTO_CREATE:
+                        ensure_memory_collection(MEMORY_MILVUS_COLLECTION, MEMORY_EMBEDDING_DIM, using="memory_store")
+                    elif not utility.has_collection(MEMORY_MILVUS_COLLECTION, using="memory_store"):
                         logging.warning(
                             f"Milvus collection '{MEMORY_MILVUS_COLLECTION}' not found; disabling Milvus memory store"
                         )
@@ -150,6 +258,14 @@ class Store:
                     pass
 
                 self._memory_vector_collection = Collection(MEMORY_MILVUS_COLLECTION, using="memory_store")
+                Store._shared_memory_row_has_primary_id = MEMORY_PRIMARY_FIELD in collection_field_names(
+                    self._memory_vector_collection
+                )
+                if not uses_partition_key_layout(self._memory_vector_collection):
+                    logging.info(
+                        "Milvus memory collection uses the legacy filtered layout; "
+                        "run `python -m agents.migrate_memory_collection` to switch to userId partition keys"
+                    )
                 self._memory_vector_collection.load()
                 self._milvus_available = True
                 Store._shared_milvus_available = True
@@ -232,6 +348,26 @@ class Store:
         except Exception:
             return None
 
+    def _embed_texts(self, texts: List[str], strict: bool = False) -> List[Optional[List[float]]]:
+        """批量向量化，一次请求完成；失败时全部返回 None，strict=True 时向上抛出"""
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        indexed = [(index, text) for index, text in enumerate(texts) if text]
+        if not indexed or not AIHUBMIX_API_KEY:
+            return vectors
+        try:
+            client = self._get_embedding_client()
+            if client is None:
+                return vectors
+            response = client.embeddings.create(model=MEMORY_EMBEDDING_MODEL, input=[text for _, text in indexed])
+            for position, item in enumerate(response.data):
+                slot = getattr(item, "index", position)
+                if 0 <= slot < len(indexed):
+                    vectors[indexed[slot][0]] = item.embedding
+        except Exception:
+            if strict:
+                raise
+        return vectors
+
     def _memory_text(self, namespace: str, payload: Dict[str, Any]) -> str:
         if namespace == "task_memory":
             task_spec = payload.get("task_spec") or {}
@@ -266,55 +402,88 @@ class Store:
 
     def _upsert_vector_memory(self, user_id: str, namespace: str, kind: str, memory_key: str, payload: Dict[str, Any]) -> None:
         """写入记忆到向量数据库（优先 Milvus，降级 MongoDB）"""
-        text = self._memory_text(namespace, payload)
-        vector = self._embed_text(text)
-        if vector is None:
+        self._upsert_vector_memories([
+            {"user_id": user_id, "namespace": namespace, "kind": kind, "memory_key": memory_key, "payload": payload}
+        ])
+
+    def _upsert_vector_memories(self, entries: List[Dict[str, Any]], strict: bool = False) -> None:
+        """批量写入记忆向量：一次 embedding 请求 + 一次 Milvus upsert（降级为一次 MongoDB bulk_write）
+
+        strict=True 时 embedding 失败或 Milvus 与 MongoDB 均写入失败会向上抛出，交给后台写入队列重试 / dead-letter。
+        """
+        texts = [self._memory_text(entry["namespace"], entry["payload"]) for entry in entries]
+        vectors = self._embed_texts(texts, strict=strict)
+        items = [(entry, text, vector) for entry, text, vector in zip(entries, texts, vectors) if vector is not None]
+        if not items:
             return
 
         # 尝试写入 Milvus（惰性初始化）
         if self._ensure_milvus_ready():
             try:
-                row = {
-                    "memory_key": memory_key,
-                    "userId": user_id,
-                    "namespace": namespace,
-                    "kind": kind,
-                    "text": text,
-                    "payload_json": json.dumps(payload, ensure_ascii=False),
-                    "embedding": vector,
-                }
+                rows = [
+                    {
+                        **(
+                            {MEMORY_PRIMARY_FIELD: memory_primary_key(entry["user_id"], entry["namespace"], entry["memory_key"])}
+                            if Store._shared_memory_row_has_primary_id
+                            else {}
+                        ),
+                        "memory_key": entry["memory_key"],
+                        "userId": entry["user_id"],
+                        "namespace": entry["namespace"],
+                        "kind": entry["kind"],
+                        "text": text,
+                        "payload_json": json.dumps(entry["payload"], ensure_ascii=False),
+                        "embedding": vector,
+                    }
+                    for entry, text, vector in items
+                ]
                 if hasattr(self._memory_vector_collection, "upsert"):
-                    self._memory_vector_collection.upsert([row])
+                    self._memory_vector_collection.upsert(rows)
                 else:
-                    self._memory_vector_collection.insert([row])
+                    self._memory_vector_collection.insert(rows)
                 return
             except Exception as e:
-                import logging
                 logging.warning(f"Milvus write failed: {str(e)[:100]}")
                 self._milvus_available = False
 
         # 降级到 MongoDB 向量存储
         try:
             now = datetime.utcnow()
-            self.collection.update_one(
-                {"userId": user_id, "namespace": namespace, "memory_key": memory_key},
-                {
-                    "$set": {
-                        "userId": user_id,
-                        "namespace": namespace,
-                        "kind": kind,
-                        "memory_key": memory_key,
-                        "payload": payload,
-                        "embedding": vector,
-                        "embedding_text": text,
-                        "updated_at": now,
+            operations = [
+                UpdateOne(
+                    {"userId": entry["user_id"], "namespace": entry["namespace"], "memory_key": entry["memory_key"]},
+                    {
+                        "$set": {
+                            "userId": entry["user_id"],
+                            "namespace": entry["namespace"],
+                            "kind": entry["kind"],
+                            "memory_key": entry["memory_key"],
+                            "payload": entry["payload"],
+                            "embedding_text": text,
+                            "updated_at": now,
+                            **encode_embedding(vector, self._embedding_encoding),
+                        },
+                        "$unset": self._stale_embedding_fields(self._embedding_encoding),
+                        "$setOnInsert": {"created_at": now},
                     },
-                    "$setOnInsert": {"created_at": now},
-                },
-                upsert=True,
-            )
+                    upsert=True,
+                )
+                for entry, text, vector in items
+            ]
+            self.collection.bulk_write(operations, ordered=False)
         except Exception:
-            pass
+            if strict:
+                raise
+
+    @staticmethod
+    def _stale_embedding_fields(encoding: str) -> Dict[str, str]:
+        """切换编码时需要清理的旧向量字段"""
+        if encoding == ENCODING_LIST:
+            return {field: "" for field in COMPACT_FIELDS}
+        stale = {"embedding": ""}
+        if encoding == ENCODING_FLOAT32:
+            stale["embedding_scale"] = ""
+        return stale
 
     def _semantic_search_memory(self, user_id: str, namespace: str, query: str, limit: int) -> List[Dict[str, Any]]:
         """向量语义搜索，支持 Milvus 或 MongoDB"""
@@ -327,6 +496,7 @@ class Store:
             try:
                 safe_user_id = str(user_id).replace('"', '\\"')
                 safe_namespace = str(namespace).replace('"', '\\"')
+                # partition key 布局下 userId 等值条件会让 Milvus 只检索该用户所在分区
                 results = self._memory_vector_collection.search(
                     data=[query_vector],
                     anns_field="embedding",
@@ -355,7 +525,6 @@ class Store:
                 if hits:
                     return hits[:limit]
             except Exception as e:
-                import logging
                 logging.warning(f"Milvus search failed: {str(e)[:100]}")
                 self._milvus_available = False
 
@@ -366,24 +535,26 @@ class Store:
                     {
                         "userId": user_id,
                         "namespace": namespace,
-                        "embedding": {"$exists": True},
-                    }
+                        "$or": [
+                            {"embedding_bin": {"$exists": True}},
+                            {"embedding": {"$exists": True}},
+                        ],
+                    },
+                    {"payload": 1, "embedding": 1, **{field: 1 for field in COMPACT_FIELDS}},
                 )
                 .sort("updated_at", -1)
                 .limit(100)
             )
 
-            scored = []
-            for doc in docs:
-                embedding = doc.get("embedding")
-                if isinstance(embedding, list) and len(embedding) > 0:
-                    sim = cosine_similarity(query_vector, embedding)
-                    if sim > 0.3:  # 相似度阈值
-                        scored.append((sim, doc))
+            # 二进制向量直接 frombuffer 解码，借助预计算范数一次矩阵-向量乘法完成打分
+            matrix, norms, kept = decode_embedding_matrix(docs, dim=len(query_vector))
+            scored = [
+                (score, docs[kept[row]])
+                for row, score in cosine_top_k_with_norms(query_vector, matrix, norms, limit, threshold=0.3)  # 相似度阈值
+            ]
 
-            scored.sort(key=lambda x: x[0], reverse=True)
             hits = []
-            for score, doc in scored[:limit]:
+            for score, doc in scored:
                 payload = doc.get("payload") or {}
                 payload.setdefault("userId", user_id)
                 payload.setdefault("namespace", namespace)
@@ -444,43 +615,58 @@ class Store:
         )
 
     def _insert_memory(self, user_id: str, namespace: str, kind: str, payload: Dict[str, Any]) -> None:
+        self._insert_memories([{"user_id": user_id, "namespace": namespace, "kind": kind, "payload": payload}])
+
+    def _insert_memories(self, entries: List[Dict[str, Any]], strict: bool = False) -> None:
+        """批量写入记忆文档（一次 bulk_write），随后批量写入向量"""
+        if not entries:
+            return
         now = datetime.utcnow()
-        memory_key = self._memory_key(namespace, payload)
-        self.collection.update_one(
-            {"userId": user_id, "namespace": namespace, "memory_key": memory_key},
-            {
-                "$set": {
-                    "userId": user_id,
-                    "namespace": namespace,
-                    "kind": kind,
-                    "memory_key": memory_key,
-                    "payload": payload,
-                    "updated_at": now,
-                },
-                "$setOnInsert": {"created_at": now},
-            },
-            upsert=True,
-        )
-        self._upsert_vector_memory(user_id, namespace, kind, memory_key, payload)
+        operations = []
+        for entry in entries:
+            entry["memory_key"] = self._memory_key(entry["namespace"], entry["payload"])
+            operations.append(
+                UpdateOne(
+                    {"userId": entry["user_id"], "namespace": entry["namespace"], "memory_key": entry["memory_key"]},
+                    {
+                        "$set": {
+                            "userId": entry["user_id"],
+                            "namespace": entry["namespace"],
+                            "kind": entry["kind"],
+                            "memory_key": entry["memory_key"],
+                            "payload": entry["payload"],
+                            "updated_at": now,
+                        },
+                        "$setOnInsert": {"created_at": now},
+                    },
+                    upsert=True,
+                )
+            )
+        self.collection.bulk_write(operations, ordered=False)
+        self._upsert_vector_memories(entries, strict=strict)
 
     def _find_latest_by_namespace(self, user_id: str, namespace: str) -> Optional[Dict[str, Any]]:
         return self.collection.find_one({"userId": user_id, "namespace": namespace}, sort=[("updated_at", DESCENDING)])
 
     # --- task_memory ---
 
-    def add_task_memory(self, user_id: str, task_summary: str, task_spec: Dict[str, Any]):
+    def _task_memory_entry(self, user_id: str, task_summary: str, task_spec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         if not user_id or not self._is_meaningful_task_spec(task_spec):
-            return
-        self._insert_memory(
-            user_id,
-            "task_memory",
-            "task_memory",
-            {
+            return None
+        return {
+            "user_id": user_id,
+            "namespace": "task_memory",
+            "kind": "task_memory",
+            "payload": {
                 "summary": task_summary,
                 "task_spec": task_spec,
             },
-        )
-        self.update_user_snapshot(user_id)
+        }
+
+    def add_task_memory(self, user_id: str, task_summary: str, task_spec: Dict[str, Any]):
+        entry = self._task_memory_entry(user_id, task_summary, task_spec)
+        if entry:
+            self.add_memories([entry])
 
     def retrieve_task_memory(self, user_id: str, query: str, limit: int = 3) -> List[Dict[str, Any]]:
         semantic_results = self._semantic_search_memory(user_id, "task_memory", query, limit)
@@ -508,21 +694,52 @@ class Store:
 
     # --- model_memory ---
 
-    def add_model_memory(self, user_id: str, model_md5: str, model_name: str, reason: str = None, success: bool = True):
+    def _model_memory_entry(
+        self, user_id: str, model_md5: str, model_name: str, reason: str = None, success: bool = True
+    ) -> Optional[Dict[str, Any]]:
         if not user_id or not self._normalize_text(model_md5):
-            return
-        self._insert_memory(
-            user_id,
-            "model_memory",
-            "model_memory",
-            {
+            return None
+        return {
+            "user_id": user_id,
+            "namespace": "model_memory",
+            "kind": "model_memory",
+            "payload": {
                 "model_md5": model_md5,
                 "model_name": model_name,
                 "reason": reason,
                 "success": bool(success),
             },
-        )
-        self.update_user_snapshot(user_id)
+        }
+
+    def add_model_memory(self, user_id: str, model_md5: str, model_name: str, reason: str = None, success: bool = True):
+        entry = self._model_memory_entry(user_id, model_md5, model_name, reason, success)
+        if entry:
+            self.add_memories([entry])
+
+    def add_memories(self, entries: List[Dict[str, Any]]) -> None:
+        """批量写入 task/model 记忆并更新用户画像计数
+
+        entries 由 _task_memory_entry / _model_memory_entry 构造，供后台写入队列批量落盘。
+        向量写入失败时直接抛出（文档与向量写入均为幂等 upsert），画像计数在全部写入成功后才累加，
+        因此队列重试不会重复计数。
+        """
+        entries = [entry for entry in entries if entry]
+        if not entries:
+            return
+        self._insert_memories(entries, strict=True)
+        for entry in entries:
+            payload = entry["payload"]
+            if entry["namespace"] == "task_memory":
+                task_spec = payload.get("task_spec") or {}
+                self._record_snapshot_event(
+                    entry["user_id"],
+                    "tasks",
+                    {category: task_spec.get(field) for category, (field, _) in _SNAPSHOT_TASK_FIELDS.items()},
+                )
+            else:
+                self._record_snapshot_event(entry["user_id"], "models", {"models": payload.get("model_name")})
+        for user_id in dict.fromkeys(entry["user_id"] for entry in entries):
+            self._schedule_snapshot_refresh(user_id)
 
     def retrieve_model_memory(self, user_id: str, query: str, limit: int = 3) -> List[Dict[str, Any]]:
         semantic_results = self._semantic_search_memory(user_id, "model_memory", query, limit)
@@ -560,37 +777,134 @@ class Store:
                 break
         return merged
 
-    def update_user_snapshot(self, user_id: str) -> Dict[str, Any]:
-        task_docs = list(
-            self.collection.find({"userId": user_id, "namespace": "task_memory"})
-            .sort("updated_at", -1)
-            .limit(50)
-        )
-        model_docs = list(
-            self.collection.find({"userId": user_id, "namespace": "model_memory"})
-            .sort("updated_at", -1)
-            .limit(30)
-        )
+    # --- user_snapshot ---
+
+    def _snapshot_value_key(self, value: Any) -> Optional[str]:
+        """画像候选值的计数键：规范化后取短哈希，可安全用作 MongoDB 字段名"""
+        normalized = self._normalize_text(value)
+        if not normalized:
+            return None
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
 
-        def top_values(values: List[str], limit: int = 5) -> List[str]:
-            counts: Dict[str, float] = {}
-            for index, value in enumerate(values):
-                normalized = self._normalize_text(value)
-                if not normalized:
+    @staticmethod
+    def _snapshot_decay_weight(at: datetime, epoch: datetime) -> float:
+        """事件在 epoch 基准下的权重：每经过一个半衰期翻倍，等价于旧事件按半衰期衰减"""
+        elapsed_days = (at - epoch).total_seconds() / 86400.0
+        return 2.0 ** (elapsed_days / USER_SNAPSHOT_HALF_LIFE_DAYS)
+
+    def _snapshot_counters_filter(self, user_id: str) -> Dict[str, Any]:
+        return {"userId": user_id, "namespace": SNAPSHOT_COUNTERS_NAMESPACE}
+
+    def _record_snapshot_event(self, user_id: str, sample_key: str, values: Dict[str, Any], _retry: bool = True) -> None:
+        """O(1) 更新用户画像的衰减计数：一次读取基准时间 + 一次原子 $inc"""
+        now = datetime.utcnow()
+        try:
+            counters_doc = self.collection.find_one(self._snapshot_counters_filter(user_id), {"decay_epoch": 1})
+            epoch = (counters_doc or {}).get("decay_epoch") or now
+            weight = self._snapshot_decay_weight(now, epoch)
+
+            # version 供全量重建做比较并交换，重建期间有新事件时重建结果作废
+            inc: Dict[str, Any] = {f"sample_size.{sample_key}": 1, "version": 1}
+            set_fields: Dict[str, Any] = {"updated_at": now}
+            for category, value in values.items():
+                value_key = self._snapshot_value_key(value)
+                if not value_key:
                     continue
-                counts[value] = counts.get(value, 0.0) + 1.0 / (1 + index * 0.15)
-            return [item[0] for item in sorted(counts.items(), key=lambda x: x[1], reverse=True)[:limit]]
+                inc[f"counters.{category}.{value_key}.score"] = weight
+                set_fields[f"counters.{category}.{value_key}.value"] = str(value).strip()
 
-        task_payloads = [doc.get("payload") or {} for doc in task_docs]
-        model_payloads = [doc.get("payload") or {} for doc in model_docs]
-        task_specs = [payload.get("task_spec") or {} for payload in task_payloads]
+            query = self._snapshot_counters_filter(user_id)
+            if counters_doc:
+                # 与重新定基互斥：基准时间已变化时本次更新不生效，按新基准重试一次
+                query["decay_epoch"] = epoch
+            result = self.collection.update_one(
+                query,
+                {
+                    "$inc": inc,
+                    "$set": set_fields,
+                    "$setOnInsert": {
+                        "kind": SNAPSHOT_COUNTERS_NAMESPACE,
+                        "decay_epoch": epoch,
+                        "seeded": False,
+                        "created_at": now,
+                    },
+                },
+                upsert=counters_doc is None,
+            )
+            if counters_doc and result.matched_count == 0 and _retry:
+                self._record_snapshot_event(user_id, sample_key, values, _retry=False)
+        except DuplicateKeyError:
+            # 并发的首次事件已建好计数文档，按已有文档的基准重试一次
+            if _retry:
+                self._record_snapshot_event(user_id, sample_key, values, _retry=False)
+        except Exception as e:
+            logging.warning(f"User snapshot counter update failed: {str(e)[:100]}")
+
+    def _schedule_snapshot_refresh(self, user_id: str) -> None:
+        if USER_SNAPSHOT_REFRESH_DELAY_SECONDS <= 0:
+            self.refresh_user_snapshot(user_id)
+            return
+        get_snapshot_refresher().schedule(user_id)
+
+    def _rebase_snapshot_counters(self, doc: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        """基准时间过旧时整体缩放计数并裁剪低分候选值，返回更新后的 counters"""
+        epoch = doc.get("decay_epoch") or now
+        counters: Dict[str, Dict[str, Any]] = doc.get("counters") or {}
+        elapsed_half_lives = (now - epoch).total_seconds() / 86400.0 / USER_SNAPSHOT_HALF_LIFE_DAYS
+        oversized = any(len(entries) > _SNAPSHOT_MAX_TRACKED_VALUES for entries in counters.values())
+        if elapsed_half_lives < _SNAPSHOT_REBASE_HALF_LIVES and not oversized:
+            return counters
+
+        factor = 1.0 / self._snapshot_decay_weight(now, epoch) if elapsed_half_lives >= _SNAPSHOT_REBASE_HALF_LIVES else 1.0
+        new_epoch = now if factor != 1.0 else epoch
+        mul: Dict[str, float] = {}
+        unset: Dict[str, str] = {}
+        rebased: Dict[str, Dict[str, Any]] = {}
+        for category, entries in counters.items():
+            ranked = sorted(entries.items(), key=lambda item: float((item[1] or {}).get("score") or 0.0), reverse=True)
+            kept = dict(ranked[:_SNAPSHOT_MAX_TRACKED_VALUES])
+            for value_key, _ in ranked[_SNAPSHOT_MAX_TRACKED_VALUES:]:
+                unset[f"counters.{category}.{value_key}"] = ""
+            for value_key, entry in kept.items():
+                if factor != 1.0:
+                    mul[f"counters.{category}.{value_key}.score"] = factor
+                rebased.setdefault(category, {})[value_key] = {
+                    "value": (entry or {}).get("value"),
+                    "score": float((entry or {}).get("score") or 0.0) * factor,
+                }
 
-        active_domains = top_values([spec.get("Domain") for spec in task_specs])
-        recent_targets = top_values([spec.get("Target_object") for spec in task_specs])
-        spatial = top_values([spec.get("Spatial_scope") for spec in task_specs], limit=3)
-        temporal = top_values([spec.get("Temporal_scope") for spec in task_specs], limit=3)
-        resolutions = top_values([spec.get("Resolution_requirements") for spec in task_specs], limit=3)
-        model_preferences = top_values([payload.get("model_name") for payload in model_payloads])
+        update: Dict[str, Any] = {"$set": {"decay_epoch": new_epoch}}
+        if mul:
+            update["$mul"] = mul
+        if unset:
+            update["$unset"] = unset
+        self.collection.update_one({"_id": doc["_id"], "decay_epoch": epoch}, update)
+        return rebased
+
+    def _render_user_snapshot(self, counters: Dict[str, Dict[str, Any]], sample_size: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        由衰减计数渲染画像 payload（所有计数共享同一基准，直接按分值排序）
+
+        sample_size 的含义与旧版不同：旧版是本次重建读取的最近记忆条数（最多 50 / 30），
+        现在是播种时读取的条数加上此后增量记录的事件数，即参与计数的累计事件数，不随窗口截断。
+        """
+
+        def top_values(category: str, limit: int) -> List[str]:
+            entries = (counters.get(category) or {}).values()
+            ranked = sorted(
+                (entry for entry in entries if entry and entry.get("value")),
+                key=lambda entry: float(entry.get("score") or 0.0),
+                reverse=True,
+            )
+            return [entry["value"] for entry in ranked[:limit]]
+
+        limits = {category: limit for category, (_, limit) in {**_SNAPSHOT_TASK_FIELDS, **_SNAPSHOT_MODEL_FIELDS}.items()}
+        active_domains = top_values("domains", limits["domains"])
+        recent_targets = top_values("targets", limits["targets"])
+        spatial = top_values("spatial", limits["spatial"])
+        temporal = top_values("temporal", limits["temporal"])
+        resolutions = top_values("resolutions", limits["resolutions"])
+        model_preferences = top_values("models", limits["models"])
 
         pattern_parts = []
         if spatial:
@@ -608,19 +922,117 @@ class Store:
         if model_preferences:
             summary_parts.append("常用模型包括" + "、".join(model_preferences[:3]))
 
-        payload = {
+        return {
             "summary": "；".join(summary_parts) if summary_parts else "暂无稳定画像",
             "active_domains": active_domains,
             "recent_targets": recent_targets,
             "spatiotemporal_patterns": pattern_parts,
             "model_preferences": model_preferences,
             "sample_size": {
-                "tasks": len(task_docs),
-                "models": len(model_docs),
+                "tasks": int((sample_size or {}).get("tasks") or 0),
+                "models": int((sample_size or {}).get("models") or 0),
             },
         }
+
+    def _persist_user_snapshot(self, user_id: str, payload: Dict[str, Any]) -> None:
         self._upsert_namespaced_doc(user_id, "user_snapshot", "user_snapshot", payload)
         self._upsert_vector_memory(user_id, "user_snapshot", "user_snapshot", f"user_snapshot:{user_id}", payload)
+
+    def update_user_snapshot(self, user_id: str, _attempts: int = 3) -> Dict[str, Any]:
+        """
+        全量重建用户画像：按最近记忆重新播种衰减计数（首次或计数缺失时使用）
+
+        重建期间 _record_snapshot_event 仍可能 $inc 计数，写回时按 version 比较并交换；
+        version 变化说明有新事件，重新读取记忆再重建，避免覆盖掉这些增量。
+        """
+        now = datetime.utcnow()
+        query = self._snapshot_counters_filter(user_id)
+        try:
+            self.collection.update_one(
+                query,
+                {
+                    "$setOnInsert": {
+                        "kind": SNAPSHOT_COUNTERS_NAMESPACE,
+                        "decay_epoch": now,
+                        "seeded": False,
+                        "version": 0,
+                        "created_at": now,
+                    },
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # 并发写入已插入计数文档
+            pass
+        before = self.collection.find_one(query, {"version": 1}) or {}
+        version = before.get("version", 0)
+
+        task_docs = list(
+            self.collection.find({"userId": user_id, "namespace": "task_memory"})
+            .sort("updated_at", -1)
+            .limit(50)
+        )
+        model_docs = list(
+            self.collection.find({"userId": user_id, "namespace": "model_memory"})
+            .sort("updated_at", -1)
+            .limit(30)
+        )
+
+        counters: Dict[str, Dict[str, Any]] = {}
+
+        def accumulate(docs: List[Dict[str, Any]], fields: Dict[str, Any], task: bool) -> None:
+            for doc in docs:
+                payload = doc.get("payload") or {}
+                source = (payload.get("task_spec") or {}) if task else payload
+                weight = self._snapshot_decay_weight(doc.get("updated_at") or now, now)
+                for category, (field, _) in fields.items():
+                    value = source.get(field)
+                    value_key = self._snapshot_value_key(value)
+                    if not value_key:
+                        continue
+                    entry = counters.setdefault(category, {}).setdefault(value_key, {"value": str(value).strip(), "score": 0.0})
+                    entry["score"] += weight
+
+        accumulate(task_docs, _SNAPSHOT_TASK_FIELDS, task=True)
+        accumulate(model_docs, _SNAPSHOT_MODEL_FIELDS, task=False)
+        sample_size = {"tasks": len(task_docs), "models": len(model_docs)}
+
+        # 旧文档没有 version 字段，按缺失匹配
+        version_filter = {"version": version} if "version" in before else {"version": {"$exists": False}}
+        result = self.collection.update_one(
+            {**query, **version_filter},
+            {
+                "$set": {
+                    "userId": user_id,
+                    "namespace": SNAPSHOT_COUNTERS_NAMESPACE,
+                    "kind": SNAPSHOT_COUNTERS_NAMESPACE,
+                    "counters": counters,
+                    "sample_size": sample_size,
+                    "decay_epoch": now,
+                    "seeded": True,
+                    "updated_at": now,
+                },
+                "$inc": {"version": 1},
+            },
+        )
+        if result.matched_count == 0:
+            if _attempts > 1:
+                return self.update_user_snapshot(user_id, _attempts=_attempts - 1)
+            # 事件持续写入时放弃覆盖，画像由后续的去抖刷新按增量计数渲染
+            logging.warning(f"User snapshot rebuild skipped after concurrent updates: {user_id}")
+
+        payload = self._render_user_snapshot(counters, sample_size)
+        self._persist_user_snapshot(user_id, payload)
+        return payload
+
+    def refresh_user_snapshot(self, user_id: str) -> Dict[str, Any]:
+        """由增量计数重新渲染画像并重新向量化（后台去抖执行）"""
+        doc = self.collection.find_one(self._snapshot_counters_filter(user_id))
+        if not doc or not doc.get("seeded"):
+            return self.update_user_snapshot(user_id)
+        counters = self._rebase_snapshot_counters(doc, datetime.utcnow())
+        payload = self._render_user_snapshot(counters, doc.get("sample_size") or {})
+        self._persist_user_snapshot(user_id, payload)
         return payload
 
     def retrieve_user_snapshot(self, user_id: str, query: str = "") -> Dict[str, Any]:
@@ -632,3 +1044,36 @@ class Store:
         if doc:
             return self._doc_payload_with_meta(doc, 0.0)
         return self.update_user_snapshot(user_id)
+
+
+_snapshot_refresher: Optional[DebouncedRefresher] = None
+_snapshot_refresher_lock = threading.Lock()
+
+
+def get_snapshot_refresher() -> DebouncedRefresher:
+    """进程内共享的用户画像刷新器，后台线程复用同一个 Store 连接"""
+    global _snapshot_refresher
+    with _snapshot_refresher_lock:
+        if _snapshot_refresher is None:
+            worker_store: Dict[str, Store] = {}
+
+            def refresh(user_id: str) -> None:
+                store = worker_store.get("store")
+                if store is None:
+                    store = worker_store["store"] = Store()
+                store.refresh_user_snapshot(user_id)
+
+            _snapshot_refresher = DebouncedRefresher(
+                refresh,
+                delay_seconds=USER_SNAPSHOT_REFRESH_DELAY_SECONDS,
+                name="user-snapshot-refresher",
+            )
+        return _snapshot_refresher
+
+
+def shutdown_snapshot_refresher() -> None:
+    """停止后台刷新线程，并同步执行尚未到期的画像刷新"""
+    with _snapshot_refresher_lock:
+        refresher = _snapshot_refresher
+    if refresher is not None:
+        refresher.stop(flush=True)
@@ -0,0 +1,156 @@
+"""
+记忆向量检索布局基准：单集合 expr 过滤 vs userId partition key
+
+在 Milvus 中分别建立两种布局的临时集合，写入合成记忆后对随机用户执行
+userId + namespace 过滤检索，输出不同数据规模下的延迟分位数。
+
+使用方式（在 evaluation 目录下）:
+  python bench_memory_partition.py --sizes 10000 100000 1000000 --users 2000 --queries 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from pymilvus import connections, utility
+
+import config as cfg
+
+# 评测脚本以 evaluation/ 为工作目录运行，补充 intelligent-server 根目录以复用 agents 下的公共模块
+SERVER_ROOT = Path(__file__).resolve().parents[1]
+if str(SERVER_ROOT) not in sys.path:
+    sys.path.insert(0, str(SERVER_ROOT))
+
+from agents.memory_collection import create_memory_collection, memory_primary_key
+
+NAMESPACES = ["task_memory", "model_memory", "user_snapshot"]
+ALIAS = "memory_bench"
+
+
+def _synthetic_rows(rng: np.random.Generator, start: int, count: int, users: int, dim: int) -> List[Dict[str, Any]]:
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # 用户活跃度服从长尾分布，更接近真实记忆分布
+    user_ids = rng.zipf(1.3, size=count) % users
+    namespaces = rng.integers(0, len(NAMESPACES), size=count)
+    rows = []
+    for offset in range(count):
+        user_id = f"user-{int(user_ids[offset])}"
+        namespace = NAMESPACES[int(namespaces[offset])]
+        memory_key = f"m{start + offset}"
+        rows.append({
+            "memory_id": memory_primary_key(user_id, namespace, memory_key),
+            "memory_key": memory_key,
+            "userId": user_id,
+            "namespace": namespace,
+            "kind": namespace,
+            "text": "",
+            "payload_json": "{}",
+            "embedding": vectors[offset].tolist(),
+        })
+    return rows
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 2) if values else 0.0
+
+
+def bench_layout(
+    size: int,
+    partition_key: bool,
+    users: int,
+    dim: int,
+    queries: int,
+    top_k: int,
+    batch_size: int,
+    seed: int,
+) -> Dict[str, Any]:
+    name = f"bench_memory_{'pk' if partition_key else 'flat'}_{size}"
+    if utility.has_collection(name, using=ALIAS):
+        utility.drop_collection(name, using=ALIAS)
+    collection = create_memory_collection(name, dim, using=ALIAS, partition_key=partition_key)
+
+    rng = np.random.default_rng(seed)
+    load_started = time.perf_counter()
+    for start in range(0, size, batch_size):
+        collection.insert(_synthetic_rows(rng, start, min(batch_size, size - start), users, dim))
+    collection.flush()
+    collection.load()
+    load_seconds = time.perf_counter() - load_started
+
+    query_rng = np.random.default_rng(seed + 1)
+    latencies: List[float] = []
+    for _ in range(queries):
+        user_id = f"user-{int(query_rng.zipf(1.3) % users)}"
+        namespace = NAMESPACES[int(query_rng.integers(0, len(NAMESPACES)))]
+        vector = query_rng.standard_normal(dim).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        started = time.perf_counter()
+        collection.search(
+            data=[vector.tolist()],
+            anns_field="embedding",
+            param={"metric_type": "COSINE", "params": {"ef": 64}},
+            limit=top_k,
+            expr=f'userId == "{user_id}" && namespace == "{namespace}"',
+            output_fields=["memory_key"],
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    collection.release()
+    utility.drop_collection(name, using=ALIAS)
+    return {
+        "size": size,
+        "layout": "partition_key" if partition_key else "filtered",
+        "load_seconds": round(load_seconds, 1),
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+        "mean_ms": round(float(np.mean(latencies)), 2) if latencies else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark filtered memory search: flat filter vs userId partition key")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=int(os.getenv("MEMORY_EMBEDDING_DIM", "1024")))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    connections.connect(alias=ALIAS, host=cfg.MILVUS_HOST, port=cfg.MILVUS_PORT)
+    results = []
+    for size in args.sizes:
+        for partition_key in (False, True):
+            result = bench_layout(
+                size=size,
+                partition_key=partition_key,
+                users=args.users,
+                dim=args.dim,
+                queries=args.queries,
+                top_k=args.top_k,
+                batch_size=args.batch_size,
+                seed=args.seed,
+            )
+            results.append(result)
+            print(
+                f"{result['size']:>9} {result['layout']:<14} "
+                f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                f"(load {result['load_seconds']}s)"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,6 @@ RAG 检索策略实现
 
 import time
 import logging
-import math
 import os
 from typing import List, Dict, Any, Tuple, Optional
 from abc import ABC, abstractmethod
@@ -169,20 +168,6 @@ class NoRAGStrategy(RAGStrategy):
 class VectorOnlyStrategy(RAGStrategy):
     """仅使用向量检索"""
     
-    def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """计算向量余弦相似度"""
-        if not vec1 or not vec2 or len(vec1) != len(vec2):
-            return 0.0
-        
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        magnitude1 = math.sqrt(sum(a ** 2 for a in vec1))
-        magnitude2 = math.sqrt(sum(b ** 2 for b in vec2))
-        
-        if magnitude1 == 0 or magnitude2 == 0:
-            return 0.0
-        
-        return dot_product / (magnitude1 * magnitude2)
-    
     def retrieve(self, query: str, top_k: int = 10) -> Tuple[List[str], Dict[str, Any]]:
         """使用 Milvus Dense-only 检索，不再扫描 MongoDB。"""
         llm_client = self.get_llm_client()
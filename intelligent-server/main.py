@@ -1,11 +1,29 @@
 import os
 from fastapi import Depends, FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from agents.model_recommend.graph import agent, ModelState
+from agents.model_recommend.tools import get_db as get_model_db, get_local_index, get_milvus_client, get_milvus_collection, get_retrieval_cache, invalidate_model_search_cache
+from agents.model_recommend.local_index import MODEL_LOCAL_INDEX_EXPORT_INTERVAL_SECONDS, PeriodicExporter
+from agents.model_recommend.rerank import warmup_reranker
 from agents.alignment.graph import alignment_agent, AlignmentState
-from agents.data_scan.graph import DataScanState, data_scan_agent
+from agents.data_scan.graph import DataScanState, data_scan_agent, normalize_scan_mode
 from agents.triangle_coordinator import get_coordinator
+from agents.memory_writer import memory_writer_metrics, shutdown_memory_writer
+from agents.store import get_snapshot_refresher, shutdown_snapshot_refresher
+from agents.checkpoint_maintenance import (
+    checkpoint_metrics,
+    get_checkpoint_maintainer,
+    schedule_checkpoint_compaction,
+    shutdown_checkpoint_compactor,
+)
+from agents.model_recommend.tool_result_store import get_tool_result_store
+from agents.model_recommend.summarizer import get_summarizer
+from agents.sse_encoder import SSE_TOKEN_BATCH_MS, TOKEN_FLUSH, SSEEncoder, resolve_compression, with_token_flush
+from agents.data_watcher import data_watch_metrics, start_data_watchers, stop_data_watchers
+from agents.data_scan.crs import crs_cache_metrics
+from agents.data_scan.profile_summary import get_source_detail_store, load_source_details
+from agents.data_scan.semantic_cache import get_semantic_cache
 from langchain.messages import HumanMessage, AIMessageChunk, AnyMessage
 from typing import Any, Dict, List, Optional
 import uuid
@@ -36,6 +54,98 @@ mongo_client = MongoClient(MONGO_URI)
 mongo_db = mongo_client[MONGO_DB_NAME]
 
 
+MILVUS_WARMUP_ON_STARTUP = os.getenv("MILVUS_WARMUP_ON_STARTUP", "true").strip().lower() not in {"0", "false", "no", "off"}
+local_index_exporter = (
+    PeriodicExporter(get_milvus_collection, MODEL_LOCAL_INDEX_EXPORT_INTERVAL_SECONDS, on_export=lambda: get_local_index().refresh(force=True))
+    if MODEL_LOCAL_INDEX_EXPORT_INTERVAL_SECONDS > 0
+    else None
+)
+
+
+@app.on_event("startup")
+async def warmup_model_retrieval():
+    """启动时连接并 load 模型检索集合，避免首个请求承担冷启动延迟"""
+    client = get_milvus_client()
+    if MILVUS_WARMUP_ON_STARTUP:
+        ready = await asyncio.to_thread(client.warmup)
+        if not ready:
+            logger.warning("Milvus warmup failed; health monitor will keep retrying")
+    client.start_health_monitor()
+    await asyncio.to_thread(get_local_index().refresh, True)
+    await asyncio.to_thread(warmup_reranker)
+    if local_index_exporter is not None:
+        local_index_exporter.start()
+
+
+@app.on_event("startup")
+async def start_data_watch():
+    """监听 DATA_WATCH_DIRS 中的上传目录，增量重扫变化的文件"""
+    await start_data_watchers()
+
+
+@app.on_event("shutdown")
+async def stop_data_watch():
+    await stop_data_watchers()
+
+
+@app.on_event("shutdown")
+def flush_background_memory_work():
+    """进程退出前写完记忆队列，再完成待执行的用户画像刷新"""
+    shutdown_memory_writer()
+    shutdown_snapshot_refresher()
+    shutdown_checkpoint_compactor()
+    get_summarizer().shutdown(wait=True)
+    if local_index_exporter is not None:
+        local_index_exporter.stop()
+    get_milvus_client().close()
+
+
+@app.get("/health")
+def health():
+    """存活检查"""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def readiness():
+    """就绪检查：模型检索 Milvus 集合已连接并加载；Milvus 不可用但本地索引可用时为降级就绪"""
+    milvus = get_milvus_client().readiness()
+    local_index = get_local_index().status()
+    if milvus["ready"]:
+        status = "ready"
+    elif local_index["available"] and local_index["mode"] != "off":
+        status = "degraded"
+    else:
+        status = "not_ready"
+    return JSONResponse(
+        status_code=503 if status == "not_ready" else 200,
+        content={"status": status, "milvus": milvus, "local_index": local_index},
+    )
+
+
+@app.get("/metrics")
+def metrics():
+    """后台记忆写入队列与画像刷新器的运行指标"""
+    refresher = get_snapshot_refresher()
+    return {
+        "memory_writer": memory_writer_metrics(),
+        "snapshot_refresher": {
+            "pending": refresher.pending_count(),
+            "completed": refresher.completed,
+            "failed": refresher.failed,
+        },
+        "model_search_cache": get_retrieval_cache().stats(),
+        "model_local_index": get_local_index().status(),
+        "checkpoints": checkpoint_metrics(),
+        "message_summary": get_summarizer().metrics(),
+        "tool_result_blobs": get_tool_result_store(get_model_db).metrics(),
+        "data_watch": data_watch_metrics(),
+        "data_scan_semantic_cache": get_semantic_cache().metrics(),
+        "data_scan_source_details": get_source_detail_store().metrics(),
+        "data_scan_crs_cache": crs_cache_metrics(),
+    }
+
+
 def require_internal_agent_token(
     x_agent_token: Optional[str] = Header(default=None, alias="X-Agent-Token"),
 ):
@@ -46,6 +156,29 @@ def require_internal_agent_token(
         raise HTTPException(status_code=401, detail="Unauthorized agent request")
 
 
+@app.post("/api/agent/model-index/invalidate")
+def invalidate_model_index_cache(_: None = Depends(require_internal_agent_token)):
+    """模型 Milvus 集合重建索引后调用，使所有进程的检索缓存失效"""
+    invalidate_model_search_cache()
+    return {"status": "success"}
+
+
+@app.get("/api/agent/checkpoints/stats")
+def checkpoint_stats(
+    threadId: Optional[str] = None,
+    limit: int = 20,
+    _: None = Depends(require_internal_agent_token),
+):
+    """按会话统计检查点字节数（降序）"""
+    return {"threads": get_checkpoint_maintainer().thread_stats(threadId, limit)}
+
+
+@app.post("/api/agent/checkpoints/compact")
+async def compact_checkpoints(_: None = Depends(require_internal_agent_token)):
+    """全量压缩：每个会话只保留最近 CHECKPOINT_KEEP_LAST 个检查点"""
+    return await asyncio.to_thread(get_checkpoint_maintainer().compact_all)
+
+
 def verify_session_ownership(sessionId: Optional[str], userId: Optional[str]) -> tuple[str, str]:
     """验证 sessionId 是否属于当前 userId。"""
     if not sessionId or not userId:
@@ -79,6 +212,9 @@ async def stream_agent(
     query: str,
     sessionId: Optional[str] = None,
     userId: Optional[str] = Header(default=None, alias="X-User-ID"),
+    accept_encoding: Optional[str] = Header(default=None, alias="Accept-Encoding"),
+    sse_compression: Optional[str] = Header(default=None, alias="X-SSE-Compression"),
+    sse_token_batch_ms: Optional[float] = Header(default=None, alias="X-SSE-Token-Batch-Ms"),
     _: None = Depends(require_internal_agent_token),
 ):
     if sessionId:
@@ -91,6 +227,12 @@ async def stream_agent(
     # 使用 LangGraph checkpointer 的 thread_id
     thread_id = sessionId or str(uuid.uuid4())
     coordinator = get_coordinator()
+    summarizer = get_summarizer()
+    # 客户端可通过请求头调整 token 合并窗口与压缩方式
+    sse = SSEEncoder(
+        token_batch_ms=SSE_TOKEN_BATCH_MS if sse_token_batch_ms is None else sse_token_batch_ms,
+        compression=resolve_compression(sse_compression, accept_encoding),
+    )
 
     async def event_generator():
         request_id = str(uuid.uuid4())
@@ -113,7 +255,17 @@ async def stream_agent(
             "latest_user_query": query,
         }
 
+        # 本轮进行中时，后台摘要暂不写回该 thread；begin_turn 可能等待一次检查点写回，放到线程中执行
+        begin_turn = asyncio.ensure_future(asyncio.to_thread(summarizer.begin_turn, thread_id))
+
+        async def end_turn() -> None:
+            # 连接中断时 begin_turn 仍会在线程中完成，等它完成后再结束本轮；
+            # 执行器关闭后 end_turn 会同步写回检查点，同样不能放在事件循环上
+            await begin_turn
+            await asyncio.to_thread(summarizer.end_turn, thread_id)
+
         try:
+            await asyncio.shield(begin_turn)
             final_state: ModelState = {
                 "messages": [],
                 "Task_spec": {},
@@ -134,7 +286,7 @@ async def stream_agent(
             }
             model_detail_ready = False
 
-            async for mode, chunk in agent.astream(
+            stream = agent.astream(
                 init_input,
                 stream_mode=["messages", "updates", "custom"],
                 config={
@@ -142,7 +294,13 @@ async def stream_agent(
                         "thread_id": thread_id
                     }
                 }
-            ):
+            )
+            async for mode, chunk in with_token_flush(stream, sse):
+                if mode == TOKEN_FLUSH:
+                    # 合并窗口到期而下一个 chunk 未到达，直接发出已缓存的 token
+                    yield chunk
+                    continue
+
                 if mode == "messages":
                     # chunk 结构: (MessageChunk, metadata)
                     if isinstance(chunk, tuple):
@@ -168,9 +326,15 @@ async def stream_agent(
                         
                         content = extract_text(message_chunk.content)
                         if content:
-                            yield "data:" + json.dumps({'type': 'token', 'message': content}, ensure_ascii=False) + "\n\n"
+                            frame = sse.token(content)
+                            if frame:
+                                yield frame
 
                 elif mode == "updates":
+                    # 节点结束时先发出已缓存的 token，不等待下一个事件
+                    pending_tokens = sse.flush()
+                    if pending_tokens:
+                        yield pending_tokens
                     # 一般是节点名+小更新内容
                     if isinstance(chunk, dict):
                         final_state = merge_state(final_state, chunk)
@@ -186,18 +350,18 @@ async def stream_agent(
                                         task_spec=specific_spec
                                     )
                                     
-                                    yield "data:" + json.dumps({
+                                    yield sse.event({
                                         'type': 'task_spec_generated', 
                                         'data': specific_spec
-                                    }, ensure_ascii=False) + "\n\n"
+                                    })
 
                             # 处理recommend_model_node节点
                             elif node_name == "recommend_model_node":
                                 if node_output.get("candidate_selection_required"):
-                                    yield "data:" + json.dumps({
+                                    yield sse.event({
                                         "type": "candidate_selection_required",
                                         "data": node_output.get("candidate_options", []),
-                                    }, ensure_ascii=False) + "\n\n"
+                                    })
                                 # 获取messages列表
                                 messages = node_output.get("messages", [])
                                 if messages and len(messages) > 0:
@@ -208,17 +372,17 @@ async def stream_agent(
                                         for tool_call in last_msg.tool_calls:
                                             current_tool = tool_call.get('name', 'unknown')
 
-                                            yield "data:" + json.dumps({
+                                            yield sse.event({
                                                 'type': 'tool_call',
                                                 'tool': current_tool,
                                                 'message': f'工具开始执行: {current_tool}'
-                                            }, ensure_ascii=False) + "\n\n"
+                                            })
                                     else:
                                         # LLM 生成了最终结果
-                                        yield "data:" + json.dumps({
+                                        yield sse.event({
                                             'type': 'status',
                                             'message': 'LLM 生成推荐结果'
-                                        }, ensure_ascii=False) + "\n\n"
+                                        })
 
                             # 处理tool_node节点
                             elif node_name == "tool_node":
@@ -238,11 +402,11 @@ async def stream_agent(
                                         and tool_result.get("status") == "success"
                                     ):
                                         model_detail_ready = True
-                                    yield "data:" + json.dumps({
+                                    yield sse.event({
                                         "type": 'tool_result',
                                         "tool": tool_name,
                                         "data": tool_result
-                                    }, ensure_ascii=False) + "\n\n"
+                                    })
 
                             # 处理model_contract_node节点
                             elif node_name == "model_contract_node":
@@ -254,10 +418,10 @@ async def stream_agent(
                                         model_contract=model_contract
                                     )
                                     
-                                    yield "data:" + json.dumps({
+                                    yield sse.event({
                                         'type': 'model_contract_generated',
                                         'data': model_contract
-                                    }, ensure_ascii=False) + "\n\n"
+                                    })
 
                         continue
 
@@ -265,26 +429,34 @@ async def stream_agent(
 
                 elif mode == "custom":
                     # 工具内部通过 StreamWriter 发出的数据
-                    yield "data:" + json.dumps({
+                    yield sse.event({
                         'type': 'custom',
                         'data': chunk
-                    }, ensure_ascii=False) + "\n\n"
+                    })
             
+            schedule_checkpoint_compaction(thread_id)
             session = coordinator.get_session(thread_id)
-            yield "data:" + json.dumps({
+            yield sse.event({
                 'type': 'final',
                 'session_id': thread_id,
                 'phase': 'task_model_completed',
                 'has_task_spec': bool(session and session.task_spec),
                 'has_model_contract': bool(session and session.model_contract)
-            }, ensure_ascii=False) + "\n\n"
+            })
                 
         except Exception as e:
-            yield "data:" + json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False) + "\n\n"
+            yield sse.event({'type': 'error', 'message': str(e)})
+        finally:
+            await asyncio.shield(asyncio.ensure_future(end_turn()))
+
+        tail = sse.close()
+        if tail:
+            yield tail
 
     return StreamingResponse(
         event_generator(),
-        media_type="text/event-stream"
+        media_type="text/event-stream",
+        headers=sse.headers,
     )
 
 # ============= 数据分析辅助路由 =============
@@ -294,6 +466,8 @@ async def data_scan_stream_endpoint(
     file_path: str,
     session_id: Optional[str] = None,
     sessionId: Optional[str] = None,
+    scan_mode: Optional[str] = None,
+    profile_mode: Optional[str] = None,
     _: None = Depends(require_internal_agent_token),
 ):
     """
@@ -308,6 +482,8 @@ async def data_scan_stream_endpoint(
     Args:
         file_path: 待分析的文件路径
         session_id: 会话ID（可选）
+        scan_mode: full（默认）/ facts_only（跳过 LLM 语义补全）/ semantic_cached（画像未变化时复用语义）
+        profile_mode: auto（默认，数据源较多时汇总）/ full（保留逐文件明细）/ summary（多数据源时始终汇总）
         
     Returns:
         SSE 流，包含以下事件类型：
@@ -319,6 +495,7 @@ async def data_scan_stream_endpoint(
         - final: 最终结果
     """
     session_id = session_id or sessionId or str(uuid.uuid4())
+    scan_mode = normalize_scan_mode(scan_mode)
     coordinator = get_coordinator()
     
     async def event_generator():
@@ -332,7 +509,9 @@ async def data_scan_stream_endpoint(
                 "file_path": file_path,
                 "facts": {},
                 "profile": {},
-                "status": "processing"
+                "status": "processing",
+                "scan_mode": scan_mode,
+                "profile_mode": profile_mode,
             }
             
             # 流式调用 LangGraph Agent
@@ -417,6 +596,17 @@ async def data_scan_stream_endpoint(
                                             'type': 'status',
                                             'message': 'LLM 生成分析结果'
                                         }, ensure_ascii=False) + "\n\n"
+                                else:
+                                    # 语义补全完成（LLM 生成 / 复用缓存 / 跳过），节点不产生消息
+                                    semantic_source = (node_output.get("facts") or {}).get("semantic_source")
+                                    status_message = {
+                                        "cache": '复用已缓存的语义信息',
+                                        "skipped": '仅规则扫描，已跳过语义补全',
+                                    }.get(semantic_source, 'LLM 生成分析结果')
+                                    yield "data:" + json.dumps({
+                                        'type': 'status',
+                                        'message': status_message
+                                    }, ensure_ascii=False) + "\n\n"
                             
                             # 工具执行节点事件
                             elif node_name == "tool_node":
@@ -446,6 +636,8 @@ async def data_scan_stream_endpoint(
                 'type': 'final',
                 'profile': final_profile,
                 'session_id': session_id,
+                'scan_mode': scan_mode,
+                'semantic_source': (final_state.get("facts") or {}).get("semantic_source"),
                 'saved_to_session': True,
                 'data_profile_count': len(session.data_profiles)
             }, ensure_ascii=False) + "\n\n"
@@ -467,6 +659,21 @@ async def data_scan_stream_endpoint(
         }
     )
 
+
+@app.get("/api/agent/data-scan/source-details/{details_id}")
+def data_scan_source_details(
+    details_id: str,
+    group: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 100,
+    _: None = Depends(require_internal_agent_token),
+):
+    """按需读取汇总画像（Source_details.id）对应的逐文件明细，可按分组过滤并分页"""
+    details = load_source_details(details_id, group=group, offset=offset, limit=min(max(limit, 1), 1000))
+    if details is None:
+        raise HTTPException(status_code=404, detail="Source details not found or expired")
+    return details
+
 def merge_state(old, update):
     if old is None:
         return update or {}
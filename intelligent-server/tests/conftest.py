@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 测试从 intelligent-server 目录导入 agents 包
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
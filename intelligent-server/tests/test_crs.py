@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("pyproj")
+
+from agents.data_scan.crs import clear_crs_cache, crs_cache_metrics, crs_to_wkt, crs_tokens, resolve_crs
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    clear_crs_cache()
+    yield
+    clear_crs_cache()
+
+
+def test_resolve_crs_short_input_is_unknown():
+    assert resolve_crs("") == {"Name": "Unknown", "Wkt": ""}
+
+
+def test_resolve_crs_parses_epsg_and_keeps_original_wkt():
+    wkt = crs_to_wkt("EPSG:4326")
+    info = resolve_crs(wkt)
+    assert info["EPSG"] == "EPSG:4326"
+    assert info["Is_Projected"] is False
+    assert info["Wkt"] == wkt
+
+
+def test_resolve_crs_caches_by_normalized_wkt():
+    wkt = crs_to_wkt("EPSG:32650")
+    resolve_crs(wkt)
+    info = resolve_crs("\n  " + wkt + "  \n")
+    assert info["EPSG"] == "EPSG:32650"
+    assert crs_cache_metrics()["crs"]["hits"] == 1
+
+
+def test_resolve_crs_returns_independent_copies():
+    wkt = crs_to_wkt("EPSG:4326")
+    resolve_crs(wkt)["EPSG"] = "mutated"
+    assert resolve_crs(wkt)["EPSG"] == "EPSG:4326"
+
+
+def test_resolve_crs_parse_error():
+    info = resolve_crs("NOT A VALID WKT STRING")
+    assert info["Name"] == "Parse Error"
+
+
+def test_crs_tokens_match_string_and_dict_forms():
+    info = resolve_crs(crs_to_wkt("EPSG:4326"))
+    expected = crs_tokens("EPSG:4326")
+    assert "epsg:4326" in expected
+    assert "epsg:4326" in crs_tokens(info)
+
+
+def test_crs_tokens_fill_epsg_from_wkt():
+    tokens = crs_tokens({"Name": "custom", "Wkt": crs_to_wkt("EPSG:3857")})
+    assert "epsg:3857" in tokens
+
+
+def test_crs_tokens_unsupported_input():
+    assert crs_tokens(None) == frozenset()
+    assert crs_tokens(42) == frozenset()
@@ -0,0 +1,89 @@
+import json
+
+from agents.data_scan import format_sniffer
+from agents.data_scan.format_sniffer import (
+    JSON_ARRAY_OF_OBJECTS,
+    JSON_GEOJSON,
+    JSON_GEOJSON_SEQ,
+    JSON_INVALID,
+    JSON_NDJSON,
+    JSON_OTHER,
+    sniff_json,
+    sniff_magic,
+)
+
+
+def _write(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content if isinstance(content, bytes) else content.encode("utf-8"))
+    return str(path)
+
+
+def test_sniff_magic_known_containers():
+    assert sniff_magic(b"CDF\x01rest") == "netcdf"
+    assert sniff_magic(b"CDF\x02rest") == "netcdf"
+    assert sniff_magic(b"\x89HDF\r\n\x1a\nrest") == "hdf5"
+    assert sniff_magic(b"PK\x03\x04rest") == "zip"
+    assert sniff_magic(b"\x1f\x8brest") == "gzip"
+
+
+def test_sniff_magic_hdf5_user_block():
+    prefix = b"\x00" * 512 + b"\x89HDF\r\n\x1a\n" + b"\x00" * 16
+    assert sniff_magic(prefix) == "hdf5"
+
+
+def test_sniff_magic_unknown():
+    assert sniff_magic(b"a,b,c\n1,2,3\n") is None
+    assert sniff_magic(b"") is None
+
+
+def test_sniff_json_feature_collection(tmp_path):
+    path = _write(tmp_path, "a.json", json.dumps({"type": "FeatureCollection", "features": []}))
+    assert sniff_json(path)["kind"] == JSON_GEOJSON
+
+
+def test_sniff_json_features_before_type(tmp_path):
+    content = json.dumps({"features": [{"type": "Feature", "geometry": None, "properties": {}}]})
+    assert sniff_json(_write(tmp_path, "a.json", content))["kind"] == JSON_GEOJSON
+
+
+def test_sniff_json_array_of_objects(tmp_path):
+    path = _write(tmp_path, "a.json", json.dumps([{"a": 1}, {"a": 2}]))
+    assert sniff_json(path)["kind"] == JSON_ARRAY_OF_OBJECTS
+
+
+def test_sniff_json_ndjson_and_geojson_seq(tmp_path):
+    ndjson = _write(tmp_path, "a.jsonl", '{"a": 1}\n{"a": 2}\n{"a": 3}\n')
+    assert sniff_json(ndjson)["kind"] == JSON_NDJSON
+    seq = _write(tmp_path, "b.json", '{"type": "Feature", "properties": {}}\n{"type": "Feature", "properties": {}}\n')
+    assert sniff_json(seq)["kind"] == JSON_GEOJSON_SEQ
+
+
+def test_sniff_json_other_and_invalid(tmp_path):
+    assert sniff_json(_write(tmp_path, "a.json", json.dumps({"config": {"a": 1}})))["kind"] == JSON_OTHER
+    assert sniff_json(_write(tmp_path, "b.json", "not json"))["kind"] == JSON_INVALID
+
+
+def test_sniff_json_bom_is_ignored(tmp_path):
+    path = _write(tmp_path, "a.json", b"\xef\xbb\xbf" + json.dumps({"type": "FeatureCollection"}).encode())
+    assert sniff_json(path)["kind"] == JSON_GEOJSON
+
+
+def test_sniff_json_regex_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(format_sniffer, "ijson", None)
+    geojson = _write(tmp_path, "a.json", json.dumps({"type": "FeatureCollection", "features": []}))
+    result = sniff_json(geojson)
+    assert result == {"kind": JSON_GEOJSON, "method": "regex"}
+    assert sniff_json(_write(tmp_path, "b.json", "[{\"a\": 1}]"))["kind"] == JSON_ARRAY_OF_OBJECTS
+
+
+def test_sniff_json_regex_requires_geojson_structure(tmp_path, monkeypatch):
+    monkeypatch.setattr(format_sniffer, "ijson", None)
+    nested = _write(tmp_path, "a.json", json.dumps({"config": {"features": ["x"]}}))
+    assert sniff_json(nested)["kind"] == JSON_OTHER
+    nested_type = _write(tmp_path, "b.json", json.dumps({"config": {"type": "Feature"}}))
+    assert sniff_json(nested_type)["kind"] == JSON_OTHER
+    features = _write(tmp_path, "c.json", json.dumps({"features": [{"type": "Feature", "properties": {}}]}))
+    assert sniff_json(features)["kind"] == JSON_GEOJSON
+    feature = _write(tmp_path, "d.json", json.dumps({"type": "Feature", "geometry": None}))
+    assert sniff_json(feature)["kind"] == JSON_GEOJSON
@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+from agents.model_recommend.fusion import FUSION_RRF, fuse_results, normalize_score
+
+
+def _hit(md5, score):
+    return {"modelMd5": md5, "modelName": md5.upper(), "score": score}
+
+
+def test_normalize_score_matches_milvus_weighted_ranker():
+    assert normalize_score(1.0, "COSINE") == 1.0
+    assert normalize_score(-1.0, "cosine") == 0.0
+    assert normalize_score(0.0, "L2") == 1.0
+    assert normalize_score(0.0, "BM25") == 0.5
+    assert normalize_score(10.0, "BM25") == pytest.approx(0.5 + math.atan(10.0) / math.pi)
+
+
+def test_weighted_fusion_sums_normalized_scores_across_routes():
+    dense = [_hit("a", 0.9), _hit("b", 0.8)]
+    sparse = [_hit("b", 12.0), _hit("c", 3.0)]
+    results = fuse_results([dense, sparse], ["COSINE", "BM25"], [0.7, 0.3], top_k=3)
+
+    assert [hit["modelMd5"] for hit in results] == ["b", "a", "c"]
+    assert [hit["rank"] for hit in results] == [1, 2, 3]
+    expected_b = 0.7 * normalize_score(0.8, "COSINE") + 0.3 * normalize_score(12.0, "BM25")
+    assert results[0]["score"] == pytest.approx(expected_b)
+    assert results[0]["modelName"] == "B"
+
+
+def test_rrf_fusion_uses_rank_positions_only():
+    dense = [_hit("a", 0.1), _hit("b", 0.9)]
+    sparse = [_hit("b", 0.0)]
+    results = fuse_results([dense, sparse], ["COSINE", "BM25"], [1.0, 1.0], top_k=2, fusion=FUSION_RRF, rrf_k=60)
+
+    assert [hit["modelMd5"] for hit in results] == ["b", "a"]
+    assert results[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert results[1]["score"] == pytest.approx(1 / 61)
+
+
+def test_failed_route_falls_back_to_remaining_route():
+    sparse = [_hit("c", 3.0), {"modelName": "no key", "score": 9.0}, _hit("d", 1.0)]
+    results = fuse_results([None, sparse], ["COSINE", "BM25"], [0.7, 0.3], top_k=1)
+
+    assert [hit["modelMd5"] for hit in results] == ["c"]
+    assert fuse_results([None, []], ["COSINE", "BM25"], [0.7, 0.3], top_k=5) == []
@@ -0,0 +1,71 @@
+import json
+
+from agents import memory_writer
+from agents.memory_writer import MemoryWriter
+
+
+class _FlakyStore:
+    def __init__(self, failures):
+        self.failures = failures
+        self.written = []
+
+    def _task_memory_entry(self, user_id, task_summary, task_spec):
+        return {"userId": user_id, "summary": task_summary}
+
+    def add_memories(self, entries):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("mongo unavailable")
+        self.written.extend(entries)
+
+
+def _writer(store, tmp_path, max_retries=2):
+    return MemoryWriter(
+        store_factory=lambda: store,
+        flush_interval=0.01,
+        max_retries=max_retries,
+        dead_letter_file=str(tmp_path / "dead" / "letters.jsonl"),
+    )
+
+
+def _dead_letters(tmp_path):
+    path = tmp_path / "dead" / "letters.jsonl"
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_batch_is_retried_until_it_succeeds(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_writer.time, "sleep", lambda _: None)
+    store = _FlakyStore(failures=2)
+    writer = _writer(store, tmp_path)
+    assert writer.submit_task_memory("u1", "flood map", {})
+    writer.stop()
+
+    assert store.written == [{"userId": "u1", "summary": "flood map"}]
+    metrics = writer.metrics()
+    assert metrics["written"] == 1
+    assert metrics["retries"] == 2
+    assert metrics["dead_lettered"] == 0
+    assert _dead_letters(tmp_path) == []
+
+
+def test_batch_is_dead_lettered_after_max_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_writer.time, "sleep", lambda _: None)
+    writer = _writer(_FlakyStore(failures=10), tmp_path, max_retries=1)
+    writer.submit_task_memory("u1", "flood map", {})
+    writer.stop()
+
+    records = _dead_letters(tmp_path)
+    assert [record["task_summary"] for record in records] == ["flood map"]
+    assert records[0]["error"] == "mongo unavailable"
+    assert writer.metrics()["dead_lettered"] == 1
+
+
+def test_submit_after_stop_goes_to_dead_letter(tmp_path):
+    writer = _writer(_FlakyStore(failures=0), tmp_path)
+    writer.stop()
+
+    assert not writer.submit_task_memory("u1", "late", {})
+    assert not writer.metrics()["running"]
+    assert [record["error"] for record in _dead_letters(tmp_path)] == ["writer stopped"]
@@ -0,0 +1,47 @@
+from agents.data_scan.profile_summary import group_sources
+
+
+def _raster(name, epsg="EPSG:4326", x=0.1, year=None, extent=None, status="ok"):
+    return {
+        "file_path": f"/data/{name}",
+        "form": "Raster",
+        "spatial": {"Crs": {"EPSG": epsg, "Wkt": "GEOGCS[...]"}, "Extent": extent},
+        "resolution": {"x": x, "y": x},
+        "Data_Type": "float32",
+        "temporal": {"Has_time": False, "Years": [year] if year else []},
+        "quality": {"status": status, "issues": ["nodata_present"] if status != "ok" else []},
+    }
+
+
+def test_group_sources_groups_homogeneous_sources():
+    sources = [_raster(f"tile_{i}.tif", year=2000 + i % 2) for i in range(10)] + [_raster("utm.tif", epsg="EPSG:32650")]
+    groups, details = group_sources(sources)
+    assert [group["count"] for group in groups] == [10, 1]
+    assert groups[0]["temporal"] == {"Has_time": True, "Years": [2000, 2001]}
+    assert len(details[groups[0]["group"]]) == 10
+    assert details[groups[1]["group"]][0]["file_path"] == "/data/utm.tif"
+
+
+def test_group_sources_tolerates_float_noise_in_resolution():
+    groups, _ = group_sources([_raster("a.tif", x=0.1), _raster("b.tif", x=0.1 + 1e-12)])
+    assert len(groups) == 1
+
+
+def test_group_sources_unions_extent_and_counts_quality():
+    sources = [
+        _raster("a.tif", extent={"min_x": 0, "min_y": 0, "max_x": 1, "max_y": 1}),
+        _raster("b.tif", extent={"min_x": -1, "min_y": 0.5, "max_x": 0.5, "max_y": 2}, status="warning"),
+    ]
+    groups, _ = group_sources(sources)
+    group = groups[0]
+    assert group["spatial"]["Extent"] == {"min_x": -1, "min_y": 0, "max_x": 1, "max_y": 2}
+    # 汇总中的 CRS 不保留 WKT
+    assert group["spatial"]["Crs"] == {"EPSG": "EPSG:4326"}
+    assert group["quality"]["status_counts"] == {"ok": 1, "warning": 1}
+    assert group["quality"]["top_issues"] == [{"issue": "nodata_present", "count": 1}]
+    assert group["sample_files"] == ["a.tif", "b.tif"]
+
+
+def test_group_sources_skips_non_dict_entries():
+    groups, details = group_sources([None, "x", _raster("a.tif")])
+    assert len(groups) == 1 and len(details) == 1
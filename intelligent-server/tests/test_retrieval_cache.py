@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+from agents.model_recommend import retrieval_cache
+from agents.model_recommend.retrieval_cache import RetrievalCache, TTLCache
+
+
+class _StateCollection:
+    def __init__(self):
+        self.version = 1
+        self.fail = False
+
+    def find_one(self, query, projection=None):
+        if self.fail:
+            raise RuntimeError("mongo unavailable")
+        return {"_id": query["_id"], "version": self.version}
+
+
+def _cache(state, entities):
+    return RetrievalCache(
+        "models",
+        db_getter=lambda: {retrieval_cache.MODEL_INDEX_STATE_COLLECTION: state},
+        entity_counter=lambda: entities["count"],
+        version_check_seconds=0,
+    )
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(retrieval_cache.time, "monotonic", lambda: now[0])
+    cache = TTLCache(max_size=2, ttl_seconds=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+
+def test_collection_version_change_clears_cached_results():
+    state, entities = _StateCollection(), {"count": 10}
+    cache = _cache(state, entities)
+    key = cache.make_key("Flood  Model", 5, (0.5, 0.5))
+    cache.set(key, [{"modelMd5": "m1"}])
+    assert cache.get(key) == [{"modelMd5": "m1"}]
+
+    state.version = 2
+    assert cache.make_key("flood model", 5, (0.5, 0.5)) != key
+    assert cache.get(key) is None
+
+
+def test_failed_lookups_keep_the_last_known_version():
+    state, entities = _StateCollection(), {"count": 10}
+    cache = _cache(state, entities)
+    key = cache.make_key("flood", 5, (1.0,))
+    cache.set(key, [{"modelMd5": "m1"}])
+
+    state.fail, entities["count"] = True, None
+    assert cache.make_key("flood", 5, (1.0,)) == key
+    assert cache.get(key) == [{"modelMd5": "m1"}]
+
+
+def test_invalidate_drops_results_and_rereads_version():
+    state, entities = _StateCollection(), {"count": 10}
+    cache = _cache(state, entities)
+    key = cache.make_key("flood", 5, (1.0,))
+    cache.set(key, [{"modelMd5": "m1"}])
+
+    cache.invalidate()
+    assert cache.get(key) is None
+    assert cache.stats()["collection_version"] is None
+    assert cache.make_key("flood", 5, (1.0,)) == key
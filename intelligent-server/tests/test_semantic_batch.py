@@ -0,0 +1,20 @@
+import pytest
+
+semantic_batch = pytest.importorskip("agents.data_scan.semantic_batch")
+pack_by_budget = semantic_batch.pack_by_budget
+
+
+def test_pack_by_budget_fills_packs_in_order():
+    sizes = [(0, 400), (1, 500), (2, 300), (3, 900)]
+    assert pack_by_budget(sizes, budget_tokens=1000, max_items=8) == [[0, 1], [2], [3]]
+
+
+def test_pack_by_budget_limits_items_per_pack():
+    sizes = [(index, 10) for index in range(5)]
+    assert pack_by_budget(sizes, budget_tokens=1000, max_items=2) == [[0, 1], [2, 3], [4]]
+
+
+def test_pack_by_budget_puts_oversized_profiles_in_their_own_pack():
+    sizes = [(0, 100), (1, 5000), (2, 100)]
+    assert pack_by_budget(sizes, budget_tokens=1000, max_items=8) == [[0], [1], [2]]
+    assert pack_by_budget([], budget_tokens=1000, max_items=8) == []
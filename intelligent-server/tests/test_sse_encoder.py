@@ -0,0 +1,79 @@
+import asyncio
+import json
+import zlib
+
+import pytest
+
+from agents import sse_encoder
+from agents.sse_encoder import COMPRESSION_GZIP, TOKEN_FLUSH, SSEEncoder, with_token_flush
+
+
+def _messages(data):
+    frames = [frame for frame in data.decode("utf-8").split("\n\n") if frame]
+    assert all(frame.startswith("data:") for frame in frames)
+    return [json.loads(frame[len("data:"):]) for frame in frames]
+
+
+def test_tokens_within_window_are_merged_into_one_frame(monkeypatch):
+    now = [10.0]
+    monkeypatch.setattr(sse_encoder.time, "monotonic", lambda: now[0])
+    encoder = SSEEncoder(token_batch_ms=50, token_batch_bytes=1024)
+    assert encoder.token("洪水") == b""
+    now[0] += 0.01
+    assert encoder.token("模型") == b""
+    assert encoder.pending_timeout() == pytest.approx(0.04)
+
+    now[0] += 0.05
+    assert _messages(encoder.token("!")) == [{"type": "token", "message": "洪水模型!"}]
+    assert encoder.pending_timeout() is None
+    assert (encoder.frames, encoder.tokens) == (1, 3)
+
+
+def test_byte_limit_flushes_before_window():
+    encoder = SSEEncoder(token_batch_ms=10_000, token_batch_bytes=4)
+    assert encoder.token("ab") == b""
+    assert _messages(encoder.token("cd")) == [{"type": "token", "message": "abcd"}]
+
+
+def test_event_flushes_buffered_tokens_first():
+    encoder = SSEEncoder(token_batch_ms=10_000)
+    encoder.token("partial")
+    assert _messages(encoder.event({"type": "final"})) == [
+        {"type": "token", "message": "partial"},
+        {"type": "final"},
+    ]
+    assert encoder.close() == b""
+
+
+def test_gzip_stream_decodes_frame_by_frame():
+    encoder = SSEEncoder(token_batch_ms=10_000, compression=COMPRESSION_GZIP)
+    assert encoder.headers["Content-Encoding"] == "gzip"
+    decoder = zlib.decompressobj(31)
+    encoder.token("a")
+    first = decoder.decompress(encoder.event({"type": "step"}))
+    assert _messages(first) == [{"type": "token", "message": "a"}, {"type": "step"}]
+    encoder.token("b")
+    rest = decoder.decompress(encoder.close()) + decoder.flush()
+    assert _messages(rest) == [{"type": "token", "message": "b"}]
+    assert decoder.eof
+
+
+def test_with_token_flush_emits_buffered_tokens_while_source_is_idle():
+    encoder = SSEEncoder(token_batch_ms=10, token_batch_bytes=1024)
+
+    async def source():
+        yield "messages", "hello"
+        await asyncio.sleep(0.2)
+        yield "updates", {}
+
+    async def collect():
+        items = []
+        async for mode, chunk in with_token_flush(source(), encoder):
+            if mode == "messages":
+                encoder.token(chunk)
+            items.append((mode, chunk))
+        return items
+
+    items = asyncio.run(collect())
+    assert [mode for mode, _ in items] == ["messages", TOKEN_FLUSH, "updates"]
+    assert _messages(items[1][1]) == [{"type": "token", "message": "hello"}]
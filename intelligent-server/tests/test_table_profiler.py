@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pandas")
+
+from agents.data_scan.table_profiler import HyperLogLog
+
+
+def _random_hashes(count: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, np.iinfo(np.uint64).max, size=count, dtype=np.uint64)
+
+
+def test_hll_empty_is_zero():
+    assert HyperLogLog().count() == 0
+
+
+def test_hll_small_cardinality_uses_linear_counting():
+    hll = HyperLogLog(precision=12)
+    hll.add_hashes(_random_hashes(100, seed=1))
+    assert abs(hll.count() - 100) <= 3
+
+
+@pytest.mark.parametrize("cardinality", [10_000, 200_000])
+def test_hll_estimate_within_error_bound(cardinality):
+    hll = HyperLogLog(precision=12)
+    hll.add_hashes(_random_hashes(cardinality, seed=cardinality))
+    # 4 倍标准误差内
+    assert abs(hll.count() - cardinality) / cardinality < 4 * hll.relative_error
+
+
+def test_hll_duplicates_do_not_increase_count():
+    hashes = _random_hashes(5_000, seed=7)
+    once, twice = HyperLogLog(), HyperLogLog()
+    once.add_hashes(hashes)
+    twice.add_hashes(np.concatenate([hashes, hashes]))
+    assert once.count() == twice.count()
+
+
+def test_hll_merge_matches_single_pass():
+    first, second = _random_hashes(20_000, seed=3), _random_hashes(20_000, seed=4)
+    left, right, combined = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    left.add_hashes(first)
+    right.add_hashes(second)
+    combined.add_hashes(np.concatenate([first, second]))
+    left.merge(right)
+    assert left.count() == combined.count()
+
+
+def test_hll_precision_is_clamped():
+    assert HyperLogLog(precision=1).p == 4
+    assert HyperLogLog(precision=30).p == 18
+
+
+def test_profile_table_reads_ndjson_in_chunks(tmp_path):
+    from agents.data_scan.table_profiler import profile_table
+
+    path = tmp_path / "records.jsonl"
+    path.write_text("".join(f'{{"id": {i}, "name": "n{i % 3}"}}\n' for i in range(25)), encoding="utf-8")
+    profile = profile_table(str(path), chunk_rows=10)
+    assert profile["Row_count"] == 25
+    assert profile["Columns"] == ["id", "name"]
+
+
+def test_profile_table_reads_json_array(tmp_path):
+    from agents.data_scan.table_profiler import profile_table
+
+    path = tmp_path / "records.json"
+    path.write_text('[{"a": 1}, {"a": 2}, {"a": 3}]', encoding="utf-8")
+    assert profile_table(str(path))["Row_count"] == 3
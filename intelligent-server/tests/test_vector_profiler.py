@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("pyproj")
+
+from agents.data_scan.vector_profiler import estimate_distinct, wilson_interval
+
+
+def test_wilson_interval_without_trials_is_uninformative():
+    assert wilson_interval(0, 0) == [0.0, 1.0]
+
+
+def test_wilson_interval_contains_observed_ratio():
+    low, high = wilson_interval(30, 100)
+    assert low < 0.3 < high
+    assert low == pytest.approx(0.2189, abs=1e-3)
+    assert high == pytest.approx(0.3958, abs=1e-3)
+
+
+def test_wilson_interval_stays_within_unit_range():
+    low, high = wilson_interval(0, 50)
+    assert low == 0.0 and 0.0 < high < 0.1
+    low, high = wilson_interval(50, 50)
+    assert 0.9 < low < 1.0 and high == 1.0
+
+
+def test_wilson_interval_narrows_with_more_trials():
+    small = wilson_interval(5, 10)
+    large = wilson_interval(500, 1000)
+    assert large[1] - large[0] < small[1] - small[0]
+
+
+def test_estimate_distinct_empty_sample():
+    assert estimate_distinct([], 1000) == 0
+
+
+def test_estimate_distinct_full_population_is_exact():
+    assert estimate_distinct(["a", "b", "a", "c"], 4) == 3
+
+
+def test_estimate_distinct_scales_singletons():
+    # 100 个样本全部不同、总体 10000：sqrt(10000 / 100) * 100 = 1000
+    assert estimate_distinct(list(range(100)), 10_000) == 1000
+
+
+def test_estimate_distinct_keeps_repeated_values():
+    sample = ["x"] * 50 + ["y"] * 50
+    assert estimate_distinct(sample, 1_000_000) == 2
+
+
+def test_estimate_distinct_capped_by_population():
+    assert estimate_distinct(list(range(10)), 12) <= 12